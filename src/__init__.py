@@ -2,32 +2,56 @@
 ReCode
 ----------
 A package for analyzing gas permeation data using time-lag method.
+
+The public functions are imported from their submodules on first access, so `import src` itself is cheap and
+compute-only use never loads the plotting stack.
 """
 
-from .time_lag_analysis import time_lag_analysis_workflow
-from .data_processing import load_data, preprocess_data
-from .calculations import time_lag_analysis, flux_pde_const_D
-from .visualisation import (
-    plot_time_lag_analysis,
-    plot_flux_over_time,
-    plot_concentration_location_profile,
-    plot_concentration_profile
-)
-from .util import set_plot_style, update_ticks, get_time_id
+import importlib
 
 __version__ = '1.0.0'
 
-__all__ = [
-    'time_lag_analysis_workflow',
-    'load_data',
-    'preprocess_data',
-    'time_lag_analysis',
-    'flux_pde_const_D',
-    'plot_time_lag_analysis',
-    'plot_flux_over_time',
-    'plot_concentration_location_profile',
-    'plot_concentration_profile',
-    'set_plot_style',
-    'update_ticks',
-    'get_time_id',
-]
+# Public name -> submodule defining it
+_lazy_attributes = {
+    'time_lag_analysis_workflow': 'time_lag_analysis',
+    'TimeLagAnalysisResult': 'time_lag_analysis',
+    'ResultCache': 'result_cache',
+    'ResultsStore': 'results_store',
+    'MetadataRegistry': 'metadata_registry',
+    'get_registry': 'metadata_registry',
+    'load_data': 'data_processing',
+    'preprocess_data': 'data_processing',
+    'time_lag_analysis': 'calculations',
+    'time_lag_scan': 'calculations',
+    'time_lag_bootstrap': 'calculations',
+    'flux_pde_const_D': 'calculations',
+    'flux_pde_const_D_batch': 'calculations',
+    'flux_pde_var_D': 'calculations',
+    'flux_series_const_D': 'calculations',
+    'fit_transient_flux': 'calculations',
+    'new_figure': 'visualisation',
+    'downsample_minmax': 'visualisation',
+    'plot_time_lag_analysis': 'visualisation',
+    'plot_flux_over_time': 'visualisation',
+    'plot_concentration_location_profile': 'visualisation',
+    'plot_concentration_profile': 'visualisation',
+    'update_time_lag_analysis': 'visualisation',
+    'update_flux_over_time': 'visualisation',
+    'update_concentration_location_profile': 'visualisation',
+    'update_concentration_profile': 'visualisation',
+    'set_plot_style': 'util',
+    'update_ticks': 'util',
+    'get_time_id': 'util',
+}
+
+__all__ = list(_lazy_attributes)
+
+def __getattr__(name):
+    if name not in _lazy_attributes:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{_lazy_attributes[name]}', __name__), name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,9 +1,62 @@
 import customtkinter as ctk
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import importlib
 import os
-from visualisation import *
-from time_lag_analysis import *
-from util import thickness_dict, qN2_dict
+import queue
+import threading
+from collections import OrderedDict
+from instrumentation import StageTimer, stage, format_span
+from metadata_registry import get_registry
+
+# Stages reported by the analysis worker, in order
+ANALYSIS_STAGES = ['loading', 'preprocessing', 'fitting', 'solving PDE', 'plotting']
+POLL_INTERVAL_MS = 50
+# Imported on a background thread once the window is shown, so that the window opens before the analysis stack is loaded
+PRELOAD_MODULES = ['time_lag_analysis', 'matplotlib.backends.backend_tkagg']
+
+class AnalysisCancelled(Exception):
+    """Raised in the analysis worker when the analysis is cancelled or superseded."""
+
+def preload_modules():
+    """Import the modules the analysis needs, ignoring failures which then surface when the analysis runs"""
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception:
+            pass
+
+class StageCache:
+    """Least recently used cache of the outputs of one analysis stage, safe to share between worker threads."""
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __getitem__(self, key):
+        with self._lock:
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached output for key, computing and storing it on a miss"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        value = compute()
+        self[key] = value
+        return value
 
 
 class App(ctk.CTk):
@@ -12,12 +65,23 @@ class App(ctk.CTk):
 
         self.data_dir = data_dir
         self.calculation_results = None
+        self.calculation_timer = None   # Stage timer of the displayed results, None if not timed
         self.L_cm = None
         self.d_cm = None
         self.qN2_mlmin = None
         self.left_time = None
         self.right_time = None
         self.stabilisation_time_range = None
+        self.plot_panels = {}   # Persistent figure, axes and canvas of each plot
+        self.worker_queue = queue.Queue()   # Messages from the analysis worker thread
+        self.request_id = 0  # Id of the latest analysis request
+        self.cancel_event = None    # Set to cancel the latest analysis request
+
+        # Stage caches, each edit only recomputes the stages downstream of the changed inputs
+        self.raw_cache = StageCache()   # Raw data per (file, modification time)
+        self.preprocessed_cache = StageCache()  # Preprocessed data per (raw key, d_cm, qN2_mlmin)
+        self.fit_cache = StageCache(maxsize=32)   # Time-lag fit per (preprocessed key, L_cm, stabilisation time range)
+        self.pde_cache = StageCache()   # PDE solution per (D, C_eq, L, T)
 
         # Create main window
         self.geometry('1200x800')
@@ -114,32 +178,53 @@ class App(ctk.CTk):
         # Call the function to apply the initial checkbox state
         self.toggle_custom_stab_time_entries()
         
-        # Run analysis button
-        self.run_button = ctk.CTkButton(self.input_frame, text='Run Analysis', command=self.run_analysis)
-        self.run_button.grid(row=6, column=0, columnspan=6, padx=10, pady=10, sticky='n')
+        # Run analysis and cancel buttons
+        self.run_frame = ctk.CTkFrame(self.input_frame, fg_color='transparent')
+        self.run_frame.grid(row=6, column=0, columnspan=6, padx=10, pady=10, sticky='n')
+
+        self.run_button = ctk.CTkButton(self.run_frame, text='Run Analysis', command=self.run_analysis)
+        self.run_button.pack(side='left', padx=5)
+
+        self.cancel_button = ctk.CTkButton(self.run_frame, text='Cancel', command=self.cancel_analysis, state='disabled')
+        self.cancel_button.pack(side='left', padx=5)
+
+        self.timings_var = ctk.IntVar(value=0)  # Record and show the time and memory of each stage
+        self.timings_checkbox = ctk.CTkCheckBox(self.run_frame, text='Show timings', variable=self.timings_var)
+        self.timings_checkbox.pack(side='left', padx=5)
+
+        # Progress of the running analysis
+        self.progress_frame = ctk.CTkFrame(self.input_frame, fg_color='transparent')
+        self.progress_frame.grid(row=7, column=0, columnspan=6, padx=10, pady=0, sticky='ew')
+
+        self.progress_bar = ctk.CTkProgressBar(self.progress_frame)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(side='left', fill='x', expand=True, padx=5)
+
+        self.progress_label = ctk.CTkLabel(self.progress_frame, text='Idle', width=100, anchor='w')
+        self.progress_label.pack(side='left', padx=5)
 
         # Text result display
         self.result_text = ctk.CTkTextbox(self.input_frame)
-        self.result_text.grid(row=7, column=0, columnspan=6, sticky='nsew', padx=10, pady=10)
-        self.input_frame.grid_rowconfigure(7, weight=1)  # Adjust row input_frame grid to make textbox expandable
+        self.result_text.grid(row=8, column=0, columnspan=6, sticky='nsew', padx=10, pady=10)
+        self.input_frame.grid_rowconfigure(8, weight=1)  # Adjust row input_frame grid to make textbox expandable
         self.input_frame.grid_columnconfigure((0, 1, 2, 3, 4, 5, 6), weight=1)  # Make all columns expandable
 
         # UI scaling dropdown
         scaling_label = ctk.CTkLabel(self.input_frame, text='UI Scaling:')
-        scaling_label.grid(row=8, column=0, padx=5, pady=5, sticky='w')
+        scaling_label.grid(row=9, column=0, padx=5, pady=5, sticky='w')
 
         self.scaling_combobox = ctk.CTkComboBox(self.input_frame, values=['80%', '90%', '100%', '110%', '120%', ], width=100, command=self.change_scaling)
         self.scaling_combobox.set('100%')  # Default value
-        self.scaling_combobox.grid(row=8, column=1, padx=5, pady=5, sticky='w')
+        self.scaling_combobox.grid(row=9, column=1, padx=5, pady=5, sticky='w')
 
         # Plot label size scaling dropdown
         label_scaling_label = ctk.CTkLabel(self.input_frame, text='Plot Label Size:')
-        label_scaling_label.grid(row=9, column=0, padx=5, pady=5, sticky='w')
+        label_scaling_label.grid(row=10, column=0, padx=5, pady=5, sticky='w')
 
         self.label_scaling_combobox = ctk.CTkComboBox(self.input_frame, values=['80%', '90%', '100%', '110%', '120%', '130%', '140%'], width=100, command=self.change_label_scaling)
         self.label_scaling_combobox.set('100%')  # Default value
         self.label_scaling_factor = int(self.label_scaling_combobox.get().replace('%', '')) / 100
-        self.label_scaling_combobox.grid(row=9, column=1, padx=5, pady=5, sticky='w')
+        self.label_scaling_combobox.grid(row=10, column=1, padx=5, pady=5, sticky='w')
 
         # Plot column
         self.plot_frame = ctk.CTkFrame(self)
@@ -160,32 +245,44 @@ class App(ctk.CTk):
 
         version_label = ctk.CTkLabel(self.footer_frame, text='Version: 1.0.0')
         version_label.pack(side='right', padx=5)
+
+        # Start polling for messages from the analysis worker
+        self.after(POLL_INTERVAL_MS, self.poll_worker)
+        # Load the analysis stack once the window is drawn, the first analysis then does not wait for it
+        self.after_idle(lambda: threading.Thread(target=preload_modules, daemon=True).start())
         
     def get_xlxs_files(self):
-        return [f for f in os.listdir(self.data_dir) if f.endswith('.xlsx')]
+        return get_registry().scan(self.data_dir, extensions=('.xlsx',))
     
     def autofill_thickness_flowrate(self, event):
         exp = str(self.file_combobox.get()).split('.')[0]
-        if exp in thickness_dict:
-            self.L_cm_entry.delete(0, ctk.END)
-            self.L_cm_entry.insert(0, thickness_dict[exp])
-            self.qN2_mlmin_entry.delete(0, ctk.END)
-            self.qN2_mlmin_entry.insert(0, qN2_dict[exp])
+        self.autofill_thickness(exp)
+        self.autofill_diameter(exp)
+        self.autofill_flowrate(exp)
     
     def on_combobox_selected(self, event):
         exp_name = str(self.file_combobox.get()).split('.')[0]
         self.autofill_thickness(exp_name)
+        self.autofill_diameter(exp_name)
         self.autofill_flowrate(exp_name)
     
     def autofill_thickness(self, file_name):
-        if file_name in thickness_dict:
+        metadata = get_registry().get(file_name)
+        if metadata is not None and metadata['thickness'] is not None:
             self.L_cm_entry.delete(0, ctk.END)
-            self.L_cm_entry.insert(0, str(thickness_dict[file_name]))
+            self.L_cm_entry.insert(0, str(metadata['thickness']))
+
+    def autofill_diameter(self, file_name):
+        metadata = get_registry().get(file_name)
+        if metadata is not None and metadata['diameter'] is not None:
+            self.d_cm_entry.delete(0, ctk.END)
+            self.d_cm_entry.insert(0, str(metadata['diameter']))
 
     def autofill_flowrate(self, file_name):
-        if file_name in qN2_dict:
+        metadata = get_registry().get(file_name)
+        if metadata is not None and metadata['flow_rate'] is not None:
             self.qN2_mlmin_entry.delete(0, ctk.END)
-            self.qN2_mlmin_entry.insert(0, str(qN2_dict[file_name]))
+            self.qN2_mlmin_entry.insert(0, str(metadata['flow_rate']))
 
     # Method to show tooltip at fixed position
     def show_tooltip(self, event):
@@ -220,18 +317,18 @@ class App(ctk.CTk):
     def change_label_scaling(self, event):
         label_scaling_percentage = self.label_scaling_combobox.get().replace('%', '')
         self.label_scaling_factor = int(label_scaling_percentage) / 100
-        self.update_plots()  # Only update plots, no need to recalculate
-
-    def perform_calculations(self):
-        """Perform all calculations and store results"""
-        file_path = os.path.join(self.data_dir, self.file_combobox.get())
-        
-        # Store all parameters as class variables
+        # Only update fonts, no need to recalculate or redraw the data
+        for panel in self.plot_panels.values():
+            self.update_plot_labels(panel['fig'], panel['ax'])
+            panel['fig'].tight_layout(w_pad=2.0, h_pad=2.0)
+            panel['canvas'].draw_idle()
+
+    def read_inputs(self):
+        """Read and validate the inputs, storing them as class variables. Returns False if an input is invalid"""
         # Check if file is selected
         if not self.file_combobox.get():
-            self.result_text.delete(1.0, ctk.END)
-            self.result_text.insert(ctk.END, "Please select a file first")
-            return
+            self.show_message("Please select a file first")
+            return False
 
         # Get and validate required inputs
         try:
@@ -239,9 +336,8 @@ class App(ctk.CTk):
             self.L_cm = float(self.L_cm_entry.get())
             self.qN2_mlmin = float(self.qN2_mlmin_entry.get())
         except ValueError:
-            self.result_text.delete(1.0, ctk.END)
-            self.result_text.insert(ctk.END, "Please enter valid numbers for diameter, thickness and flow rate")
-            return
+            self.show_message("Please enter valid numbers for diameter, thickness and flow rate")
+            return False
 
         # Get optional time range inputs if auto detect is disabled
         if self.checkbox_var.get() == 0:
@@ -249,21 +345,117 @@ class App(ctk.CTk):
                 self.left_time = float(self.stab_time_start_entry.get()) if self.stab_time_start_entry.get() else None
                 self.right_time = float(self.stab_time_end_entry.get()) if self.stab_time_end_entry.get() else None
             except ValueError:
-                self.result_text.delete(1.0, ctk.END)
-                self.result_text.insert(ctk.END, "Please enter valid numbers for time range")
-                return
+                self.show_message("Please enter valid numbers for time range")
+                return False
             self.stabilisation_time_range = (self.left_time, self.right_time)
         else:
             self.stabilisation_time_range = (None, None)
+        return True
 
-        self.calculation_results = time_lag_analysis_workflow(
-            file_path, self.L_cm, self.d_cm, self.qN2_mlmin, self.stabilisation_time_range, 
-            display_plot=False, save_plot=False, save_data=False
-        )
-        
-        # Update results text
+    def perform_calculations(self, request_id, cancel_event, file_path, L_cm, d_cm, qN2_mlmin, stabilisation_time_range, timer=None):
+        """Perform all calculations on the worker thread and post the results to the worker queue"""
+        last_progress = None
+
+        def progress_callback(stage, fraction):
+            nonlocal last_progress
+            if cancel_event.is_set():
+                raise AnalysisCancelled()
+            progress = (stage, int(fraction * 100))
+            if progress != last_progress:  # Only post visible changes
+                last_progress = progress
+                self.worker_queue.put(('progress', request_id, stage, fraction))
+
+        from data_processing import load_data, preprocess_data
+        from time_lag_analysis import analyse_preprocessed_data
+
+        try:
+            raw_key = (file_path, os.path.getmtime(file_path))
+            preprocessed_key = (raw_key, d_cm, qN2_mlmin)
+            fit_key = (preprocessed_key, L_cm, stabilisation_time_range)
+            experiment = os.path.splitext(os.path.basename(file_path))[0]
+
+            def load():
+                progress_callback('loading', 0)
+                with stage(timer, 'loading'):
+                    return load_data(file_path, use_cache=True)
+
+            def preprocess():
+                df = self.raw_cache.get_or_compute(raw_key, load)
+                progress_callback('preprocessing', 0)
+                with stage(timer, 'preprocessing'):
+                    return preprocess_data(df, d_cm=d_cm, qN2_mlmin=qN2_mlmin)
+
+            def fit():
+                preprocessed_df = self.preprocessed_cache.get_or_compute(preprocessed_key, preprocess)
+                result = analyse_preprocessed_data(preprocessed_df, L_cm, stabilisation_time_range, experiment=experiment,
+                                                   progress_callback=progress_callback, pde_cache=self.pde_cache, fit_transient=True, timer=timer)
+                # The cached result is shared by later requests, which pass their own callback and timer
+                result.progress_callback = None
+                result.timer = None
+                return result
+
+            result = self.fit_cache.get_or_compute(fit_key, fit)
+            # Compute the lazy members on the worker, leaving only plotting to the UI thread. Stages served from the caches record no spans
+            result.preprocessed_df
+            result.solve_pde(progress_callback=progress_callback, timer=timer)
+            self.worker_queue.put(('done', request_id, result, timer))
+        except AnalysisCancelled:
+            self.worker_queue.put(('cancelled', request_id, None))
+        except Exception as e:
+            self.worker_queue.put(('error', request_id, e))
+
+    def poll_worker(self):
+        """Apply the messages posted by the analysis worker, ignoring those of superseded requests"""
+        try:
+            while True:
+                kind, request_id, *payload = self.worker_queue.get_nowait()
+                if request_id != self.request_id:
+                    continue
+                if kind == 'progress':
+                    self.show_progress(*payload)
+                elif kind == 'done':
+                    self.calculation_results, self.calculation_timer = payload
+                    self.show_results()
+                    self.show_progress('plotting', 0)
+                    self.update_idletasks()
+                    with stage(self.calculation_timer, 'plotting'):
+                        self.update_plots()
+                    self.show_timings()
+                    self.finish_analysis('Done')
+                elif kind == 'cancelled':
+                    self.finish_analysis('Cancelled')
+                elif kind == 'error':
+                    self.show_message(f"Analysis failed: {payload[0]}")
+                    self.finish_analysis('Failed')
+        except queue.Empty:
+            pass
+        self.after(POLL_INTERVAL_MS, self.poll_worker)
+
+    def show_progress(self, stage, fraction):
+        """Show the overall progress of the analysis given the current stage and its completed fraction"""
+        index = ANALYSIS_STAGES.index(stage)
+        self.progress_bar.set((index + fraction) / len(ANALYSIS_STAGES))
+        self.progress_label.configure(text=stage.capitalize())
+
+    def finish_analysis(self, status):
+        self.progress_bar.set(1 if status == 'Done' else 0)
+        self.progress_label.configure(text=status)
+        self.cancel_button.configure(state='disabled')
+        self.cancel_event = None
+
+    def cancel_analysis(self):
+        """Cancel the running analysis, it stops at the next progress report"""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.progress_label.configure(text='Cancelling')
+
+    def show_message(self, message):
         self.result_text.delete(1.0, ctk.END)
-        result_dict = self.calculation_results[0]
+        self.result_text.insert(ctk.END, message)
+
+    def show_results(self):
+        """Update results text"""
+        result_dict = self.calculation_results.results
         formatted_result = (
             f'Experiment = {result_dict['experiment']}\n'
             f'Temperature = {result_dict['temperature']:.2f} °C\n'
@@ -275,105 +467,138 @@ class App(ctk.CTk):
             f'Permeability = {result_dict['permeability']:.2e} cm^3(STP) cm^-1 s^-1 bar^-1\n'
             f'Solubility coefficient = {result_dict['solubility_coefficient']:.2e} cm^3(STP) cm^-3 bar^-1\n'
         )
-        self.result_text.insert(ctk.END, formatted_result)
+        if 'transient_diffusion_coefficient' in result_dict:
+            formatted_result += (
+                f'Diffusion coefficient (transient fit) = {result_dict['transient_diffusion_coefficient']:.2e} cm^2 s^-1\n'
+                f'Solubility coefficient (transient fit) = {result_dict['transient_solubility_coefficient']:.2e} cm^3(STP) cm^-3 bar^-1\n'
+            )
+        self.show_message(formatted_result)
+
+    def show_timings(self):
+        """Append the recorded stage spans to the results text"""
+        if self.calculation_timer is None:
+            return
+        lines = [format_span(span) for span in self.calculation_timer.spans] or ['All stages served from the cache']
+        self.result_text.insert(ctk.END, '\nTimings:\n' + '\n'.join(lines) + '\n')
 
     def update_plots(self):
-        """Update all plots using stored calculation results"""
-        if not self.calculation_results or self.L_cm is None:
+        """Update all plots using stored calculation results, drawing them on first use and updating their artists in place afterwards"""
+        if self.calculation_results is None:
             return
-            
-        result_dict, preprocessed_df, C_profile, flux, df_C, df_flux = self.calculation_results
-
-        # Clear previous plots
-        for widget in self.plot_frame.winfo_children():
-            widget.destroy()
-
-        # Helper function to create a plot with a 'Save' button
-        def create_plot_with_save_button(fig, row, column):
-            frame = ctk.CTkFrame(self.plot_frame, fg_color='white')
-            frame.grid(row=row, column=column, sticky='nsew', padx=0, pady=0)
-            frame.grid_rowconfigure(0, weight=1)
-            frame.grid_columnconfigure(0, weight=1)
-
-            # Create canvas
-            canvas = FigureCanvasTkAgg(fig, master=frame)
-            canvas.draw()
-            canvas.get_tk_widget().grid(row=0, column=0, sticky='nsew')
-
-            # Create 'Save' button
-            def save_plot():
-                file_path = ctk.filedialog.asksaveasfilename(
-                    defaultextension='.png',
-                    filetypes=[
-                        ('PNG files', '*.png'),
-                        ('SVG files', '*.svg'), 
-                        ('All files', '*.*')
-                    ]
-                )
-                if file_path:
-                    fig.savefig(file_path, dpi=1200)
-
-            # Create transparent save button with hover effect
-            save_button = ctk.CTkButton(
-                frame, 
-                text='Save', 
-                command=save_plot, 
-                width=20, 
-                height=10,
-                fg_color='gray80',
-                hover_color=('gray80', 'gray80'),  # Color when hovering
-                text_color=('black', 'black'),  # Normal text color
-                border_color='gray100',  # Border color
-                border_width=1,  # Border width
-                font=('', 8, 'normal')  # Normal font
-                )
-            
-            # Bind hover events to change font weight
-            save_button.bind('<Enter>', lambda e: save_button.configure(font=('', 8, 'bold')))
-            save_button.bind('<Leave>', lambda e: save_button.configure(font=('', 8, 'normal')))
-            
-            save_button.place(relx=0.995, rely=0.005, anchor='ne')
-
-        # Plot 1
-        fig1 = plt.figure(figsize=(5, 4))
-        ax1 = fig1.add_subplot(111)
-        plot_time_lag_analysis(preprocessed_df, result_dict['stabilisation_time'], result_dict['slope'], result_dict['intercept'], fig=fig1, ax=ax1)
-        self.update_plot_labels(fig1, ax1)
-        fig1.tight_layout(w_pad=2.0, h_pad=2.0)
-        create_plot_with_save_button(fig1, row=0, column=0)
-        plt.close(fig1)
-
-        # Plot 2
-        fig2 = plt.figure(figsize=(5, 4))
-        ax2 = fig2.add_subplot(111)
-        plot_flux_over_time(flux, preprocessed_df, preprocessed_df['t / s'].iloc[-1], fig=fig2, ax=ax2)
-        self.update_plot_labels(fig2, ax2)
-        fig2.tight_layout(w_pad=2.0, h_pad=2.0)
-        create_plot_with_save_button(fig2, row=0, column=1)
-        plt.close(fig2)
-
-        # Plot 3
-        fig3 = plt.figure(figsize=(5, 4))
-        ax3 = fig3.add_subplot(111)
-        plot_concentration_location_profile(C_profile, self.L_cm, result_dict['stabilisation_time'], fig=fig3, ax=ax3)
-        self.update_plot_labels(fig3, ax3)
-        fig3.tight_layout(w_pad=2.0, h_pad=2.0)
-        create_plot_with_save_button(fig3, row=1, column=0)
-        plt.close(fig3)
-
-        # Plot 4
-        fig4 = plt.figure(figsize=(5, 4))
-        ax4 = fig4.add_subplot(111)
-        plot_concentration_profile(C_profile, self.L_cm, result_dict['stabilisation_time'], fig=fig4, ax=ax4)
-        self.update_plot_labels(fig4, ax4)
-        fig4.tight_layout(w_pad=2.0, h_pad=2.0)
-        create_plot_with_save_button(fig4, row=1, column=1)
-        plt.close(fig4)
+        from calculations import flux_series_const_D
+        from visualisation import (plot_time_lag_analysis, plot_flux_over_time, plot_concentration_location_profile,
+                                   plot_concentration_profile, update_time_lag_analysis, update_flux_over_time,
+                                   update_concentration_location_profile, update_concentration_profile)
+
+        result_dict = self.calculation_results.results
+        L_cm = result_dict['thickness']
+        preprocessed_df = self.calculation_results.preprocessed_df
+        C_profile = self.calculation_results.C_profile
+        stabilisation_time = result_dict['stabilisation_time']
+        T_final = preprocessed_df['t / s'].iloc[-1]
+        C_eq = result_dict['solubility_coefficient'] * result_dict['pressure']
+        _, flux_model = flux_series_const_D(result_dict['diffusion_coefficient'], C_eq, L_cm, preprocessed_df['t / s'])
+
+        if not self.plot_panels:
+            # Plot 1
+            fig1, ax1 = self.create_plot_panel('time_lag_analysis', row=0, column=0)
+            plot_time_lag_analysis(preprocessed_df, stabilisation_time, result_dict['slope'], result_dict['intercept'], fig=fig1, ax=ax1, downsample=True)
+
+            # Plot 2
+            fig2, ax2 = self.create_plot_panel('flux_over_time', row=0, column=1)
+            plot_flux_over_time(flux_model, preprocessed_df, T_final, fig=fig2, ax=ax2, time=preprocessed_df['t / s'], downsample=True)
+
+            # Plot 3
+            fig3, ax3 = self.create_plot_panel('concentration_location_profile', row=1, column=0)
+            plot_concentration_location_profile(C_profile, L_cm, stabilisation_time, fig=fig3, ax=ax3)
+
+            # Plot 4
+            fig4, ax4 = self.create_plot_panel('concentration_profile', row=1, column=1)
+            plot_concentration_profile(C_profile, L_cm, stabilisation_time, fig=fig4, ax=ax4, downsample=True)
+        else:
+            update_time_lag_analysis(preprocessed_df, stabilisation_time, result_dict['slope'], result_dict['intercept'], self.plot_panels['time_lag_analysis']['ax'], downsample=True)
+            update_flux_over_time(flux_model, preprocessed_df, T_final, self.plot_panels['flux_over_time']['ax'], time=preprocessed_df['t / s'], downsample=True)
+            update_concentration_location_profile(C_profile, L_cm, stabilisation_time, self.plot_panels['concentration_location_profile']['ax'])
+            update_concentration_profile(C_profile, L_cm, stabilisation_time, self.plot_panels['concentration_profile']['ax'], downsample=True)
+
+        for panel in self.plot_panels.values():
+            self.update_plot_labels(panel['fig'], panel['ax'])
+            panel['fig'].tight_layout(w_pad=2.0, h_pad=2.0)
+            panel['canvas'].draw_idle()
+
+    def create_plot_panel(self, name, row, column):
+        """Create a persistent figure embedded in the plot frame with a 'Save' button"""
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(5, 4))   # Owned by the canvas, not tracked by pyplot
+        ax = fig.add_subplot(111)
+
+        frame = ctk.CTkFrame(self.plot_frame, fg_color='white')
+        frame.grid(row=row, column=column, sticky='nsew', padx=0, pady=0)
+        frame.grid_rowconfigure(0, weight=1)
+        frame.grid_columnconfigure(0, weight=1)
+
+        # Create canvas
+        canvas = FigureCanvasTkAgg(fig, master=frame)
+        canvas.get_tk_widget().grid(row=0, column=0, sticky='nsew')
+
+        # Create 'Save' button
+        def save_plot():
+            file_path = ctk.filedialog.asksaveasfilename(
+                defaultextension='.png',
+                filetypes=[
+                    ('PNG files', '*.png'),
+                    ('SVG files', '*.svg'), 
+                    ('All files', '*.*')
+                ]
+            )
+            if file_path:
+                fig.savefig(file_path, dpi=1200)
+
+        # Create transparent save button with hover effect
+        save_button = ctk.CTkButton(
+            frame, 
+            text='Save', 
+            command=save_plot, 
+            width=20, 
+            height=10,
+            fg_color='gray80',
+            hover_color=('gray80', 'gray80'),  # Color when hovering
+            text_color=('black', 'black'),  # Normal text color
+            border_color='gray100',  # Border color
+            border_width=1,  # Border width
+            font=('', 8, 'normal')  # Normal font
+            )
+        
+        # Bind hover events to change font weight
+        save_button.bind('<Enter>', lambda e: save_button.configure(font=('', 8, 'bold')))
+        save_button.bind('<Leave>', lambda e: save_button.configure(font=('', 8, 'normal')))
+        
+        save_button.place(relx=0.995, rely=0.005, anchor='ne')
+
+        self.plot_panels[name] = {'fig': fig, 'ax': ax, 'canvas': canvas}
+        return fig, ax
 
     def run_analysis(self):
-        """Main analysis function that calls calculation and plotting"""
-        self.perform_calculations()
-        self.update_plots()
+        """Main analysis function that starts the calculations on a worker thread, superseding any analysis still running"""
+        if not self.read_inputs():
+            return
+
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        self.request_id += 1
+        self.cancel_event = threading.Event()
+
+        file_path = os.path.join(self.data_dir, self.file_combobox.get())
+        worker = threading.Thread(
+            target=self.perform_calculations,
+            args=(self.request_id, self.cancel_event, file_path, self.L_cm, self.d_cm, self.qN2_mlmin, self.stabilisation_time_range,
+                  StageTimer() if self.timings_var.get() else None),
+            daemon=True
+        )
+        worker.start()
+        self.cancel_button.configure(state='normal')
+        self.show_progress('loading', 0)
 
     def update_plot_labels(self, fig, ax):
         label_size = 10 * self.label_scaling_factor
@@ -382,7 +607,8 @@ class App(ctk.CTk):
         ax.yaxis.label.set_size(label_size)
         ax.tick_params(axis='both', which='major', labelsize=label_size)
         if ax.get_legend() is not None:
-            ax.legend(fontsize=label_size)
+            for text in ax.get_legend().get_texts():
+                text.set_fontsize(label_size)
 
 if __name__ == '__main__':
     base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -0,0 +1,185 @@
+"""
+batch.py
+--------
+Module for running the time-lag analysis over every data file in a directory in parallel.
+
+Usage:
+    python src/batch.py data/ --workers 4 [--config params.json] [--output results.csv]
+    python -m src.batch data/ --workers 4
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# The modules of src import each other by their flat names, which only resolve with src on the path, as when run as
+# python src/batch.py. Adding it here also supports python -m src.batch, including in spawned worker processes.
+_SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+if _SRC_DIR not in sys.path:
+    sys.path.insert(0, _SRC_DIR)
+
+import pandas as pd
+from instrumentation import StageTimer, summarise_spans
+from result_cache import ResultCache, get_default_result_cache_dir
+from results_store import ResultsStore
+from metadata_registry import DEFAULT_METADATA_PATH, MetadataRegistry, get_registry
+from time_lag_analysis import time_lag_analysis_workflow
+from util import get_time_id
+
+DEFAULT_DIAMETER_CM = 1.0
+
+def load_batch_config(config_path: str) -> dict:
+    """
+    Load per-experiment parameters from a JSON file.
+
+    The file maps experiment names (file names without extension) to parameters, e.g.
+    {"S3R1": {"L_cm": 0.1, "qN2_mlmin": 4.17, "stabilisation_time_range": [2e4, 3e4]}}.
+    Entries override the defaults taken from the metadata registry.
+
+    Parameters:
+    config_path (str): Path to the JSON file.
+
+    Returns:
+    dict: Parameters for each experiment.
+    """
+    with open(config_path) as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError("The batch config should map experiment names to parameter dictionaries.")
+    return config
+
+def get_batch_jobs(data_dir: str, config: dict = None, d_cm: float = None, stabilisation_time_range: tuple = (None, None),
+                   registry: MetadataRegistry = None) -> list:
+    """
+    Collect the data files in a directory together with their analysis parameters.
+
+    Parameters:
+    data_dir (str): Directory containing the data files.
+    config (dict): Per-experiment parameters overriding the metadata registry.
+    d_cm (float, optional): Diameter of the polymer in cm for every experiment. If None, the diameter from the registry, or DEFAULT_DIAMETER_CM if it has none.
+    stabilisation_time_range (tuple): Default start and end times of the stabilisation period.
+    registry (MetadataRegistry, optional): Metadata of the experiments, defaults to the registry of data/metadata.json.
+
+    Returns:
+    list: Dictionaries with the keyword arguments of time_lag_analysis_workflow for each file.
+    """
+    config = config or {}
+    registry = registry or get_registry()
+    jobs = []
+    for file_name in registry.scan(data_dir):
+        exp_name = os.path.splitext(file_name)[0]
+        metadata = registry[exp_name]
+        diameter = d_cm if d_cm is not None else metadata['diameter']
+        params = {
+            'L_cm': metadata['thickness'],
+            'd_cm': DEFAULT_DIAMETER_CM if diameter is None else diameter,
+            'qN2_mlmin': metadata['flow_rate'],
+            'stablisation_time_range': tuple(stabilisation_time_range),
+        }
+        exp_config = dict(config.get(exp_name, {}))
+        if 'stabilisation_time_range' in exp_config:
+            params['stablisation_time_range'] = tuple(exp_config.pop('stabilisation_time_range'))
+        params.update(exp_config)
+        jobs.append({'datapath': os.path.join(data_dir, file_name), **params})
+    return jobs
+
+def _run_job(job: dict, timings: bool = False, use_cache: bool = True, store_path: str = None) -> dict:
+    """
+    Run the workflow for one file, capturing its output. Failures are returned rather than raised.
+    """
+    exp_name = os.path.splitext(os.path.basename(job['datapath']))[0]
+    log = io.StringIO()
+    timer = StageTimer() if timings else None
+    try:
+        if job['L_cm'] is None:
+            raise ValueError(f"No thickness known for '{exp_name}'. Add it to the metadata registry or the batch config.")
+        with contextlib.redirect_stdout(log):
+            cache = ResultCache(get_default_result_cache_dir(job['datapath'])) if use_cache else None
+            store = ResultsStore(store_path) if store_path is not None else None
+            result = time_lag_analysis_workflow(**job, timer=timer, cache=cache, store=store)
+        row = {**result.results, 'status': 'ok', 'error': None}
+        if timings:
+            row['timings'] = timer.spans
+        return row
+    except Exception as e:
+        return {'experiment': exp_name, 'status': 'failed', 'error': f"{type(e).__name__}: {e}",
+                'traceback': traceback.format_exc()}
+
+def run_batch(data_dir: str, workers: int = None, config: dict = None, d_cm: float = None, stabilisation_time_range: tuple = (None, None), verbose: bool = True, timings: bool = False, use_cache: bool = True, store_path: str = None, metadata_path: str = DEFAULT_METADATA_PATH) -> pd.DataFrame:
+    """
+    Run time_lag_analysis_workflow on every data file in a directory using a process pool.
+
+    A failure in one file is reported and recorded without aborting the batch.
+
+    Parameters:
+    data_dir (str): Directory containing the data files.
+    workers (int): Number of worker processes. If None, use the number of CPUs.
+    config (dict): Per-experiment parameters overriding the metadata registry.
+    d_cm (float, optional): Diameter of the polymer in cm for every experiment. If None, the diameter from the registry, or DEFAULT_DIAMETER_CM if it has none.
+    stabilisation_time_range (tuple): Default start and end times of the stabilisation period.
+    verbose (bool): Whether to print the progress.
+    timings (bool): Whether to record the stage spans of each file in a 'timings' column (see instrumentation.summarise_spans).
+    use_cache (bool): Whether to reuse and store results in the result cache next to the data files (see result_cache.py).
+    store_path (str, optional): Path of a results store (see results_store.py) to append every analysis to.
+    metadata_path (str): Path of the metadata registry (see metadata_registry.py).
+
+    Returns:
+    pd.DataFrame: One row of results per file, with 'status' and 'error' columns.
+    """
+    jobs = get_batch_jobs(data_dir, config=config, d_cm=d_cm, stabilisation_time_range=stabilisation_time_range,
+                          registry=get_registry(metadata_path))
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_run_job, job, timings, use_cache, store_path) for job in jobs]
+        for i, future in enumerate(as_completed(futures), start=1):
+            row = future.result()
+            if verbose:
+                status = 'done' if row['status'] == 'ok' else f"FAILED ({row['error']})"
+                print(f"[{i}/{len(jobs)}] {row['experiment']}: {status}")
+            row.pop('traceback', None)
+            rows.append(row)
+
+    results_df = pd.DataFrame(rows)
+    if not results_df.empty:
+        results_df = results_df.sort_values('experiment', ignore_index=True)
+    return results_df
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the time-lag analysis on every data file in a directory.')
+    parser.add_argument('data_dir', help='Directory containing the data files.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: number of CPUs).')
+    parser.add_argument('--config', default=None, help='JSON file with per-experiment parameters.')
+    parser.add_argument('--metadata', default=DEFAULT_METADATA_PATH, help='Path of the metadata registry (default: data/metadata.json).')
+    parser.add_argument('--d-cm', type=float, default=None, help='Diameter of the polymer in cm for every experiment (default: from the metadata registry, else 1.0).')
+    parser.add_argument('--stabilisation-time-range', type=float, nargs=2, default=(None, None), metavar=('START', 'END'),
+                        help='Start and end times of the stabilisation period in s (default: auto detect).')
+    parser.add_argument('--output', default=None, help='Path of the combined results table (.csv).')
+    parser.add_argument('--no-cache', action='store_true', help='Recompute every file instead of reusing cached results.')
+    parser.add_argument('--store', default=None, help='Path of an SQLite results store to append every analysis to (e.g. output/results.sqlite).')
+    parser.add_argument('--timings', action='store_true', help='Record the time and memory of every stage and save a summary next to the results.')
+    args = parser.parse_args(argv)
+
+    config = load_batch_config(args.config) if args.config else None
+    results_df = run_batch(args.data_dir, workers=args.workers, config=config, d_cm=args.d_cm,
+                           stabilisation_time_range=args.stabilisation_time_range, timings=args.timings,
+                           use_cache=not args.no_cache, store_path=args.store, metadata_path=args.metadata)
+
+    output_path = args.output or os.path.join(args.data_dir, '..', 'output', get_time_id(), 'batch_results.csv')
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    if args.timings and 'timings' in results_df.columns:
+        timings_df = summarise_spans(results_df.pop('timings'))
+        timings_df.to_csv(os.path.join(os.path.dirname(os.path.abspath(output_path)), 'batch_timings.csv'))
+        print(timings_df.to_string())
+    results_df.to_csv(output_path, index=False)
+
+    n_failed = int((results_df['status'] != 'ok').sum()) if not results_df.empty else 0
+    print(f"{len(results_df) - n_failed} of {len(results_df)} files analysed, results saved to {os.path.abspath(output_path)}")
+    return 1 if n_failed else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
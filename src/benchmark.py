@@ -0,0 +1,363 @@
+"""
+benchmark.py
+------------
+Module for timing every stage of the time-lag analysis pipeline on the data files and on synthetic runs.
+
+Each stage is timed (best of several runs) and its peak memory is measured with tracemalloc. The results are written
+to a JSON report, which can be compared against a stored baseline report to catch performance regressions.
+
+The import time of the main modules is measured too, each in a fresh interpreter, so that a heavy module-level import
+shows up as a regression.
+
+The reference report is benchmarks/baseline.json, which records the machine and library versions it was measured with.
+Compare against it on a similar machine, and replace it with a new report (--output benchmarks/baseline.json) when a
+change deliberately alters the performance.
+
+Usage:
+    python src/benchmark.py [--data-dir data/] [--sizes 1e5 1e6 1e7] [--output report.json] [--baseline benchmarks/baseline.json | --no-baseline]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import matplotlib
+matplotlib.use('Agg')  # Plots are only timed, never shown
+import numpy as np
+import pandas as pd
+from batch import get_batch_jobs
+from calculations import time_lag_analysis, flux_pde_const_D, flux_series_const_D
+from data_processing import load_data, preprocess_data, identify_stabilisation_time
+from result_cache import ResultCache
+from time_lag_analysis import PDE_DT, time_lag_analysis_workflow
+from util import get_time_id
+from visualisation import new_figure, plot_time_lag_analysis, plot_flux_over_time, plot_concentration_location_profile, plot_concentration_profile
+
+DEFAULT_BASELINE_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'baseline.json'))
+
+DEFAULT_SIZES = (100_000, 1_000_000, 10_000_000)
+DEFAULT_IMPORT_MODULES = ('calculations', 'data_processing', 'time_lag_analysis', 'visualisation', 'app')
+
+# Run in a fresh interpreter: prints the import time in s and the peak traced memory in bytes of importing a module
+_IMPORT_SCRIPT = '''
+import importlib, sys, time, tracemalloc
+if sys.argv[2] == 'memory':
+    tracemalloc.start()
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(elapsed, tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0)
+'''
+
+def make_synthetic_data(n_samples: int, T: float = 3e4, L_cm: float = 0.1, d_cm: float = 1.0, qN2_mlmin: float = 8.0,
+                        D: float = 1e-6, C_eq: float = 50.0, noise: float = 5e-4, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate raw data of a permeation run with the columns of the data files.
+
+    The flux follows the constant-D analytical solution and is converted to 'y_CO2 / ppm' by inverting calculate_flux.
+
+    Parameters:
+    n_samples (int): Number of samples.
+    T (float): Duration of the run in s.
+    L_cm (float): Thickness of the polymer in cm.
+    d_cm (float): Diameter of the polymer in cm.
+    qN2_mlmin (float): Flow rate of N2 in ml/min.
+    D (float): Diffusion coefficient in cm^2 s^-1.
+    C_eq (float): Equilibrium concentration in cm^3(STP) cm^-3.
+    noise (float): Standard deviation of the noise relative to the steady-state concentration.
+    seed (int): Seed of the random number generator.
+
+    Returns:
+    pd.DataFrame: Raw data.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, T, int(n_samples))
+    flux = np.concatenate([flux_series_const_D(D, C_eq, L_cm, t_chunk)[1] for t_chunk in np.array_split(t, max(1, len(t) // 1_000_000))])
+    A_cm2 = (math.pi * d_cm**2) / 4
+    y_CO2 = flux * A_cm2 / (qN2_mlmin / 60) * 1e6   # [ppm]
+    y_CO2 += 20 + noise * y_CO2.max() * rng.standard_normal(len(t))   # Baseline and noise
+    return pd.DataFrame({
+        't / s': t,
+        'y_CO2 / ppm': y_CO2,
+        'P_cell / barg': np.full(len(t), 50.0),
+        'T / °C': np.full(len(t), 25.0),
+        'qN2 / ml min^-1': np.full(len(t), qN2_mlmin),
+    })
+
+def measure(func, *args, repeat: int = 3, **kwargs) -> dict:
+    """
+    Time a function call and measure its peak memory.
+
+    Parameters:
+    func (callable): Function to benchmark.
+    repeat (int): Number of timed runs, the fastest is reported.
+
+    Returns:
+    dict: 'time_s' (fastest run), 'peak_memory_mb' (peak traced allocation of one extra run) and 'error' (None on success).
+    """
+    try:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(*args, **kwargs)
+            times.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        return {'time_s': None, 'peak_memory_mb': None, 'error': f"{type(e).__name__}: {e}"}
+    return {'time_s': min(times), 'peak_memory_mb': peak / 2**20, 'error': None}
+
+def _plot(plot_function, *args, **kwargs):
+    fig, ax = new_figure()
+    plot_function(*args, fig=fig, ax=ax, **kwargs)
+    fig.canvas.draw()
+
+def _quiet(func, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+def benchmark_dataset(name: str, datapath: str, L_cm: float, d_cm: float = 1.0, qN2_mlmin: float = None,
+                      stablisation_time_range: tuple = (None, None), repeat: int = 3, verbose: bool = True) -> list:
+    """
+    Benchmark every pipeline stage on one data file.
+
+    Parameters:
+    name (str): Name of the dataset in the report.
+    datapath (str): Path of the data file.
+    L_cm (float): Thickness of the polymer in cm.
+    d_cm (float): Diameter of the polymer in cm.
+    qN2_mlmin (float): Flow rate of N2 in ml/min. If None, use the column 'qN2 / ml min^-1' from the data.
+    stablisation_time_range (tuple): Start and end times of the stabilisation period.
+    repeat (int): Number of timed runs per stage.
+    verbose (bool): Whether to print each result.
+
+    Returns:
+    list: One record per stage with 'dataset', 'n_samples', 'stage', 'time_s', 'peak_memory_mb' and 'error'.
+    """
+    records = []
+    def run(stage, func, *args, **kwargs):
+        record = {'dataset': name, 'n_samples': n_samples, 'stage': stage, **measure(func, *args, repeat=repeat, **kwargs)}
+        records.append(record)
+        if verbose:
+            result = f"{record['time_s']:.4g} s, {record['peak_memory_mb']:.1f} MB" if record['error'] is None else f"FAILED ({record['error']})"
+            print(f"{name} [{n_samples}] {stage}: {result}", flush=True)
+
+    df = load_data(datapath, use_cache=False)
+    n_samples = len(df)
+    run('load_data', load_data, datapath, use_cache=False)
+    if datapath.endswith(('.xlsx', '.xls')):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            load_data(datapath, use_cache=True, cache_dir=cache_dir)
+            run('load_data (cached)', load_data, datapath, use_cache=True, cache_dir=cache_dir)
+
+    run('preprocess_data', preprocess_data, df, d_cm=d_cm, qN2_mlmin=qN2_mlmin)
+    preprocessed_df = preprocess_data(df, d_cm=d_cm, qN2_mlmin=qN2_mlmin)
+
+    column = 'cumulative flux / cm^3(STP) cm^-2'
+    run('identify_stabilisation_time', identify_stabilisation_time, preprocessed_df, column=column, window=70, threshold=0.003)
+    stabilisation_time = stablisation_time_range[0]
+    if stabilisation_time is None:
+        try:
+            stabilisation_time = identify_stabilisation_time(preprocessed_df, column=column, window=70, threshold=0.003)
+        except ValueError:
+            stabilisation_time = preprocessed_df['t / s'].iloc[len(preprocessed_df) // 2]
+    if stablisation_time_range[1] is not None:
+        preprocessed_df = preprocessed_df.loc[preprocessed_df['t / s'] <= stablisation_time_range[1]]
+
+    run('time_lag_analysis', time_lag_analysis, preprocessed_df, stabilisation_time, L_cm)
+    _, D, _, S, pressure, _, slope, intercept = time_lag_analysis(preprocessed_df, stabilisation_time, L_cm)
+
+    # PDE solved as in TimeLagAnalysisResult.pde_solution
+    T_final = preprocessed_df['t / s'].iloc[-1]
+    pde_args = dict(D=D, C_eq=S * pressure, L=L_cm, T=T_final, dt=PDE_DT, dx=L_cm / 50, method='crank-nicolson')
+    run('flux_pde_const_D', flux_pde_const_D, **pde_args)
+    C_profile, flux, _, _ = flux_pde_const_D(**pde_args)
+
+    preprocessed_df = preprocessed_df.copy()
+    preprocessed_df['normalised flux'] = preprocessed_df['flux / cm^3(STP) cm^-2 s^-1'] / slope
+    T_stabilisation = preprocessed_df.loc[preprocessed_df['t / s'] >= stabilisation_time, 't / s'].iloc[0]
+    run('plot_time_lag_analysis', _plot, plot_time_lag_analysis, preprocessed_df, stabilisation_time, slope, intercept)
+    run('plot_flux_over_time', _plot, plot_flux_over_time, flux, preprocessed_df, T_final)
+    run('plot_time_lag_analysis (downsampled)', _plot, plot_time_lag_analysis, preprocessed_df, stabilisation_time, slope, intercept, downsample=True)
+    run('plot_flux_over_time (downsampled)', _plot, plot_flux_over_time, flux, preprocessed_df, T_final, downsample=True)
+    run('plot_concentration_location_profile', _plot, plot_concentration_location_profile, C_profile, L_cm, T_stabilisation)
+    run('plot_concentration_profile', _plot, plot_concentration_profile, C_profile, L_cm, T_stabilisation)
+    run('plot_concentration_profile (downsampled)', _plot, plot_concentration_profile, C_profile, L_cm, T_stabilisation, downsample=True)
+
+    run('time_lag_analysis_workflow', _quiet, time_lag_analysis_workflow, datapath, L_cm, d_cm, qN2_mlmin, stablisation_time_range)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ResultCache(cache_dir)
+        _quiet(time_lag_analysis_workflow, datapath, L_cm, d_cm, qN2_mlmin, stablisation_time_range, cache=cache)
+        run('time_lag_analysis_workflow (cached)', _quiet, time_lag_analysis_workflow, datapath, L_cm, d_cm, qN2_mlmin, stablisation_time_range, cache=cache)
+    return records
+
+def benchmark_imports(modules=DEFAULT_IMPORT_MODULES, repeat: int = 3, verbose: bool = True) -> list:
+    """
+    Benchmark the cold import of modules, each run in a fresh interpreter with the src directory on the path.
+
+    Parameters:
+    modules (iterable): Names of the modules to import.
+    repeat (int): Number of timed imports per module.
+    verbose (bool): Whether to print each result.
+
+    Returns:
+    list: One record per module with dataset 'import', 'n_samples' None, 'stage', 'time_s', 'peak_memory_mb' and 'error'.
+    """
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [src_dir, os.environ.get('PYTHONPATH')])), 'MPLBACKEND': 'Agg'}
+
+    def import_module(module, mode):
+        completed = subprocess.run([sys.executable, '-c', _IMPORT_SCRIPT, module, mode], env=env, cwd=src_dir,
+                                   capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise ImportError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit code {completed.returncode}")
+        elapsed, peak = completed.stdout.split()
+        return float(elapsed), int(peak)
+
+    records = []
+    for module in modules:
+        record = {'dataset': 'import', 'n_samples': None, 'stage': f"import {module}", 'time_s': None, 'peak_memory_mb': None, 'error': None}
+        try:
+            record['time_s'] = min(import_module(module, 'time')[0] for _ in range(repeat))
+            record['peak_memory_mb'] = import_module(module, 'memory')[1] / 2**20
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+        records.append(record)
+        if verbose:
+            result = f"{record['time_s']:.4g} s, {record['peak_memory_mb']:.1f} MB" if record['error'] is None else f"FAILED ({record['error']})"
+            print(f"{record['stage']}: {result}", flush=True)
+    return records
+
+def run_benchmarks(data_dir: str = None, sizes=DEFAULT_SIZES, repeat: int = 3, verbose: bool = True,
+                   import_modules=DEFAULT_IMPORT_MODULES) -> dict:
+    """
+    Benchmark every pipeline stage on the data files in data_dir and on synthetic runs of the given sizes.
+
+    Parameters:
+    data_dir (str, optional): Directory containing the data files. Files without a known thickness are skipped. If None, only synthetic data is used.
+    sizes (iterable): Numbers of samples of the synthetic runs.
+    repeat (int): Number of timed runs per stage.
+    verbose (bool): Whether to print each result.
+    import_modules (iterable): Modules whose cold import is timed.
+
+    Returns:
+    dict: Report with the environment under 'meta' and one record per dataset and stage under 'results'.
+    """
+    records = benchmark_imports(import_modules, repeat=repeat, verbose=verbose)
+    if data_dir is not None:
+        for job in get_batch_jobs(data_dir):
+            if job['L_cm'] is None:
+                continue
+            name = os.path.splitext(os.path.basename(job['datapath']))[0]
+            records += benchmark_dataset(name, repeat=repeat, verbose=verbose, **job)
+
+    # Synthetic runs are written to .csv so that loading and the full workflow are timed too
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_samples in sizes:
+            name = f"synthetic_{int(n_samples)}"
+            datapath = os.path.join(tmp_dir, f"{name}.csv")
+            make_synthetic_data(int(n_samples)).to_csv(datapath, index=False)
+            records += benchmark_dataset(name, datapath, L_cm=0.1, d_cm=1.0, qN2_mlmin=8.0, repeat=repeat, verbose=verbose)
+            os.remove(datapath)
+
+    import scipy
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'scipy': scipy.__version__,
+            'matplotlib': matplotlib.__version__,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'repeat': repeat,
+        },
+        'results': records,
+    }
+
+def compare_to_baseline(report: dict, baseline: dict, tolerance: float = 0.2, min_time_s: float = 0.005) -> list:
+    """
+    Find the stages that got slower or use more memory than in a baseline report.
+
+    Parameters:
+    report (dict): Report from run_benchmarks.
+    baseline (dict): Earlier report from run_benchmarks.
+    tolerance (float): Allowed relative increase of the time and peak memory.
+    min_time_s (float): Time increases smaller than this are ignored as noise.
+
+    Returns:
+    list: One dict per regression with 'dataset', 'stage', 'metric', 'baseline' and 'current'.
+    """
+    baseline_records = {(r['dataset'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    for record in report['results']:
+        old = baseline_records.get((record['dataset'], record['stage']))
+        if old is None:
+            continue
+        if record['error'] is not None and old['error'] is None:
+            regressions.append({'dataset': record['dataset'], 'stage': record['stage'], 'metric': 'error', 'baseline': None, 'current': record['error']})
+            continue
+        if record['error'] is not None or old['error'] is not None:
+            continue
+        if record['time_s'] > old['time_s'] * (1 + tolerance) and record['time_s'] - old['time_s'] > min_time_s:
+            regressions.append({'dataset': record['dataset'], 'stage': record['stage'], 'metric': 'time_s', 'baseline': old['time_s'], 'current': record['time_s']})
+        if record['peak_memory_mb'] > old['peak_memory_mb'] * (1 + tolerance) and record['peak_memory_mb'] - old['peak_memory_mb'] > 1:
+            regressions.append({'dataset': record['dataset'], 'stage': record['stage'], 'metric': 'peak_memory_mb', 'baseline': old['peak_memory_mb'], 'current': record['peak_memory_mb']})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every stage of the time-lag analysis pipeline.')
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'),
+                        help='Directory containing the data files (default: data/).')
+    parser.add_argument('--no-data', action='store_true', help='Only benchmark synthetic data.')
+    parser.add_argument('--sizes', type=float, nargs='*', default=DEFAULT_SIZES, help='Numbers of samples of the synthetic runs (default: 1e5 1e6 1e7).')
+    parser.add_argument('--no-imports', action='store_true', help='Do not benchmark the module import times.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per stage (default: 3).')
+    parser.add_argument('--output', default=None, help='Path of the JSON report (default: output/<time id>/benchmark.json).')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help='JSON report to compare against (default: benchmarks/baseline.json).')
+    parser.add_argument('--no-baseline', action='store_true', help='Do not compare against a baseline report.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative increase over the baseline (default: 0.2).')
+    args = parser.parse_args(argv)
+
+    # Read before running, as the report may replace it
+    baseline = None
+    if not args.no_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    report = run_benchmarks(None if args.no_data else args.data_dir, sizes=args.sizes, repeat=args.repeat,
+                            import_modules=() if args.no_imports else DEFAULT_IMPORT_MODULES)
+
+    output_path = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'output', get_time_id(), 'benchmark.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to {os.path.abspath(output_path)}")
+
+    if baseline is None:
+        return 0
+    regressions = compare_to_baseline(report, baseline, tolerance=args.tolerance)
+    for r in regressions:
+        print(f"REGRESSION {r['dataset']} {r['stage']} {r['metric']}: {r['baseline']} -> {r['current']}")
+    print(f"{len(regressions)} regression(s) against {os.path.abspath(args.baseline)}")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -6,8 +6,8 @@ Module for performing time-lag analysis on permeation data.
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from util import figsize_dict, set_plot_style, update_ticks
+from scipy.linalg.lapack import dgtsv, dgttrf, dgttrs
+from scipy.special import erfc
 
 def time_lag_analysis(df: pd.DataFrame, stabilisation_time_s: float, thickness: float) -> tuple:
     """
@@ -28,9 +28,38 @@ def time_lag_analysis(df: pd.DataFrame, stabilisation_time_s: float, thickness:
         raise ValueError("'t / s' does not exist. Please preprocess the data first.")
     
     # Fitting straight line to the data
-    df_ss = df[df['t / s'] > stabilisation_time_s]
-    slope, intercept = np.polyfit(df_ss['t / s'], df_ss['cumulative flux / cm^3(STP) cm^-2'], 1)
+    t = df['t / s'].to_numpy(dtype=float)
+    y = df['cumulative flux / cm^3(STP) cm^-2'].to_numpy(dtype=float)
+    p = df['P_cell / bar'].to_numpy(dtype=float)
+    if df['t / s'].is_monotonic_increasing:
+        # Steady-state rows are a contiguous tail, so slice views instead of copying through a mask
+        i = np.searchsorted(t, stabilisation_time_s, side='right')
+        t, y, p = t[i:], y[i:], p[i:]
+    else:
+        mask = t > stabilisation_time_s
+        t, y, p = t[mask], y[mask], p[mask]
+    slope, intercept = _fit_line(t, y)
     
+    # Get pressure
+    pressure = float(p.mean())   # [bar]
+    
+    time_lag, diffusion_coefficient, permeability, solubility_coefficient, solubility = calculate_time_lag_parameters(slope, intercept, pressure, thickness)
+    
+    return time_lag, diffusion_coefficient, permeability, solubility_coefficient, pressure, solubility, slope, intercept
+
+def calculate_time_lag_parameters(slope: float, intercept: float, pressure: float, thickness: float) -> tuple:
+    """
+    Calculate the transport parameters from a straight-line fit to the steady-state cumulative flux.
+
+    Parameters:
+    slope (float): Slope of the fit, i.e. the steady state flux (cm^3(STP) cm^-2 s^-1).
+    intercept (float): Intercept of the fit (cm^3(STP) cm^-2).
+    pressure (float): Mean pressure over the fitted period (bar).
+    thickness (float): Thickness of the polymer in cm.
+
+    Returns:
+    tuple: Time lag (s), diffusion coefficient (cm^2 s^-1), permeability (cm^3(STP) cm^-1 s^-1 bar^-1), solubility coefficient (cm^3(STP) cm^-3 bar^-1) and solubility (cm^3(STP) cm^-3).
+    """
     # Calculate time_lag
     time_lag = -intercept / slope   # [s]
     
@@ -40,9 +69,6 @@ def time_lag_analysis(df: pd.DataFrame, stabilisation_time_s: float, thickness:
     # Calculate diffusion coefficient
     diffusion_coefficient = thickness**2 / (6 * time_lag)   # [cm^2 s^-1]
     
-    # Get pressure
-    pressure = df_ss['P_cell / bar'].mean()   # [bar]
-    
     # Calculate permeability
     permeability = thickness * steady_state_flux / pressure   # [cm^3(STP) cm^-1 s^-1 bar^-1]
     
@@ -52,9 +78,183 @@ def time_lag_analysis(df: pd.DataFrame, stabilisation_time_s: float, thickness:
     # Calculate solubility coefficient
     solubility_coefficient = permeability / diffusion_coefficient   # [cm^3(STP) cm^-3 bar^-1]    
     
-    return time_lag, diffusion_coefficient, permeability, solubility_coefficient, pressure, solubility, slope, intercept
+    return time_lag, diffusion_coefficient, permeability, solubility_coefficient, solubility
 
-def flux_pde_const_D(D, C_eq, L, T, dt, dx):
+def _fit_line(t: np.ndarray, y: np.ndarray) -> tuple:
+    """
+    Closed-form least-squares straight line through (t, y), on centred data to avoid cancellation.
+    """
+    t_mean, y_mean = t.mean(), y.mean()
+    dt = t - t_mean
+    slope = np.dot(dt, y - y_mean) / np.dot(dt, dt)
+    intercept = y_mean - slope * t_mean
+    return float(slope), float(intercept)
+
+def time_lag_scan(df: pd.DataFrame, thickness: float, stabilisation_times=None, max_time: float = None) -> pd.DataFrame:
+    """
+    Perform the time-lag analysis for many candidate stabilisation times at once.
+
+    The straight-line fits for all windows are computed in a single vectorised pass from cumulative sums of t, y, t^2
+    and t*y (on centred data), so the cost is O(n) for all stabilisation times together. This makes curves of the time
+    lag against the chosen stabilisation time, and finding the plateau of such curves, cheap.
+
+    Parameters:
+    df (pd.DataFrame): Preprocessed data, sorted by 't / s'.
+    thickness (float): Thickness of the polymer in cm.
+    stabilisation_times (array-like, optional): Candidate stabilisation times in s. If None, every time in the data is used.
+    max_time (float, optional): End of the fitted period in s. If None, fit up to the last row.
+
+    Returns:
+    pd.DataFrame: One row per stabilisation time (index 'stabilisation_time') with columns 'n_points', 'slope', 'intercept',
+        'time_lag', 'diffusion_coefficient', 'permeability', 'solubility_coefficient', 'pressure' and 'solubility'.
+        For each row, the fit uses the points with stabilisation_time < t <= max_time, as in time_lag_analysis.
+        Windows with fewer than 2 points give NaN.
+    """
+    if 'cumulative flux / cm^3(STP) cm^-2' not in df.columns:
+        raise ValueError("cumulative flux / cm^3(STP) cm^-2' does not exist. Please preprocess the data first.")
+    if 't / s' not in df.columns:
+        raise ValueError("'t / s' does not exist. Please preprocess the data first.")
+    if not df['t / s'].is_monotonic_increasing:
+        raise ValueError("'t / s' should be sorted in increasing order.")
+    
+    t = df['t / s'].to_numpy(dtype=float)
+    y = df['cumulative flux / cm^3(STP) cm^-2'].to_numpy(dtype=float)
+    p = df['P_cell / bar'].to_numpy(dtype=float)
+    stabilisation_times = t if stabilisation_times is None else np.atleast_1d(np.asarray(stabilisation_times, dtype=float))
+    
+    # Window of each stabilisation time is rows start:end
+    start = np.searchsorted(t, stabilisation_times, side='right')
+    end = len(t) if max_time is None else np.searchsorted(t, max_time, side='right')
+    
+    # Cumulative sums of the centred data, with a leading zero so that sum(rows i:j) = S[j] - S[i]
+    t_c, y_c = t - t.mean(), y - y.mean()
+    cumsum = lambda a: np.concatenate(([0.0], np.cumsum(a)))
+    S_t, S_y, S_tt, S_ty, S_p = cumsum(t_c), cumsum(y_c), cumsum(t_c * t_c), cumsum(t_c * y_c), cumsum(p)
+    
+    n = np.maximum(end - start, 0).astype(float)
+    sum_t, sum_y = S_t[end] - S_t[start], S_y[end] - S_y[start]
+    sum_tt, sum_ty = S_tt[end] - S_tt[start], S_ty[end] - S_ty[start]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sum_ty - sum_t * sum_y) / (n * sum_tt - sum_t**2)
+        intercept_c = (sum_y - slope * sum_t) / n
+        intercept = intercept_c + y.mean() - slope * t.mean()
+        pressure = (S_p[end] - S_p[start]) / n
+        slope[n < 2] = np.nan
+        time_lag, diffusion_coefficient, permeability, solubility_coefficient, solubility = calculate_time_lag_parameters(slope, intercept, pressure, thickness)
+    
+    return pd.DataFrame({
+        'n_points': n.astype(int),
+        'slope': slope,
+        'intercept': intercept,
+        'time_lag': time_lag,
+        'diffusion_coefficient': diffusion_coefficient,
+        'permeability': permeability,
+        'solubility_coefficient': solubility_coefficient,
+        'pressure': pressure,
+        'solubility': solubility,
+    }, index=pd.Index(stabilisation_times, name='stabilisation_time'))
+
+def time_lag_bootstrap(df: pd.DataFrame, stabilisation_time_s: float, thickness: float, n_replicates: int = 10000, max_time: float = None,
+                       stabilisation_time_range: tuple = None, percentiles=(2.5, 50, 97.5), seed=None, batch_size: int = 1000, return_replicates: bool = False):
+    """
+    Estimate the uncertainty of the time-lag analysis by bootstrapping the residuals of the steady-state fit.
+
+    Each replicate adds residuals, resampled with replacement from the fitted window, to the fitted straight line and refits it.
+    The refits of a batch of replicates are solved together as matrix operations, and the batches bound the memory use.
+    If stabilisation_time_range is given, each replicate also draws its stabilisation time uniformly from the data times in
+    that range, which adds the uncertainty from the choice of the window.
+
+    Parameters:
+    df (pd.DataFrame): Preprocessed data, sorted by 't / s'.
+    stabilisation_time_s (float): Time after which the flux has stabilised.
+    thickness (float): Thickness of the polymer in cm.
+    n_replicates (int): Number of bootstrap replicates.
+    max_time (float, optional): End of the fitted period in s. If None, fit up to the last row.
+    stabilisation_time_range (tuple, optional): Start and end of the range the stabilisation time is drawn from. If None, use stabilisation_time_s.
+    percentiles (array-like): Percentiles to report, in [0, 100].
+    seed (int or np.random.Generator, optional): Seed of the random number generator.
+    batch_size (int): Number of replicates solved together.
+    return_replicates (bool): Whether to also return the results of every replicate.
+
+    Returns:
+    pd.DataFrame: Percentiles (index 'percentile') of 'time_lag', 'diffusion_coefficient', 'permeability' and 'solubility_coefficient'.
+    pd.DataFrame (only if return_replicates): Results of every replicate, with the columns of time_lag_scan plus 'stabilisation_time'.
+    """
+    rng = np.random.default_rng(seed)
+    if max_time is not None:
+        df = df.loc[df['t / s'] <= max_time]
+    
+    # Straight-line fit of the original data for each candidate stabilisation time
+    if stabilisation_time_range is None:
+        stabilisation_times = np.full(n_replicates, float(stabilisation_time_s))
+    else:
+        t_all = df['t / s'].to_numpy(dtype=float)
+        candidates = t_all[(t_all >= stabilisation_time_range[0]) & (t_all <= stabilisation_time_range[1])]
+        if len(candidates) == 0:
+            raise ValueError("No data in stabilisation_time_range.")
+        stabilisation_times = rng.choice(candidates, size=n_replicates)
+    fits = time_lag_scan(df, thickness, stabilisation_times=np.unique(stabilisation_times))
+    if (fits['n_points'] < 3).any():
+        raise ValueError("At least 3 points are needed after the stabilisation time.")
+    
+    t = df['t / s'].to_numpy(dtype=float)
+    y = df['cumulative flux / cm^3(STP) cm^-2'].to_numpy(dtype=float)
+    end = len(t)
+    start_all = np.searchsorted(t, stabilisation_times, side='right')
+    first = start_all.min()
+    t_c = t[first:] - t[first:].mean()   # Centred for the refit
+    
+    replicates = []
+    for b0 in range(0, n_replicates, batch_size):
+        stabilisation_time = stabilisation_times[b0:b0 + batch_size]
+        start = start_all[b0:b0 + batch_size]
+        fit = fits.loc[stabilisation_time]
+        slope0, intercept0 = fit['slope'].to_numpy(), fit['intercept'].to_numpy()
+        n = (end - start).astype(float)
+        
+        # Resampled residuals of each replicate, at the positions first:end (positions before the replicate's start are masked)
+        position = np.arange(first, end)
+        in_window = position >= start[:, None]
+        draw = rng.integers(start[:, None], end, size=(len(start), end - first))
+        if stabilisation_time_range is None:
+            residuals = (y - (intercept0[0] + slope0[0] * t))[draw]   # Same fit for every replicate
+        else:
+            residuals = y[draw] - (intercept0[:, None] + slope0[:, None] * t[draw])
+        residuals *= in_window
+        
+        # Refit line + residuals: the change of slope and intercept only depends on the residuals
+        sum_t = in_window @ t_c
+        sum_tt = in_window @ (t_c * t_c)
+        sum_r = residuals.sum(axis=1)
+        sum_tr = residuals @ t_c
+        delta_slope = (n * sum_tr - sum_t * sum_r) / (n * sum_tt - sum_t**2)
+        delta_intercept = (sum_r - delta_slope * sum_t) / n - delta_slope * t[first:].mean()
+        slope, intercept = slope0 + delta_slope, intercept0 + delta_intercept
+        
+        pressure = fit['pressure'].to_numpy()
+        time_lag, diffusion_coefficient, permeability, solubility_coefficient, solubility = calculate_time_lag_parameters(slope, intercept, pressure, thickness)
+        replicates.append(pd.DataFrame({
+            'stabilisation_time': stabilisation_time,
+            'n_points': n.astype(int),
+            'slope': slope,
+            'intercept': intercept,
+            'time_lag': time_lag,
+            'diffusion_coefficient': diffusion_coefficient,
+            'permeability': permeability,
+            'solubility_coefficient': solubility_coefficient,
+            'pressure': pressure,
+            'solubility': solubility,
+        }))
+    replicates = pd.concat(replicates, ignore_index=True)
+    
+    columns = ['time_lag', 'diffusion_coefficient', 'permeability', 'solubility_coefficient']
+    summary = pd.DataFrame(np.percentile(replicates[columns].to_numpy(), percentiles, axis=0), columns=columns,
+                           index=pd.Index(np.atleast_1d(percentiles), name='percentile'))
+    if return_replicates:
+        return summary, replicates
+    return summary
+
+def flux_pde_const_D(D, C_eq, L, T, dt, dx, method='explicit', snapshot_times=None, stride=1, callback=None):
     """
     Solve the 2nd order differential equation of the mass diffusion problem with 2 boundary conditions and 1 initial condition.
 
@@ -65,52 +265,530 @@ def flux_pde_const_D(D, C_eq, L, T, dt, dx):
     T (float): Total time.
     dt (float): Time step size.
     dx (float): Spatial step size.
+    method (str): 'explicit' for the forward-time centred-space scheme (dt limited by dx^2 / 2D),
+        or 'crank-nicolson' for the unconditionally stable implicit scheme, which allows much larger dt.
+    snapshot_times (array-like, optional): Only store the concentration profile at the time steps nearest to these times.
+    stride (int): Only store the concentration profile at every stride-th time step. Ignored if snapshot_times is given.
+    callback (callable, optional): Called as callback(n, Nt) after every time step n, e.g. to report progress. Raising an exception aborts the solve.
 
     Returns:
-    tuple: Concentration profile as a function of position x and time t, and flux values at the given time points.
+    tuple: Concentration profile as a function of position x and time t (stored time steps only), and flux values at all time points.
     """
     # Calculate number of spatial and time steps
     Nx = int(L / dx) + 1
-    Nt = int(T / dt) + 1
+    Nt = int(T / dt + 1e-9) + 1   # A dt dividing T up to rounding gives exactly T / dt steps
+    time = np.linspace(0, T, Nt)
     
-    # Stability condition (Von Neumann stability analysis)
-    assert dt <= dx**2 / (2 * D), "Stability condition not met, reduce dt or increase dx"
+    if method == 'explicit':
+        # Stability condition (Von Neumann stability analysis)
+        assert dt <= dx**2 / (2 * D), "Stability condition not met, reduce dt or increase dx"
+        advance = _single_steps(_explicit_stepper(D, C_eq, dt, dx))
+    elif method == 'crank-nicolson':
+        advance = _crank_nicolson_propagator(D, C_eq, Nx, dt, dx, max_block=min(_MAX_BLOCK_STEPS, Nt))
+    else:
+        raise ValueError(f"Unknown method '{method}'. Use 'explicit' or 'crank-nicolson'.")
+    
+    # Time steps at which the concentration profile is stored
+    if snapshot_times is not None:
+        keep = np.unique(np.clip(np.rint(np.asarray(snapshot_times, dtype=float) / T * (Nt - 1)), 0, Nt - 1).astype(int))
+    elif stride >= 1:
+        keep = np.arange(0, Nt, int(stride))
+    else:
+        raise ValueError("stride should be a positive integer.")
     
     # Store flux results
-    flux_values = []
+    flux_values = np.zeros(Nt)
     
     # Surface plot of C(x, t)
-    time = np.linspace(0, T, Nt)
-    C_surface = np.zeros((Nt, Nx))  # Initialise surface array
-
+    C_surface = np.zeros((len(keep), Nx))  # Initialise surface array
+    
     # Initial condition
     C = np.zeros(Nx)
     
     # Boundary conditions
     C[0] = C_eq
     
-    for n in range(0, Nt):
-        C_new = C.copy()
-        if n > 0:
-            for i in range(1, Nx - 1):  # Skip the boundaries
-                C_new[i] = C[i] + dt * D * (C[i + 1] - 2 * C[i] + C[i - 1]) / dx**2
-        C_new[0] = C_eq
-        C_new[-1] = 0
-        C = C_new
-        C_surface[n, :] = C.copy()
-
+    # Profiles of the time steps n, n + 1, ..., starting from the initial condition
+    n = 0
+    C_block = C[None, :]
+    while n < Nt:
+        n_block = len(C_block)
+        first, last = np.searchsorted(keep, [n, n + n_block])
+        C_surface[first:last, :] = C_block[keep[first:last] - n]
+        
         # Calculate flux at x = L
-        flux_L = -D * (C[-1] - C[-2]) / dx  # Flux at x=L using finite difference
-        flux_values.append(flux_L)  # Store the flux value
+        flux_values[n:n + n_block] = -D * (C_block[:, -1] - C_block[:, -2]) / dx  # Flux at x=L using finite difference
+        if callback is not None:
+            for m in range(n, n + n_block):
+                callback(m, Nt)
+        n += n_block
+        if n < Nt:
+            C_block = advance(C_block[-1], n, Nt - n)
+    flux_values = flux_values.tolist()
     
     # Convert results to pandas DataFrame
     df_C_surface = pd.DataFrame(C_surface, columns=[f"x = {x:.3g}" for x in np.linspace(0, L, Nx)])
-    df_C_surface['Time'] = np.linspace(0, T, Nt)
+    df_C_surface['Time'] = time[keep]
     df_C_surface = df_C_surface[['Time'] + [col for col in df_C_surface.columns if col != 'Time']]
     df_flux_values = pd.DataFrame(flux_values, columns=['Flux'])
-    df_flux_values['Time'] = np.linspace(0, T, Nt)
+    df_flux_values['Time'] = time
     df_flux_values = df_flux_values[['Time', 'Flux']]
 
     return C_surface, flux_values, df_C_surface, df_flux_values
 
+def flux_pde_const_D_batch(D, C_eq, L, T, dt, dx, method='crank-nicolson', n_startup=2):
+    """
+    Solve the mass diffusion problem of flux_pde_const_D for many (D, C_eq) pairs at once.
+
+    All parameter sets share the grid and are advanced together as a 2-D array, one row per parameter set.
+    For 'crank-nicolson', the update of each row is precomputed as a dense matrix (inverse of the implicit matrix times
+    the explicit one), so every time step is a single batched matrix-vector product. This needs len(D) * Nx^2 memory.
+
+    Parameters:
+    D (float or array-like): Diffusion coefficient(s).
+    C_eq (float or array-like): Equilibrium concentration(s), broadcast against D.
+    L (float): Thickness of the polymer.
+    T (float): Total time.
+    dt (float): Time step size.
+    dx (float): Spatial step size.
+    method (str): 'explicit' (dt limited by dx^2 / 2 max(D)) or 'crank-nicolson'.
+    n_startup (int): Number of backward Euler steps at the start of 'crank-nicolson', as in flux_pde_const_D.
+
+    Returns:
+    tuple: Time points of shape (Nt,) and flux values at x = L of shape (number of parameter sets, Nt).
+    """
+    D, C_eq = np.broadcast_arrays(np.atleast_1d(np.asarray(D, dtype=float)), np.atleast_1d(np.asarray(C_eq, dtype=float)))
+    M = len(D)
+    Nx = int(L / dx) + 1
+    Nt = int(T / dt + 1e-9) + 1
+    N = Nx - 2  # Number of interior nodes
+    time = np.linspace(0, T, Nt)
+    flux_values = np.zeros((M, Nt))
+    if N < 1:
+        flux_values[:] = (D * C_eq / dx)[:, None]   # No interior nodes, as in flux_pde_const_D
+        return time, flux_values
+    
+    r = D * dt / dx**2
+    C = np.zeros((M, N))   # Interior nodes, C = C_eq at x = 0 and C = 0 at x = L
+    if method == 'explicit':
+        # Stability condition (Von Neumann stability analysis)
+        assert dt <= dx**2 / (2 * D.max()), "Stability condition not met, reduce dt or increase dx"
+        r = r[:, None]
+        for n in range(1, Nt):
+            C_left = np.concatenate((C_eq[:, None], C[:, :-1]), axis=1)
+            C_right = np.concatenate((C[:, 1:], np.zeros((M, 1))), axis=1)
+            C = C + r * (C_right - 2 * C + C_left)
+            flux_values[:, n] = D * C[:, -1] / dx
+    elif method == 'crank-nicolson':
+        laplacian = np.diag(np.full(N, -2.0)) + np.diag(np.ones(N - 1), 1) + np.diag(np.ones(N - 1), -1)
+        identity = np.eye(N)
+        source = np.zeros(N)
+        source[0] = 1.0
+        
+        def update(theta):
+            # C_new = P @ C_old + q, with P = (I - theta r A)^-1 (I + (1 - theta) r A) and q from the boundary at x = 0
+            implicit = identity - theta * r[:, None, None] * laplacian
+            explicit = identity + (1 - theta) * r[:, None, None] * laplacian
+            P = np.linalg.solve(implicit, explicit)
+            q = np.linalg.solve(implicit, ((r * C_eq)[:, None] * source)[..., None])[..., 0]
+            return P, q
+        
+        P_be, q_be = update(1.0)
+        P_cn, q_cn = update(0.5)
+        for n in range(1, Nt):
+            P, q = (P_be, q_be) if n <= n_startup else (P_cn, q_cn)
+            C = np.matmul(P, C[..., None])[..., 0] + q
+            flux_values[:, n] = D * C[:, -1] / dx
+    else:
+        raise ValueError(f"Unknown method '{method}'. Use 'explicit' or 'crank-nicolson'.")
+    
+    return time, flux_values
+
+# Largest number of time steps advanced at once by _crank_nicolson_propagator, and largest number of interior nodes
+# for which its dense update is cheaper than a tridiagonal solve per step
+_MAX_BLOCK_STEPS = 64
+_MAX_PROPAGATOR_NODES = 100
+
+def _single_steps(step):
+    """
+    Wrap a stepper advancing the profile in place by one time step as a propagator, see _crank_nicolson_propagator.
+    """
+    return lambda C, n, n_steps: step(C, n)[None, :]
+
+def _explicit_stepper(D, C_eq, dt, dx):
+    """
+    Build the forward-time centred-space update, vectorised over the interior nodes.
+
+    Returns:
+    callable: Function advancing the concentration profile C by one time step in place.
+    """
+    def step(C, n):
+        C[1:-1] = C[1:-1] + dt * D * (C[2:] - 2 * C[1:-1] + C[:-2]) / dx**2
+        C[0] = C_eq
+        C[-1] = 0
+        return C
+    
+    return step
+
+def _crank_nicolson_stepper(D, C_eq, Nx, dt, dx, n_startup=2):
+    """
+    Build the Crank-Nicolson update with a banded tridiagonal solve per time step.
+    
+    The tridiagonal system matrix is LU-factorised once and re-used for every step.
+    The first n_startup steps use backward Euler to damp the oscillations that the
+    discontinuous initial condition at x = 0 would otherwise excite when dt is large.
+
+    Returns:
+    callable: Function advancing the concentration profile C by one time step in place.
+    """
+    r = D * dt / dx**2
+    N = Nx - 2  # Number of interior nodes
+    if N < 1:
+        return lambda C, n: C
+    
+    def factorise(theta):
+        # LU factors of (I - theta * r * A), A being the 1-D Dirichlet Laplacian
+        off = np.full(N - 1, -theta * r)
+        return dgttrf(off, np.full(N, 1 + 2 * theta * r), off.copy())[:5]
+    
+    lu_be, lu_cn = factorise(1.0), factorise(0.5)
+    
+    def step(C, n):
+        if n <= n_startup:
+            lu, theta = lu_be, 1.0
+            rhs = C[1:-1].copy()
+        else:
+            lu, theta = lu_cn, 0.5
+            rhs = (1 - 2 * (1 - theta) * r) * C[1:-1] + (1 - theta) * r * (C[2:] + C[:-2])  # Includes old boundary values
+        rhs[0] += theta * r * C_eq  # New boundary value at x = 0
+        C[1:-1], info = dgttrs(*lu, rhs)
+        return C
+    
+    return step
+
+def _crank_nicolson_propagator(D, C_eq, Nx, dt, dx, n_startup=2, max_block=_MAX_BLOCK_STEPS):
+    """
+    Build the Crank-Nicolson update of _crank_nicolson_stepper advancing the profile by blocks of time steps.
+    
+    After the backward Euler start-up steps, each step updates the interior nodes as C_new = P @ C_old + q. The powers
+    P^k and the accumulated boundary terms of k = 1, ..., max_block steps are precomputed, so a block of k time steps
+    is one matrix-vector product instead of k tridiagonal solves, which removes the per-step overhead when many small
+    time steps are stored. Grids with more than _MAX_PROPAGATOR_NODES interior nodes are advanced one tridiagonal solve
+    at a time.
+
+    Returns:
+    callable: Function advance(C, n, n_steps) returning the profiles of at most n_steps time steps from n on, as rows,
+        given the profile C of time step n - 1, which may be overwritten.
+    """
+    N = Nx - 2  # Number of interior nodes
+    step = _crank_nicolson_stepper(D, C_eq, Nx, dt, dx, n_startup=n_startup)
+    if N < 1 or N > _MAX_PROPAGATOR_NODES or max_block < 2:
+        return _single_steps(step)
+    
+    r = D * dt / dx**2
+    laplacian = np.diag(np.full(N, -2.0)) + np.diag(np.ones(N - 1), 1) + np.diag(np.ones(N - 1), -1)
+    implicit = np.eye(N) - 0.5 * r * laplacian
+    P = np.linalg.solve(implicit, np.eye(N) + 0.5 * r * laplacian)
+    source = np.zeros(N)
+    source[0] = r * C_eq  # Boundary value at x = 0, at the old and the new time step
+    q = np.linalg.solve(implicit, source)
+    powers = np.empty((max_block, N, N))
+    sources = np.empty((max_block, N))
+    powers[0], sources[0] = P, q
+    for k in range(1, max_block):
+        powers[k] = P @ powers[k - 1]
+        sources[k] = P @ sources[k - 1] + q
+    powers = powers.reshape(max_block * N, N)   # Stacked, so that a block is a single matrix-vector product
+    
+    def advance(C, n, n_steps):
+        if n <= n_startup:
+            return step(C, n)[None, :]
+        n_steps = min(n_steps, max_block)
+        C_block = np.zeros((n_steps, Nx))
+        C_block[:, 0] = C_eq
+        C_block[:, 1:-1] = (powers[:n_steps * N] @ C[1:-1]).reshape(n_steps, N) + sources[:n_steps]
+        return C_block
+    
+    return advance
+
+def _diffusivity_constant(C, D0):
+    return np.full_like(C, D0), np.zeros_like(C)
+
+def _diffusivity_exponential(C, D0, beta):
+    # D = D0 exp(beta C)
+    D = D0 * np.exp(beta * C)
+    return D, beta * D
+
+def _diffusivity_linear(C, D0, alpha):
+    # D = D0 (1 + alpha C)
+    return D0 * (1 + alpha * C), np.full_like(C, D0 * alpha)
+
+def _diffusivity_free_volume(C, D0, f0, beta):
+    # Fujita free-volume model, D = D0 exp(beta C / (f0 (f0 + beta C)))
+    D = D0 * np.exp(beta * C / (f0 * (f0 + beta * C)))
+    return D, D * beta / (f0 + beta * C)**2
+
+_diffusivity_models = {
+    'constant': _diffusivity_constant,
+    'exponential': _diffusivity_exponential,
+    'linear': _diffusivity_linear,
+    'free-volume': _diffusivity_free_volume,
+}
+
+def flux_pde_var_D(D0, C_eq, L, T, dt, dx, D_model='exponential', D_params=None, rtol=1e-3, snapshot_times=None, stride=1, callback=None):
+    """
+    Solve the mass diffusion problem of flux_pde_const_D with a concentration-dependent diffusion coefficient D(C).
+
+    The equation dC/dt = d/dx (D(C) dC/dx) is discretised with finite volumes (D averaged over neighbouring nodes) and
+    advanced with backward Euler. Each step is solved by Newton's method with the analytic tridiagonal Jacobian. The
+    internal time step is adapted by step doubling to keep the local error below rtol * C_eq, and each pair of half steps is
+    Richardson-extrapolated to second order, so the flux is accurate to about rtol of its maximum. The results are reported on the
+    same time grid (spacing dt) and in the same format as flux_pde_const_D, so the visualisation functions can be used as is.
+
+    Parameters:
+    D0 (float): Diffusion coefficient at C = 0.
+    C_eq (float): Equilibrium concentration.
+    L (float): Thickness of the polymer.
+    T (float): Total time.
+    dt (float): Time step size of the results. The internal steps are never larger.
+    dx (float): Spatial step size.
+    D_model (str or callable): 'constant', 'exponential' (D0 exp(beta C)), 'linear' (D0 (1 + alpha C)) or 'free-volume'
+        (D0 exp(beta C / (f0 (f0 + beta C)))). A callable is called as D_model(C) and should return D(C) and dD/dC.
+    D_params (dict, optional): Parameters of D_model, e.g. {'beta': 0.5} for 'exponential' or {'f0': 0.1, 'beta': 0.05} for 'free-volume'.
+    rtol (float): Tolerance of the local error of each internal step, relative to C_eq.
+    snapshot_times (array-like, optional): Only store the concentration profile at the time steps nearest to these times.
+    stride (int): Only store the concentration profile at every stride-th time step. Ignored if snapshot_times is given.
+    callback (callable, optional): Called as callback(n, Nt) after every time step n of the results. Raising an exception aborts the solve.
+
+    Returns:
+    tuple: Concentration profile as a function of position x and time t (stored time steps only), and flux values at all time points.
+    """
+    if callable(D_model):
+        diffusivity = D_model
+    elif D_model in _diffusivity_models:
+        model, params = _diffusivity_models[D_model], dict(D_params or {})
+        diffusivity = lambda C: model(C, D0, **params)
+    else:
+        raise ValueError(f"Unknown D_model '{D_model}'. Use one of {list(_diffusivity_models)} or a callable.")
+    
+    # Calculate number of spatial and time steps
+    Nx = int(L / dx) + 1
+    Nt = int(T / dt + 1e-9) + 1
+    time = np.linspace(0, T, Nt)
+    
+    # Time steps at which the concentration profile is stored
+    if snapshot_times is not None:
+        keep = np.unique(np.clip(np.rint(np.asarray(snapshot_times, dtype=float) / T * (Nt - 1)), 0, Nt - 1).astype(int))
+    elif stride >= 1:
+        keep = np.arange(0, Nt, int(stride))
+    else:
+        raise ValueError("stride should be a positive integer.")
+    
+    flux_values = np.zeros(Nt)
+    C_surface = np.zeros((len(keep), Nx))
+    
+    # Initial and boundary conditions
+    C = np.zeros(Nx)
+    C[0] = C_eq
+    
+    def face_flux(C):
+        # Flux through the face at x = L
+        D_face = 0.5 * (diffusivity(C[-2:])[0].sum())
+        return -D_face * (C[-1] - C[-2]) / dx
+    
+    def newton_step(C_old, h):
+        # Backward Euler step of size h, returns None if Newton's method does not converge
+        k = h / dx**2
+        C_new = C_old.copy()
+        for _ in range(20):
+            D, dD = diffusivity(C_new)
+            D_face = 0.5 * (D[1:] + D[:-1])
+            grad = C_new[1:] - C_new[:-1]
+            G = D_face * grad   # D_{i+1/2} (C_{i+1} - C_i)
+            residual = C_new[1:-1] - C_old[1:-1] - k * (G[1:] - G[:-1])
+            
+            # Derivatives of G_{i+1/2} with respect to C_i and C_{i+1}
+            dG_left = 0.5 * dD[:-1] * grad - D_face
+            dG_right = 0.5 * dD[1:] * grad + D_face
+            diag = 1 - k * (dG_left[1:] - dG_right[:-1])
+            lower = k * dG_left[1:-1]     # dR_i / dC_{i-1}
+            upper = -k * dG_right[1:-1]   # dR_i / dC_{i+1}
+            _, _, _, delta, info = dgtsv(lower, diag, upper, -residual)
+            if info != 0:
+                return None
+            C_new[1:-1] += delta
+            if np.max(np.abs(delta)) <= 1e-10 * C_eq:
+                return C_new
+        return None
+    
+    # Initial internal step resolves the boundary layer at x = 0
+    D_max = diffusivity(np.array([0.0, C_eq]))[0].max()
+    h = min(dt, 0.1 * dx**2 / D_max)
+    t = 0.0
+    row = 0
+    for n in range(0, Nt):
+        while t < time[n] * (1 - 1e-12):
+            h_step = min(h, time[n] - t)
+            if Nx <= 2:
+                t = time[n]
+                break
+            
+            # Step doubling: one full step and two half steps
+            C_full = newton_step(C, h_step)
+            C_half = newton_step(C, 0.5 * h_step)
+            C_new = None if C_half is None else newton_step(C_half, 0.5 * h_step)
+            if C_full is None or C_new is None:
+                h = 0.5 * h_step
+                continue
+            
+            # Their difference estimates the local error of the two half steps, which is removed by Richardson
+            # extrapolation, so the accepted step is second order and the estimate an upper bound of its error
+            error = np.max(np.abs(C_new - C_full)) / C_eq
+            if error > rtol and h_step > 1e-12 * T:
+                h = h_step * max(0.2, 0.9 * np.sqrt(rtol / error))
+                continue
+            h = max(h, h_step * min(5.0, 0.9 * np.sqrt(rtol / max(error, 1e-16))))
+            C, t = 2 * C_new - C_full, t + h_step
+        
+        if row < len(keep) and keep[row] == n:
+            C_surface[row, :] = C
+            row += 1
+        flux_values[n] = face_flux(C)
+        if callback is not None:
+            callback(n, Nt)
+    flux_values = flux_values.tolist()
+    
+    # Convert results to pandas DataFrame
+    df_C_surface = pd.DataFrame(C_surface, columns=[f"x = {x:.3g}" for x in np.linspace(0, L, Nx)])
+    df_C_surface['Time'] = time[keep]
+    df_C_surface = df_C_surface[['Time'] + [col for col in df_C_surface.columns if col != 'Time']]
+    df_flux_values = pd.DataFrame(flux_values, columns=['Flux'])
+    df_flux_values['Time'] = time
+    df_flux_values = df_flux_values[['Time', 'Flux']]
+    
+    return C_surface, flux_values, df_C_surface, df_flux_values
+
+def flux_series_const_D(D, C_eq, L, t, x=None, tol=1e-12, tau_switch=0.1):
+    """
+    Evaluate the analytical (Crank) solution of the constant-D membrane problem with C(0, t) = C_eq, C(L, t) = 0 and C(x, 0) = 0.
+    
+    Each time is evaluated independently, so any time grid can be used, e.g. the measured 't / s' samples.
+    The long-time Fourier series is used for D t / L^2 >= tau_switch and the short-time error-function series below it,
+    both truncated adaptively so that the first neglected term is below tol.
+
+    Parameters:
+    D (float): Diffusion coefficient.
+    C_eq (float): Equilibrium concentration.
+    L (float): Thickness of the polymer.
+    t (array-like): Time points.
+    x (array-like, optional): Positions for the concentration profile. If None, only the flux is evaluated.
+    tol (float): Relative truncation tolerance of the series.
+    tau_switch (float): Dimensionless time D t / L^2 at which the long-time series takes over.
+
+    Returns:
+    tuple: Concentration profile of shape (len(t), len(x)) (None if x is None), and flux values at x = L as an ndarray.
+    """
+    t = np.atleast_1d(np.asarray(t, dtype=float))
+    tau = D * t / L**2
+    n_tol = -np.log(tol)
+    
+    long = tau >= tau_switch
+    short = (tau > 0) & ~long
+    
+    # Flux at x = L
+    flux = D * C_eq / L * _flux_series_shape(tau, tol=tol, tau_switch=tau_switch)[0]
+    
+    if x is None:
+        return None, flux
+    
+    # Concentration profile
+    xi = np.atleast_1d(np.asarray(x, dtype=float)) / L
+    C_surface = np.zeros((len(tau), len(xi)))
+    C_surface[:, xi <= 0] = C_eq  # Boundary condition at x = 0 holds for t >= 0
+    if long.any():
+        n = np.arange(1, int(np.ceil(np.sqrt(n_tol / (np.pi**2 * tau[long].min())))) + 1)
+        decay = np.exp(-np.outer(tau[long], n**2 * np.pi**2)) / n
+        C_surface[long, :] = C_eq * (1 - xi) - 2 * C_eq / np.pi * decay @ np.sin(np.outer(n, np.pi * xi))
+    if short.any():
+        m = np.arange(0, int(np.ceil(np.sqrt(tau[short].max() * n_tol))) + 1)
+        scale = 1 / (2 * np.sqrt(tau[short]))[:, None, None]
+        near = erfc((2 * m[None, :, None] + xi[None, None, :]) * scale)
+        far = erfc((2 * (m[None, :, None] + 1) - xi[None, None, :]) * scale)
+        C_surface[short, :] = C_eq * (near - far).sum(axis=1)
+    
+    return C_surface, flux
+
+def _flux_series_shape(tau, tol=1e-12, tau_switch=0.1):
+    """
+    Dimensionless flux g(tau) = J L / (D C_eq) at x = L of the constant-D membrane problem and its derivative dg/dtau,
+    from the same series as flux_series_const_D.
+    """
+    n_tol = -np.log(tol)
+    long = tau >= tau_switch
+    short = (tau > 0) & ~long
+    
+    g = np.zeros_like(tau)
+    dg = np.zeros_like(tau)
+    if long.any():
+        n = np.arange(1, int(np.ceil(np.sqrt(n_tol / (np.pi**2 * tau[long].min())))) + 1)
+        k = n**2 * np.pi**2
+        terms = (-1.0)**n * np.exp(-np.outer(tau[long], k))
+        g[long] = 1 + 2 * terms.sum(axis=1)
+        dg[long] = -2 * terms @ k
+    if short.any():
+        tau_short = tau[short]
+        m = np.arange(0, int(np.ceil(np.sqrt(tau_short.max() * n_tol))) + 1)
+        a = (2 * m + 1)**2 / 4
+        terms = np.exp(-np.outer(1 / tau_short, a))
+        sum_terms, sum_a_terms = terms.sum(axis=1), terms @ a
+        g[short] = 2 / np.sqrt(np.pi * tau_short) * sum_terms
+        dg[short] = 2 / np.sqrt(np.pi) * (sum_a_terms * tau_short**-2.5 - 0.5 * sum_terms * tau_short**-1.5)
+    return g, dg
+
+def fit_transient_flux(df: pd.DataFrame, L: float, D0: float, C_eq0: float, max_time: float = None, tol=1e-12) -> tuple:
+    """
+    Fit D and C_eq by least squares of the analytical constant-D flux against the whole measured flux curve.
+
+    The model is evaluated directly at the measured times with the series of flux_series_const_D, together with its
+    analytic derivatives with respect to log(D) and log(C_eq), so the fit converges in a few dozen cheap evaluations.
+
+    Parameters:
+    df (pd.DataFrame): Preprocessed data.
+    L (float): Thickness of the polymer in cm.
+    D0 (float): Initial guess of the diffusion coefficient in cm^2 s^-1, e.g. from the time-lag analysis.
+    C_eq0 (float): Initial guess of the equilibrium concentration in cm^3(STP) cm^-3.
+    max_time (float, optional): End of the fitted period in s. If None, fit up to the last row.
+    tol (float): Relative truncation tolerance of the series.
+
+    Returns:
+    tuple: Fitted diffusion coefficient (cm^2 s^-1), equilibrium concentration (cm^3(STP) cm^-3) and root-mean-square
+        residual of the flux (cm^3(STP) cm^-2 s^-1).
+    """
+    if 'flux / cm^3(STP) cm^-2 s^-1' not in df.columns:
+        raise ValueError("'flux / cm^3(STP) cm^-2 s^-1' does not exist. Please preprocess the data first.")
+    if D0 <= 0 or C_eq0 <= 0:
+        raise ValueError("D0 and C_eq0 should be positive.")
+    from scipy.optimize import least_squares  # Deferred, scipy.optimize is slow to import
+    
+    if max_time is not None:
+        df = df.loc[df['t / s'] <= max_time]
+    t = df['t / s'].to_numpy(dtype=float)
+    flux = df['flux / cm^3(STP) cm^-2 s^-1'].to_numpy(dtype=float)
+    valid = np.isfinite(t) & np.isfinite(flux)
+    t, flux = t[valid], flux[valid]
+    scale = D0 * C_eq0 / L   # Steady-state flux of the initial guess, to make the residuals O(1)
+    
+    def model(p):
+        D, C_eq = np.exp(p)
+        tau = D * t / L**2
+        g, dg = _flux_series_shape(tau, tol=tol)
+        J = D * C_eq / L * g
+        dJ_dlogD = D * C_eq / L * (g + tau * dg)
+        return J, np.column_stack((dJ_dlogD, J))   # dJ/dlog(C_eq) = J
+    
+    fit = least_squares(lambda p: (model(p)[0] - flux) / scale, np.log([D0, C_eq0]), jac=lambda p: model(p)[1] / scale, method='lm')
+    D, C_eq = np.exp(fit.x)
+    rms = scale * np.sqrt(np.mean(fit.fun**2))
+    return float(D), float(C_eq), float(rms)
+
 # def flux_pde_fvt_adim(Dt_Tp0)
\ No newline at end of file
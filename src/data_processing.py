@@ -4,15 +4,27 @@ data_processing.py
 Module for loading and preprocessing permeation data.
 """
 
+import numpy as np
 import pandas as pd
+import hashlib
 import math
+import os
 
-def load_data(file_path: str) -> pd.DataFrame:
+# Parsed Excel files are cached as Feather files in this subdirectory next to the data
+CACHE_DIR_NAME = '.cache'
+CACHE_MAX_BYTES = 256 * 1024**2  # [bytes]
+
+def load_data(file_path: str, use_cache: bool = False, cache_dir: str = None) -> pd.DataFrame:
     """
     Load data from a CSV file (.csv) or Excel file (.xlsx, .xls).
 
+    With use_cache, parsed Excel files are cached in a columnar binary (Feather) format keyed by file path, size, modification time
+    and content hash, so a repeat load of the same file skips the Excel parsing.
+
     Parameters:
     file_path (str): Path to the file.
+    use_cache (bool): Whether to read from and write to the ingestion cache. Off by default, so that loading never writes files.
+    cache_dir (str): Cache directory. If None, use a '.cache' subdirectory next to the file.
 
     Returns:
     pd.DataFrame: Loaded data as a DataFrame.
@@ -20,10 +32,81 @@ def load_data(file_path: str) -> pd.DataFrame:
     if file_path.endswith('.csv'):
         return pd.read_csv(file_path)
     elif file_path.endswith('.xlsx') or file_path.endswith('.xls'):
-        return pd.read_excel(file_path)
+        if not use_cache:
+            return pd.read_excel(file_path)
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR_NAME)
+        cache_path = os.path.join(cache_dir, f"{get_cache_key(file_path)}.feather")
+        try:
+            df = pd.read_feather(cache_path)
+            os.utime(cache_path)  # Mark as recently used
+            return df
+        except (OSError, ImportError, ValueError):
+            pass
+        df = pd.read_excel(file_path)
+        _write_cache(df, cache_path, CACHE_MAX_BYTES)
+        return df
     else:
         raise ValueError("Unsupported file format. Please provide a .csv, .xlxs or .xls file.")
 
+def get_cache_key(file_path: str) -> str:
+    """
+    Get the ingestion cache key of a file.
+
+    Parameters:
+    file_path (str): Path to the file.
+
+    Returns:
+    str: Hex digest of the absolute path, size, modification time and content of the file.
+    """
+    stat = os.stat(file_path)
+    key = hashlib.blake2b(digest_size=16)
+    key.update(f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}|".encode())
+    with open(file_path, 'rb') as f:
+        key.update(hashlib.blake2b(f.read(), digest_size=16).digest())
+    return key.hexdigest()
+
+def _write_cache(df: pd.DataFrame, cache_path: str, max_bytes: int):
+    """
+    Write a DataFrame to the ingestion cache and evict the least recently used files beyond max_bytes.
+    Caching is best effort, failures (e.g. read-only directory, pyarrow not installed) are ignored.
+    """
+    cache_dir = os.path.dirname(cache_path)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_feather(tmp_path)
+        os.replace(tmp_path, cache_path)  # Atomic, so concurrent readers never see a partial file
+    except (OSError, ImportError, ValueError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    evict_cache(cache_dir, max_bytes)
+
+def evict_cache(cache_dir: str, max_bytes: int = 0, suffix: str = '.feather'):
+    """
+    Remove the least recently used files from the ingestion cache until it is no larger than max_bytes.
+
+    Parameters:
+    cache_dir (str): Cache directory.
+    max_bytes (int): Maximum total size of the cache. 0 clears the cache.
+    suffix (str): Extension of the cache files, other files are left alone.
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(suffix):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
 def correct_baseline(df: pd.DataFrame, baseline: float = 0) -> pd.DataFrame:
     """
     Correct the baseline of the raw data.
@@ -88,48 +171,87 @@ def calculate_flux(df: pd.DataFrame, d_cm: float, qN2_mlmin: float = None, unit:
     
     return df['flux / cm^3(STP) cm^-2 s^-1']
 
-def calculate_cumulative_flux(df: pd.DataFrame) -> pd.DataFrame:
+def calculate_cumulative_flux(df: pd.DataFrame, t_prev: float = None, initial: float = 0.0) -> pd.DataFrame:
     """
     Calculate the cumulative flux based on 't / s' and 'y_CO2 / ppm'.
 
+    To continue the cumulative flux of earlier data (e.g. when the data arrives in chunks), pass the time and cumulative
+    flux of the last earlier row as t_prev and initial.
+
     Parameters:
     df (pd.DataFrame): Preprocessed data.
+    t_prev (float): Time of the row preceding df. If None, df starts at the first row.
+    initial (float): Cumulative flux at t_prev.
 
     Returns:
     pd.DataFrame: Data with cumulative flux.
     """
-    df['cumulative flux / cm^3(STP) cm^-2'] = (df['flux / cm^3(STP) cm^-2 s^-1'] * df['t / s'].diff().fillna(0)).cumsum()
+    dt = df['t / s'].diff()
+    if t_prev is not None and len(df) > 0:
+        dt.iloc[0] = df['t / s'].iloc[0] - t_prev
+    df['cumulative flux / cm^3(STP) cm^-2'] = initial + (df['flux / cm^3(STP) cm^-2 s^-1'] * dt.fillna(0)).cumsum()
     return df['cumulative flux / cm^3(STP) cm^-2']
 
-def identify_stabilisation_time(df: pd.DataFrame, column: str, window: int = 5, threshold: float = 0.001) -> float:
+def identify_stabilisation_time(df: pd.DataFrame, column: str, window=5, threshold=0.001):
     """
     Identify where flux has stabilised by comparing the rolling fractional changes of gradient of a specified column with respect to 't / s'.
 
+    The stabilisation time is the first time at which the rolling mean (over `window` points) of the absolute fractional change
+    of the gradient falls to `threshold` or below. All rolling means are computed from a single cumulative sum, so scanning
+    many (window, threshold) combinations costs O(n) per window.
+
     Parameters:
     df (pd.DataFrame): Preprocessed data.
     column (str): Column name to check for stabilisation.
-    window (int): Window size for rolling calculation.
-    threshold (float): Fractional threshold for determining stabilisation.
+    window (int or array-like): Window size(s) for rolling calculation.
+    threshold (float or array-like): Fractional threshold(s) for determining stabilisation.
 
     Returns:
-    stabilisation_time: Time corresponding to where the specified column has stabilised.
+    stabilisation_time: Time corresponding to where the specified column has stabilised, if window and threshold are scalars.
+        Otherwise a pd.DataFrame of stabilisation times with one row per window and one column per threshold (NaN where the column never stabilises).
     """
-    df = df.copy()
-    
     if column not in df.columns:
         raise ValueError(f"Column '{column}' does not exist in the DataFrame.")
     if 't / s' not in df.columns:
         raise ValueError("Column 't / s' does not exist in the DataFrame.")
     
-    df['gradient'] = (df[column].diff() / df['t / s'].diff())
-    df['pct_change_mean'] = (df[column].diff() / df['t / s'].diff()).pct_change().abs().rolling(window=window).mean()
-    df['pct_change_min'] = (df[column].diff() / df['t / s'].diff()).pct_change().abs().rolling(window=window).min()
-    df['pct_change_max'] = (df[column].diff() / df['t / s'].diff()).pct_change().abs().rolling(window=window).max()
-    df['pct_change_median'] = (df[column].diff() / df['t / s'].diff()).pct_change().abs().rolling(window=window).median()
-    # stabilisation_index = df[((df['pct_change_mean'] <= threshold)) & (df['pct_change_max'] <= threshold)].index[0]
-    stabilisation_index = df[((df['pct_change_mean'] <= threshold))].index[0]
-    stabilisation_time = df.loc[stabilisation_index, 't / s']
-    return stabilisation_time
+    scan = np.ndim(window) > 0 or np.ndim(threshold) > 0
+    windows = np.atleast_1d(window).astype(int)
+    thresholds = np.atleast_1d(threshold).astype(float)
+    if np.any(windows < 1):
+        raise ValueError("window should be a positive integer.")
+    
+    t = df['t / s'].to_numpy(dtype=float)
+    y = df[column].to_numpy(dtype=float)
+    
+    # Absolute fractional change of the gradient, aligned with t (undefined for the first two points)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gradient = np.diff(y) / np.diff(t)
+        pct_change = np.abs(gradient[1:] / gradient[:-1] - 1)
+    
+    # Undefined or very large changes are capped at a value above which no window mean can fall below any of the
+    # thresholds. This keeps the decisions exact while bounding the rounding error of the cumulative sum.
+    cap = 2 * windows.max() * max(thresholds.max(), 0) + 1
+    pct_change = np.concatenate(([cap, cap], np.minimum(np.nan_to_num(pct_change, nan=cap, posinf=cap), cap)))[:len(t)]
+    cumsum = np.concatenate(([0], np.cumsum(pct_change)))
+    
+    stabilisation_times = np.full((len(windows), len(thresholds)), np.nan)
+    for i, w in enumerate(windows):
+        if w > len(t):
+            continue
+        rolling_mean = (cumsum[w:] - cumsum[:-w]) / w   # Mean of the window ending at index w - 1, w, ...
+        
+        # First index where the running minimum of the rolling mean reaches each threshold
+        running_min = np.minimum.accumulate(rolling_mean)
+        first = np.searchsorted(-running_min, -thresholds, side='left')
+        found = first < len(rolling_mean)
+        stabilisation_times[i, found] = t[first[found] + w - 1]
+    
+    if scan:
+        return pd.DataFrame(stabilisation_times, index=pd.Index(windows, name='window'), columns=pd.Index(thresholds, name='threshold'))
+    if np.isnan(stabilisation_times[0, 0]):
+        raise ValueError(f"Column '{column}' does not stabilise for window={window} and threshold={threshold}.")
+    return float(stabilisation_times[0, 0])
 
 def preprocess_data(df: pd.DataFrame, d_cm: float, qN2_mlmin: float = None) -> pd.DataFrame:
     """
@@ -0,0 +1,126 @@
+"""
+instrumentation.py
+------------------
+Module for recording the wall time, CPU time and peak allocated memory of the stages of an analysis.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+import tracemalloc
+
+_NULL_STAGE = contextlib.nullcontext()
+
+# tracemalloc keeps one traced peak for the whole process, so the stages open in any timer on any thread share it
+_tracing_lock = threading.Lock()
+_open_peaks = []   # Peak traced memory seen so far by each open stage, as one-element lists
+_started_tracing = False   # Whether tracemalloc was started by the first open stage, and is stopped by the last
+
+def _fold_peak():
+    """Fold the traced peak since the last reset into every open stage and reset it. Called with _tracing_lock held."""
+    peak = tracemalloc.get_traced_memory()[1]
+    for cell in _open_peaks:
+        cell[0] = max(cell[0], peak)
+    tracemalloc.reset_peak()
+
+def _open_peak() -> list:
+    """Start tracing if needed and register a new open stage, returning its peak cell (initially the traced memory)."""
+    global _started_tracing
+    with _tracing_lock:
+        if not _open_peaks and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _fold_peak()
+        cell = [tracemalloc.get_traced_memory()[0]]
+        _open_peaks.append(cell)
+        return cell
+
+def _close_peak(cell: list) -> int:
+    """Unregister an open stage, stopping tracing after the last one if it was started here, and return its peak."""
+    global _started_tracing
+    with _tracing_lock:
+        _fold_peak()
+        del _open_peaks[next(i for i, open_cell in enumerate(_open_peaks) if open_cell is cell)]
+        if not _open_peaks and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+        return cell[0]
+
+class StageTimer:
+    """
+    Records a span (wall time, CPU time and peak allocated memory) for every stage run inside `stage(name)`.
+
+    Stages can be nested, the span of the outer stage includes the inner ones. Spans are kept in `spans` in the order
+    the stages finish and are passed to the callback as they finish.
+
+    Timers can be used on several threads at once. The CPU time and the peak memory are measured for the whole process,
+    so a stage that overlaps with work on other threads, e.g. a superseded GUI analysis still finishing, includes it.
+    """
+
+    def __init__(self, callback=None, trace_memory: bool = True):
+        """
+        Parameters:
+        callback (callable or logging.Logger, optional): Called as callback(span) when a stage finishes, or a logger to write the spans to.
+        trace_memory (bool): Whether to measure the peak allocated memory with tracemalloc, which slows down allocations while a stage runs.
+        """
+        if isinstance(callback, logging.Logger):
+            logger = callback
+            callback = lambda span: logger.info(format_span(span))
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.spans = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Record a span for the code run inside the context."""
+        if self.trace_memory:
+            peak_cell = _open_peak()
+            memory_start = peak_cell[0]
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            span = {
+                'stage': name,
+                'wall_time_s': time.perf_counter() - wall_start,
+                'cpu_time_s': time.process_time() - cpu_start,
+                'peak_memory_mb': None,
+            }
+            if self.trace_memory:
+                span['peak_memory_mb'] = (_close_peak(peak_cell) - memory_start) / 2**20
+            self.spans.append(span)
+            if self.callback is not None:
+                self.callback(span)
+
+def stage(timer: StageTimer, name: str):
+    """Context recording the stage name with timer, or doing nothing if timer is None."""
+    return _NULL_STAGE if timer is None else timer.stage(name)
+
+def format_span(span: dict) -> str:
+    """Format a span as one line of text."""
+    text = f"{span['stage']}: {span['wall_time_s']:.3f} s wall, {span['cpu_time_s']:.3f} s CPU"
+    if span['peak_memory_mb'] is not None:
+        text += f", {span['peak_memory_mb']:.1f} MB peak"
+    return text
+
+def summarise_spans(spans_per_run) -> 'pd.DataFrame':
+    """
+    Aggregate the spans of many runs, e.g. of a batch.
+
+    Parameters:
+    spans_per_run (iterable): Lists of spans, one list per run (None or NaN for runs without spans).
+
+    Returns:
+    pd.DataFrame: Count, total and mean wall time, total CPU time and maximum peak memory per stage.
+    """
+    import pandas as pd
+    spans = pd.DataFrame([span for spans in spans_per_run if isinstance(spans, list) for span in spans],
+                         columns=['stage', 'wall_time_s', 'cpu_time_s', 'peak_memory_mb'])
+    return spans.groupby('stage', sort=False).agg(
+        count=('wall_time_s', 'size'),
+        total_wall_time_s=('wall_time_s', 'sum'),
+        mean_wall_time_s=('wall_time_s', 'mean'),
+        total_cpu_time_s=('cpu_time_s', 'sum'),
+        max_peak_memory_mb=('peak_memory_mb', 'max'),
+    )
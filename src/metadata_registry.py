@@ -0,0 +1,239 @@
+"""
+metadata_registry.py
+--------------------
+Module for looking up the metadata of experiments (thickness, diameter, flow rate, gas, temperature and pressure).
+
+The metadata are kept in a JSON registry file, by default data/metadata.json, mapping experiment names (data file
+names without extension) to their metadata, e.g.
+{"S3R1": {"thickness": 0.1, "diameter": 1.0, "flow_rate": 4.17, "gas": "CO2"}}.
+Temperature and pressure are parsed from names such as 'RUN_H_25C-100bar_7' unless the registry gives them.
+
+Usage:
+    python src/metadata_registry.py data/ [--gas CO2] [--temperature 50] [--pressure 100]
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from collections import defaultdict
+
+DEFAULT_METADATA_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'metadata.json'))
+DATA_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+# Metadata of each experiment and their units
+FIELDS = {
+    'thickness': 'cm',
+    'diameter': 'cm',
+    'flow_rate': 'ml min^-1',
+    'gas': None,
+    'temperature': '°C',
+    'pressure': 'bar',
+}
+INDEXED_FIELDS = ('gas', 'temperature', 'pressure', 'thickness')
+
+_CONDITIONS_PATTERN = re.compile(r'(?:^|_)(\d+(?:\.\d+)?)C-(\d+(?:\.\d+)?)bar(?:_|$)')
+# Directory mtimes closer than this to the time of the scan may not change again on the next change to the directory
+_MTIME_RESOLUTION_NS = 2 * 10**9
+
+def parse_experiment_name(name: str) -> dict:
+    """
+    Parse the temperature and pressure from an experiment name, e.g. 'RUN_H_25C-100bar_7'.
+
+    Parameters:
+    name (str): Experiment name.
+
+    Returns:
+    dict: 'temperature' in °C and 'pressure' in bar, or an empty dictionary if the name does not contain them.
+    """
+    match = _CONDITIONS_PATTERN.search(name)
+    if match is None:
+        return {}
+    return {'temperature': float(match.group(1)), 'pressure': float(match.group(2))}
+
+class MetadataRegistry:
+    """
+    In-memory index of the metadata of experiments, read from a registry file and from the names of scanned data files.
+
+    Lookups by experiment name and filters on the indexed fields (gas, temperature, pressure and thickness) do not
+    iterate over the experiments. The registry file is reread and a data directory relisted only when its mtime changed.
+    """
+
+    def __init__(self, path: str = DEFAULT_METADATA_PATH):
+        """
+        Parameters:
+        path (str): Path of the registry file. A missing file is an empty registry.
+        """
+        self.path = path
+        self._entries = {}   # Experiment name -> metadata given by the registry file
+        self._records = {}   # Experiment name -> metadata of every known experiment
+        self._index = {field: defaultdict(set) for field in INDEXED_FIELDS}   # Field -> value -> experiment names
+        self._registry_mtime_ns = -1   # Never read
+        self._scans = {}   # Data directory -> (mtime of the directory, data file names)
+        self.reload()
+
+    def reload(self) -> bool:
+        """
+        Reread the registry file if it changed since it was last read.
+
+        Returns:
+        bool: Whether the registry file was reread.
+        """
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if mtime_ns == self._registry_mtime_ns:
+            return False
+        entries = {}
+        if mtime_ns is not None:
+            with open(self.path) as f:
+                entries = json.load(f)
+            if not isinstance(entries, dict):
+                raise ValueError(f"The metadata registry {self.path} should map experiment names to metadata dictionaries.")
+        self._entries = entries
+        self._registry_mtime_ns = mtime_ns
+
+        # Rebuild the index from the registry and the data files already scanned
+        self._records = {}
+        self._index = {field: defaultdict(set) for field in INDEXED_FIELDS}
+        for name in entries:
+            self._add_record(name)
+        for _, file_names in self._scans.values():
+            for file_name in file_names:
+                self._add_record(os.path.splitext(file_name)[0])
+        return True
+
+    def _add_record(self, name: str):
+        if name in self._records:
+            return
+        record = {'experiment': name, **dict.fromkeys(FIELDS), **parse_experiment_name(name), **self._entries.get(name, {})}
+        self._records[name] = record
+        for field in INDEXED_FIELDS:
+            if record.get(field) is not None:
+                self._index[field][record[field]].add(name)
+
+    def scan(self, data_dir: str, extensions: tuple = DATA_EXTENSIONS) -> list:
+        """
+        List the data files in a directory and add the experiments without a registry entry to the index.
+
+        The directory is only relisted if its mtime changed since the last scan, so repeated scans cost one stat call.
+
+        Parameters:
+        data_dir (str): Directory containing the data files.
+        extensions (tuple): Extensions of the files to return, a subset of DATA_EXTENSIONS.
+
+        Returns:
+        list: Sorted names of the data files.
+        """
+        self.reload()
+        data_dir = os.path.abspath(data_dir)
+        mtime_ns = os.stat(data_dir).st_mtime_ns
+        scan = self._scans.get(data_dir)
+        if scan is None or scan[0] != mtime_ns:
+            with os.scandir(data_dir) as entries:
+                file_names = sorted(entry.name for entry in entries if entry.name.endswith(DATA_EXTENSIONS) and entry.is_file())
+            if time.time_ns() - mtime_ns < _MTIME_RESOLUTION_NS:
+                mtime_ns = None   # A change within the same mtime tick would go unnoticed, so relist on the next scan
+            scan = self._scans[data_dir] = (mtime_ns, file_names)
+            for file_name in file_names:
+                self._add_record(os.path.splitext(file_name)[0])
+        return [file_name for file_name in scan[1] if file_name.endswith(tuple(extensions))]
+
+    def get(self, name: str, default=None) -> dict:
+        """
+        Get the metadata of an experiment.
+
+        Parameters:
+        name (str): Experiment name, or data file name.
+        default: Returned if the experiment is unknown.
+
+        Returns:
+        dict: 'experiment' and the FIELDS, None where unknown.
+        """
+        name = os.path.splitext(name)[0] if name.endswith(DATA_EXTENSIONS) else name
+        return self._records.get(name, default)
+
+    def __getitem__(self, name: str) -> dict:
+        record = self.get(name)
+        if record is None:
+            raise KeyError(name)
+        return record
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def names(self) -> list:
+        """Names of the experiments in the registry file, in the order of the file."""
+        return list(self._entries)
+
+    def filter(self, **criteria) -> list:
+        """
+        Select experiments whose metadata equal the given values, e.g. filter(gas='CO2', temperature=50).
+
+        Parameters:
+        **criteria: Values of FIELDS. Indexed fields are looked up in the index, the others compared one by one.
+
+        Returns:
+        list: Metadata of the selected experiments, sorted by name.
+        """
+        unknown = set(criteria) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown metadata fields: {', '.join(sorted(unknown))}")
+        names = None
+        for field in INDEXED_FIELDS:
+            if field in criteria:
+                matches = self._index[field].get(criteria[field], set())
+                names = set(matches) if names is None else names & matches
+        records = [self._records[name] for name in (self._records if names is None else names)]
+        records = [record for record in records if all(record[field] == value for field, value in criteria.items())]
+        return sorted(records, key=lambda record: record['experiment'])
+
+_registries = {}
+
+def get_registry(path: str = DEFAULT_METADATA_PATH) -> MetadataRegistry:
+    """
+    Get the registry of a registry file, shared within the process and reread if the file changed.
+
+    Parameters:
+    path (str): Path of the registry file.
+
+    Returns:
+    MetadataRegistry: The registry.
+    """
+    path = os.path.abspath(path)
+    registry = _registries.get(path)
+    if registry is None:
+        registry = _registries[path] = MetadataRegistry(path)
+    else:
+        registry.reload()
+    return registry
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='List the data files of a directory with their metadata.')
+    parser.add_argument('data_dir', help='Directory containing the data files.')
+    parser.add_argument('--metadata', default=DEFAULT_METADATA_PATH, help='Path of the metadata registry (.json).')
+    parser.add_argument('--gas', default=None, help='Only experiments with this gas.')
+    parser.add_argument('--temperature', type=float, default=None, help='Only experiments at this temperature in °C.')
+    parser.add_argument('--pressure', type=float, default=None, help='Only experiments at this pressure in bar.')
+    args = parser.parse_args(argv)
+
+    registry = get_registry(args.metadata)
+    file_names = registry.scan(args.data_dir)
+    criteria = {field: getattr(args, field) for field in ('gas', 'temperature', 'pressure') if getattr(args, field) is not None}
+    selected = {record['experiment'] for record in registry.filter(**criteria)}
+    for file_name in file_names:
+        record = registry.get(file_name)
+        if record['experiment'] in selected:
+            print(f"{file_name}: " + ', '.join(f"{field} = {record[field]}" for field in FIELDS))
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,220 @@
+"""
+result_cache.py
+---------------
+Module for caching the results of the time-lag analysis workflow on disk.
+
+Results are stored as .npz files named by a hash of the content of the data file, the analysis parameters and the
+version of the analysis code, so a rerun with the same inputs loads the result instead of recomputing it and any
+change to the data, the parameters or the code misses the cache. The least recently used results are evicted beyond
+a size limit.
+
+Usage:
+    python src/result_cache.py data/.cache/results [--clear] [--invalidate EXPERIMENT ...]
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from data_processing import CACHE_DIR_NAME, evict_cache
+
+RESULT_CACHE_DIR_NAME = 'results'   # Subdirectory of the ingestion cache directory
+RESULT_CACHE_MAX_BYTES = 1024**3  # [bytes]
+
+# Modules whose code determines the results, any change to them invalidates the cache
+CODE_MODULES = ('calculations', 'data_processing', 'time_lag_analysis', 'result_cache')
+
+@functools.lru_cache(maxsize=None)
+def get_code_version() -> str:
+    """
+    Get a hash of the analysis code and of the versions of the numerical libraries.
+
+    Returns:
+    str: Hex digest.
+    """
+    import scipy
+    key = hashlib.blake2b(digest_size=16)
+    key.update(f"{np.__version__}|{pd.__version__}|{scipy.__version__}|".encode())
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in CODE_MODULES:
+        with open(os.path.join(src_dir, f"{module}.py"), 'rb') as f:
+            key.update(f.read())
+    return key.hexdigest()
+
+def get_file_hash(path: str) -> str:
+    """
+    Get a hash of the content of a file.
+
+    Parameters:
+    path (str): Path to the file.
+
+    Returns:
+    str: Hex digest.
+    """
+    key = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            key.update(chunk)
+    return key.hexdigest()
+
+def get_result_key(input_hash: str, **params) -> str:
+    """
+    Get the result cache key of a data file analysed with the given parameters.
+
+    Parameters:
+    input_hash (str): Hash of the content of the data file from get_file_hash.
+    **params: Parameters of the analysis, which must be JSON serialisable.
+
+    Returns:
+    str: Hex digest of the content of the file, the parameters and the code version.
+    """
+    key = hashlib.blake2b(digest_size=16)
+    key.update(input_hash.encode())
+    key.update(json.dumps(params, sort_keys=True).encode())
+    key.update(get_code_version().encode())
+    return key.hexdigest()
+
+def get_default_result_cache_dir(datapath: str) -> str:
+    """Result cache directory next to a data file, inside its ingestion cache directory."""
+    return os.path.join(os.path.dirname(os.path.abspath(datapath)), CACHE_DIR_NAME, RESULT_CACHE_DIR_NAME)
+
+class ResultCache:
+    """
+    Directory of TimeLagAnalysisResult files keyed by get_result_key, evicting the least recently used beyond max_bytes.
+
+    Reads and writes are best effort: a missing, corrupt or unreadable entry is a miss and a failed write is ignored.
+    Entries are written atomically, so the cache can be shared by concurrent processes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        """
+        Parameters:
+        cache_dir (str): Cache directory, created on the first write.
+        max_bytes (int): Maximum total size of the cache.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key: str, **kwargs):
+        """
+        Load the result stored under key.
+
+        Parameters:
+        key (str): Key from get_result_key.
+        **kwargs: Passed to TimeLagAnalysisResult.load (progress_callback, pde_cache, timer).
+
+        Returns:
+        TimeLagAnalysisResult or None: The stored result, or None on a miss.
+        """
+        from time_lag_analysis import TimeLagAnalysisResult   # Imported here as time_lag_analysis imports this module
+        path = self.path(key)
+        try:
+            result = TimeLagAnalysisResult.load(path, **kwargs)
+            os.utime(path)  # Mark as recently used
+            return result
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            self.invalidate(key)   # Corrupt entry
+            return None
+
+    def put(self, key: str, result):
+        """
+        Store a result under key and evict the least recently used entries beyond max_bytes.
+
+        Parameters:
+        key (str): Key from get_result_key.
+        result (TimeLagAnalysisResult): Result to store, with its PDE solution if it has been computed.
+        """
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            result.save(tmp_path)
+            os.replace(tmp_path, path)  # Atomic, so concurrent readers never see a partial file
+        except (OSError, ValueError, TypeError):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        evict_cache(self.cache_dir, self.max_bytes, suffix='.npz')
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def entries(self) -> pd.DataFrame:
+        """
+        List the stored results.
+
+        Returns:
+        pd.DataFrame: Key, experiment, whether the PDE solution is stored, size in MB and time of last use of each entry, most recently used first.
+        """
+        rows = []
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if not entry.name.endswith('.npz'):
+                    continue
+                stat = entry.stat()
+                try:
+                    with np.load(entry.path, allow_pickle=False) as data:
+                        experiment = json.loads(data['results'].item()).get('experiment')
+                        has_pde = 'C_profile' in data
+                except (OSError, ValueError, KeyError):
+                    experiment, has_pde = None, False
+                rows.append({'key': entry.name[:-len('.npz')], 'experiment': experiment, 'pde_solution': has_pde,
+                             'size_mb': stat.st_size / 2**20, 'last_used': pd.Timestamp(stat.st_mtime, unit='s')})
+        entries = pd.DataFrame(rows, columns=['key', 'experiment', 'pde_solution', 'size_mb', 'last_used'])
+        return entries.sort_values('last_used', ascending=False, ignore_index=True)
+
+    def invalidate(self, key: str = None, experiment: str = None) -> int:
+        """
+        Remove the entry stored under key, or all entries of an experiment, or all entries if neither is given.
+
+        Parameters:
+        key (str, optional): Key of the entry to remove.
+        experiment (str, optional): Experiment whose entries to remove.
+
+        Returns:
+        int: Number of entries removed.
+        """
+        if key is not None:
+            paths = [self.path(key)]
+        elif experiment is not None:
+            entries = self.entries()
+            paths = [self.path(key) for key in entries.loc[entries['experiment'] == experiment, 'key']]
+        else:
+            paths = [self.path(key) for key in self.entries()['key']]
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inspect or invalidate the result cache of the time-lag analysis.')
+    parser.add_argument('cache_dir', help=f'Result cache directory (e.g. data/{CACHE_DIR_NAME}/{RESULT_CACHE_DIR_NAME}).')
+    parser.add_argument('--clear', action='store_true', help='Remove all entries.')
+    parser.add_argument('--invalidate', nargs='+', default=[], metavar='EXPERIMENT', help='Remove the entries of these experiments.')
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.cache_dir)
+    if args.clear:
+        print(f"Removed {cache.invalidate()} entries")
+    for experiment in args.invalidate:
+        print(f"Removed {cache.invalidate(experiment=experiment)} entries of {experiment}")
+    entries = cache.entries()
+    print(entries.to_string(index=False) if not entries.empty else 'Cache is empty')
+    print(f"{len(entries)} entries, {entries['size_mb'].sum():.1f} MB")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+"""
+results_store.py
+----------------
+Module for collecting the results of many analyses in an SQLite database and querying them across experiments.
+
+Every analysis appended to the store is one row of the 'analyses' table, which is indexed on experiment, temperature
+and pressure so that selections such as all 50 °C runs above 100 bar do not scan the table.
+
+Usage:
+    python src/results_store.py results.sqlite [--experiment S3R1] [--temperature 45 55] [--pressure 100 inf] [--output runs.csv]
+"""
+
+import argparse
+import contextlib
+import math
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+# Columns of the 'analyses' table after 'id', in order
+COLUMNS = {
+    'created': 'TEXT',
+    'experiment': 'TEXT',
+    'datapath': 'TEXT',
+    'input_hash': 'TEXT',
+    'thickness': 'REAL',
+    'diameter': 'REAL',
+    'flow_rate': 'REAL',
+    'stabilisation_start': 'REAL',
+    'stabilisation_end': 'REAL',
+    'stabilisation_time': 'REAL',
+    'temperature': 'REAL',
+    'pressure': 'REAL',
+    'slope': 'REAL',
+    'intercept': 'REAL',
+    'time_lag': 'REAL',
+    'diffusion_coefficient': 'REAL',
+    'permeability': 'REAL',
+    'solubility_coefficient': 'REAL',
+    'solubility': 'REAL',
+    'transient_diffusion_coefficient': 'REAL',
+    'transient_solubility_coefficient': 'REAL',
+    'transient_permeability': 'REAL',
+    'transient_solubility': 'REAL',
+    'transient_flux_rms': 'REAL',
+}
+INDEXED_COLUMNS = ('experiment', 'temperature', 'pressure')
+
+def _sql_value(value):
+    """Convert numpy scalars to Python values that sqlite3 can store."""
+    return value.item() if hasattr(value, 'item') else value
+
+class ResultsStore:
+    """
+    SQLite database of analysis results, one row per analysis.
+
+    A connection is opened per operation, so a store can be used from several threads, and concurrent processes can
+    append to the same file (writers wait up to `timeout` seconds for each other).
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        """
+        Parameters:
+        path (str): Path of the database file, created with its tables and indexes if it does not exist.
+        timeout (float): Seconds to wait for a lock held by another connection.
+        """
+        self.path = path
+        self.timeout = timeout
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')   # Readers do not block the writer
+            columns = ', '.join(f"{name} {sql_type}" for name, sql_type in COLUMNS.items())
+            connection.execute(f"CREATE TABLE IF NOT EXISTS analyses (id INTEGER PRIMARY KEY, {columns})")
+            for column in INDEXED_COLUMNS:
+                connection.execute(f"CREATE INDEX IF NOT EXISTS idx_analyses_{column} ON analyses ({column})")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Connection committing on success and rolling back on error, closed on exit."""
+        connection = sqlite3.connect(self.path, timeout=self.timeout)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def add(self, results: dict, datapath: str = None, input_hash: str = None, d_cm: float = None, qN2_mlmin: float = None,
+            stabilisation_time_range: tuple = (None, None)) -> int:
+        """
+        Append the results of one analysis.
+
+        Parameters:
+        results (dict): Scalar results, e.g. TimeLagAnalysisResult.results. Keys without a column are ignored and missing ones stored as NULL.
+        datapath (str, optional): Path of the data file.
+        input_hash (str, optional): Hash of the content of the data file (see result_cache.get_file_hash).
+        d_cm (float, optional): Diameter of the polymer in cm.
+        qN2_mlmin (float, optional): Flow rate of N2 in ml/min.
+        stabilisation_time_range (tuple): Start and end times of the stabilisation period given to the analysis (None if detected).
+
+        Returns:
+        int: Id of the new row.
+        """
+        row = {name: _sql_value(results.get(name)) for name in COLUMNS}
+        row.update({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'datapath': None if datapath is None else os.path.abspath(datapath),
+            'input_hash': input_hash,
+            'diameter': d_cm,
+            'flow_rate': qN2_mlmin,
+            'stabilisation_start': stabilisation_time_range[0],
+            'stabilisation_end': stabilisation_time_range[1],
+        })
+        with self._connect() as connection:
+            cursor = connection.execute(
+                f"INSERT INTO analyses ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})", [_sql_value(v) for v in row.values()])
+            return cursor.lastrowid
+
+    def query(self, experiment=None, temperature_range: tuple = None, pressure_range: tuple = None, latest_only: bool = False) -> pd.DataFrame:
+        """
+        Select analyses, e.g. query(temperature_range=(45, 55), pressure_range=(100, None)) for all 50 °C runs above 100 bar.
+
+        Parameters:
+        experiment (str or list, optional): Experiment name or names.
+        temperature_range (tuple, optional): Lowest and highest temperature in °C, either can be None.
+        pressure_range (tuple, optional): Lowest and highest pressure in bar, either can be None.
+        latest_only (bool): Whether to keep only the latest analysis of each experiment.
+
+        Returns:
+        pd.DataFrame: Selected analyses ordered by experiment and time of analysis.
+        """
+        conditions, params = [], []
+        if experiment is not None:
+            experiments = [experiment] if isinstance(experiment, str) else list(experiment)
+            conditions.append(f"experiment IN ({', '.join('?' * len(experiments))})")
+            params += experiments
+        for column, value_range in [('temperature', temperature_range), ('pressure', pressure_range)]:
+            if value_range is None:
+                continue
+            low, high = value_range
+            if low is not None and not math.isinf(low):
+                conditions.append(f"{column} >= ?")
+                params.append(low)
+            if high is not None and not math.isinf(high):
+                conditions.append(f"{column} <= ?")
+                params.append(high)
+        if latest_only:
+            conditions.append("id IN (SELECT MAX(id) FROM analyses GROUP BY experiment)")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return self.query_sql(f"SELECT * FROM analyses {where} ORDER BY experiment, id", params)
+
+    def query_sql(self, sql: str, params=()) -> pd.DataFrame:
+        """
+        Run an SQL query against the store, e.g. "SELECT experiment, AVG(permeability) FROM analyses GROUP BY experiment".
+
+        Parameters:
+        sql (str): SQL query.
+        params (sequence): Values of the '?' placeholders of the query.
+
+        Returns:
+        pd.DataFrame: Result of the query.
+        """
+        with self._connect() as connection:
+            return pd.read_sql_query(sql, connection, params=list(params))
+
+    def experiments(self) -> list:
+        """Names of the experiments in the store, sorted."""
+        return self.query_sql("SELECT DISTINCT experiment FROM analyses ORDER BY experiment")['experiment'].tolist()
+
+    def __len__(self) -> int:
+        return int(self.query_sql("SELECT COUNT(*) AS n FROM analyses")['n'].iloc[0])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query the results store of the time-lag analysis.')
+    parser.add_argument('path', help='Path of the results store (.sqlite).')
+    parser.add_argument('--experiment', nargs='+', default=None, help='Experiment names.')
+    parser.add_argument('--temperature', type=float, nargs=2, default=None, metavar=('MIN', 'MAX'), help='Temperature range in °C (inf for no bound).')
+    parser.add_argument('--pressure', type=float, nargs=2, default=None, metavar=('MIN', 'MAX'), help='Pressure range in bar (inf for no bound).')
+    parser.add_argument('--latest', action='store_true', help='Only the latest analysis of each experiment.')
+    parser.add_argument('--output', default=None, help='Path of a .csv file to save the selection to.')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        parser.error(f"No results store at {args.path}")
+    selection = ResultsStore(args.path).query(experiment=args.experiment, temperature_range=args.temperature,
+                                              pressure_range=args.pressure, latest_only=args.latest)
+    if args.output:
+        selection.to_csv(args.output, index=False)
+    print(selection.to_string(index=False) if not selection.empty else 'No analyses found')
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,300 @@
+"""
+streaming.py
+------------
+Module for analysing a permeation run while it is still being recorded.
+
+The data file (.csv) is tailed in chunks as the logger appends to it. Baseline, flux and cumulative flux are continued
+from the previous chunk and the straight-line fit to the steady-state cumulative flux is updated in O(1) per sample,
+so the time lag, D, P and S are updated without reprocessing the history and the memory use stays bounded.
+
+Usage:
+    python src/streaming.py data/run.csv --L-cm 0.1 [--d-cm 1.0] [--qN2-mlmin 8.0] [--stabilisation-time-range START END]
+"""
+
+import argparse
+import io
+import time
+
+import numpy as np
+import pandas as pd
+from calculations import calculate_time_lag_parameters
+from data_processing import correct_baseline, calculate_pressure, calculate_flux, calculate_cumulative_flux, identify_stabilisation_time
+
+BASELINE_POINTS = 11  # Same as preprocess_data, which averages the first 11 rows (df.loc[:10])
+
+class RunningLinearFit:
+    """
+    Least-squares straight line y = slope * x + intercept, updated in O(1) per sample.
+
+    Keeps the count, means and co-moments of x and y (Welford's algorithm), which avoids the cancellation
+    of summing raw powers of large times.
+    """
+    __slots__ = ('n', 'mean_x', 'mean_y', 'M2_x', 'C_xy')
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.M2_x = 0.0
+        self.C_xy = 0.0
+
+    def update(self, x, y):
+        """
+        Add samples to the fit.
+
+        Parameters:
+        x (float or array-like): x values.
+        y (float or array-like): y values.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        if len(x) == 0:
+            return
+        # Merge the moments of the new samples into the running moments (Chan et al.)
+        n_b = len(x)
+        mean_x_b, mean_y_b = x.mean(), y.mean()
+        M2_x_b = np.sum((x - mean_x_b)**2)
+        C_xy_b = np.sum((x - mean_x_b) * (y - mean_y_b))
+        n = self.n + n_b
+        delta_x, delta_y = mean_x_b - self.mean_x, mean_y_b - self.mean_y
+        self.M2_x += M2_x_b + delta_x**2 * self.n * n_b / n
+        self.C_xy += C_xy_b + delta_x * delta_y * self.n * n_b / n
+        self.mean_x += delta_x * n_b / n
+        self.mean_y += delta_y * n_b / n
+        self.n = n
+
+    @property
+    def slope(self):
+        return self.C_xy / self.M2_x if self.n > 1 and self.M2_x > 0 else np.nan
+
+    @property
+    def intercept(self):
+        return self.mean_y - self.slope * self.mean_x
+
+class StreamingTimeLagAnalysis:
+    """
+    Incremental time-lag analysis of raw data arriving in chunks.
+
+    Each chunk is preprocessed like preprocess_data, continuing the baseline and cumulative flux of the previous chunks.
+    Until the stabilisation time is known, only the last window + 1 rows are kept to detect it, afterwards every row
+    after the stabilisation time (and up to the end of stablisation_time_range) goes into a running linear fit.
+    """
+    def __init__(self, L_cm: float, d_cm: float, qN2_mlmin: float = None, stablisation_time_range: tuple = (None, None), experiment: str = None, window: int = 70, threshold: float = 0.003):
+        """
+        Parameters:
+        L_cm (float): Thickness of the polymer in cm.
+        d_cm (float): Diameter of the polymer in cm.
+        qN2_mlmin (float): Flow rate of N2 in ml/min. If None, use the column 'qN2 / ml min^-1' from the data.
+        stablisation_time_range (tuple): Tuple containing the start and end times for the stabilisation period. If the start is None, it is detected.
+        experiment (str): Name of the experiment.
+        window (int): Window size for detecting the stabilisation time.
+        threshold (float): Fractional threshold for detecting the stabilisation time.
+        """
+        if stablisation_time_range[0] is not None and stablisation_time_range[1] is not None:
+            if stablisation_time_range[0] >= stablisation_time_range[1]:
+                raise ValueError("The first element of stablisation_time_range should be less than the second element.")
+        self.L_cm = L_cm
+        self.d_cm = d_cm
+        self.qN2_mlmin = qN2_mlmin
+        self.experiment = experiment
+        self.window = window
+        self.threshold = threshold
+        self.stabilisation_time = stablisation_time_range[0]
+        self.max_time = stablisation_time_range[1] if stablisation_time_range[1] is not None else np.inf
+
+        self.baseline = None
+        self.n_samples = 0
+        self.t_last = None
+        self.cumulative_flux_last = 0.0
+        self.fit = RunningLinearFit()
+        self.pressure_sum = 0.0
+        self.temperature_sum = 0.0
+        self._pending = []   # Raw rows received before the baseline is known
+        self._tail = None    # Last window + 1 preprocessed rows, for detecting the stabilisation time
+
+    def update(self, chunk: pd.DataFrame) -> dict:
+        """
+        Add a chunk of raw data.
+
+        Parameters:
+        chunk (pd.DataFrame): New raw rows with 't / s', 'y_CO2 / ppm', 'P_cell / barg', 'T / °C' (and 'qN2 / ml min^-1' if qN2_mlmin is None).
+
+        Returns:
+        dict: Current results (see results), or None if there are not enough data to fit yet.
+        """
+        if self.baseline is None:
+            self._pending.append(chunk)
+            chunk = pd.concat(self._pending, ignore_index=True)
+            if len(chunk) < BASELINE_POINTS:
+                return self.results
+            self._pending = []
+            self.baseline = chunk['y_CO2 / ppm'].iloc[:BASELINE_POINTS].mean()
+        if len(chunk) == 0:
+            return self.results
+
+        df = self._preprocess(chunk)
+        if self.stabilisation_time is None:
+            self._detect_stabilisation(df)
+
+        if self.stabilisation_time is not None:
+            t = df['t / s']
+            df_ss = df[(t > self.stabilisation_time) & (t <= self.max_time)]
+            self.fit.update(df_ss['t / s'], df_ss['cumulative flux / cm^3(STP) cm^-2'])
+            self.pressure_sum += df_ss['P_cell / bar'].sum()
+            self.temperature_sum += df_ss['T / °C'].sum()
+        return self.results
+
+    def _preprocess(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Preprocess a chunk of raw data, continuing from the previous chunk.
+        """
+        df = chunk.copy()
+        df['y_CO2_bl / ppm'] = correct_baseline(df, self.baseline)
+        df['P_cell / bar'] = calculate_pressure(df)
+        df['flux / cm^3(STP) cm^-2 s^-1'] = calculate_flux(df, d_cm=self.d_cm, qN2_mlmin=self.qN2_mlmin, unit='cm^3 cm^-2 s^-1')
+        df['cumulative flux / cm^3(STP) cm^-2'] = calculate_cumulative_flux(df, t_prev=self.t_last, initial=self.cumulative_flux_last)
+        self.n_samples += len(df)
+        self.t_last = df['t / s'].iloc[-1]
+        self.cumulative_flux_last = df['cumulative flux / cm^3(STP) cm^-2'].iloc[-1]
+        return df[['t / s', 'P_cell / bar', 'T / °C', 'cumulative flux / cm^3(STP) cm^-2']]
+
+    def _detect_stabilisation(self, df: pd.DataFrame):
+        """
+        Look for the stabilisation time in the kept tail plus a new preprocessed chunk.
+        """
+        tail = df if self._tail is None else pd.concat([self._tail, df], ignore_index=True)
+        try:
+            self.stabilisation_time = identify_stabilisation_time(tail, column='cumulative flux / cm^3(STP) cm^-2', window=self.window, threshold=self.threshold)
+        except ValueError:
+            # Not stabilised yet. Keep enough rows for the first window that can end in the next chunk.
+            self._tail = tail.iloc[-(self.window + 1):].reset_index(drop=True)
+            return
+        self._tail = None
+
+    @property
+    def results(self) -> dict:
+        """
+        Current results in the same format as TimeLagAnalysisResult.results, plus the time and number of the last
+        sample ('time', 'n_samples') and the number of fitted samples ('n_fit'). None if fewer than 2 samples are fitted.
+        """
+        if self.fit.n < 2:
+            return None
+        slope, intercept = self.fit.slope, self.fit.intercept
+        pressure = self.pressure_sum / self.fit.n
+        time_lag, diffusion_coefficient, permeability, solubility_coefficient, solubility = calculate_time_lag_parameters(slope, intercept, pressure, self.L_cm)
+        return {
+            'experiment': self.experiment,
+            'thickness': self.L_cm,
+            'temperature': self.temperature_sum / self.fit.n,
+            'pressure': pressure,
+            'stabilisation_time': self.stabilisation_time,
+            'slope': slope,
+            'intercept': intercept,
+            'time_lag': time_lag,
+            'diffusion_coefficient': diffusion_coefficient,
+            'permeability': permeability,
+            'solubility_coefficient': solubility_coefficient,
+            'solubility': solubility,
+            'time': self.t_last,
+            'n_samples': self.n_samples,
+            'n_fit': self.fit.n,
+        }
+
+def tail_csv(file_path: str, chunksize: int = 1000, poll_interval: float = 1.0, idle_timeout: float = None, stop_event=None):
+    """
+    Read a CSV file that is being appended to, in chunks of complete lines.
+
+    Lines are read from where the previous chunk ended, an incomplete last line is held back until the rest of it is written.
+
+    Parameters:
+    file_path (str): Path to the CSV file.
+    chunksize (int): Maximum number of rows per chunk.
+    poll_interval (float): Time in s to wait before checking for new data at the end of the file.
+    idle_timeout (float): Stop after this time in s without new data. If None, only stop when stop_event is set.
+    stop_event (threading.Event, optional): Stop when this event is set.
+
+    Yields:
+    pd.DataFrame: Chunks of new rows.
+    """
+    header = None
+    partial = b''
+    last_data_time = time.monotonic()
+    with open(file_path, 'rb') as f:
+        while True:
+            lines = []
+            while len(lines) < chunksize:
+                line = f.readline()
+                if not line:
+                    break
+                if not line.endswith(b'\n'):
+                    partial += line   # Still being written
+                    break
+                lines.append(partial + line)
+                partial = b''
+            if header is None and lines:
+                header = lines.pop(0)
+            if lines:
+                last_data_time = time.monotonic()
+                yield pd.read_csv(io.BytesIO(header + b''.join(lines)))
+                continue
+
+            stop = stop_event is not None and stop_event.is_set()
+            if idle_timeout is not None and time.monotonic() - last_data_time >= idle_timeout:
+                stop = True
+            if stop:
+                if header is not None and partial.strip():
+                    yield pd.read_csv(io.BytesIO(header + partial + b'\n'))   # Last line without a line break
+                return
+            time.sleep(poll_interval)
+
+def stream_time_lag_analysis(file_path: str, L_cm: float, d_cm: float, qN2_mlmin: float = None, stablisation_time_range: tuple = (None, None), experiment: str = None, chunksize: int = 1000, poll_interval: float = 1.0, idle_timeout: float = None, stop_event=None):
+    """
+    Run the time-lag analysis on a CSV file while it is being recorded.
+
+    Parameters:
+    file_path (str): Path to the CSV file with the raw data.
+    L_cm (float): Thickness of the polymer in cm.
+    d_cm (float): Diameter of the polymer in cm.
+    qN2_mlmin (float): Flow rate of N2 in ml/min. If None, use the column 'qN2 / ml min^-1' from the data.
+    stablisation_time_range (tuple): Tuple containing the start and end times for the stabilisation period.
+    experiment (str): Name of the experiment.
+    chunksize (int): Maximum number of rows per chunk.
+    poll_interval (float): Time in s to wait before checking for new data at the end of the file.
+    idle_timeout (float): Stop after this time in s without new data. If None, only stop when stop_event is set.
+    stop_event (threading.Event, optional): Stop when this event is set.
+
+    Yields:
+    dict: Updated results (see StreamingTimeLagAnalysis.results) after each chunk that gives a fit.
+    """
+    analysis = StreamingTimeLagAnalysis(L_cm, d_cm, qN2_mlmin=qN2_mlmin, stablisation_time_range=stablisation_time_range, experiment=experiment)
+    for chunk in tail_csv(file_path, chunksize=chunksize, poll_interval=poll_interval, idle_timeout=idle_timeout, stop_event=stop_event):
+        results = analysis.update(chunk)
+        if results is not None:
+            yield results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the time-lag analysis on a CSV file while it is being recorded.')
+    parser.add_argument('file_path', help='CSV file the data logger appends to.')
+    parser.add_argument('--L-cm', type=float, required=True, help='Thickness of the polymer in cm.')
+    parser.add_argument('--d-cm', type=float, default=1.0, help='Diameter of the polymer in cm (default: 1.0).')
+    parser.add_argument('--qN2-mlmin', type=float, default=None, help="Flow rate of N2 in ml/min (default: the 'qN2 / ml min^-1' column).")
+    parser.add_argument('--stabilisation-time-range', type=float, nargs=2, default=(None, None), metavar=('START', 'END'),
+                        help='Start and end times of the stabilisation period in s (default: auto detect).')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='Time in s between checks for new data (default: 1).')
+    parser.add_argument('--idle-timeout', type=float, default=None, help='Stop after this time in s without new data (default: never).')
+    args = parser.parse_args(argv)
+
+    try:
+        for results in stream_time_lag_analysis(args.file_path, args.L_cm, args.d_cm, qN2_mlmin=args.qN2_mlmin,
+                                                stablisation_time_range=args.stabilisation_time_range,
+                                                poll_interval=args.poll_interval, idle_timeout=args.idle_timeout):
+            print(f"t = {results['time']:.0f} s: Time Lag: {results['time_lag']:.3g} s, "
+                  f"Diffusion Coefficient: {results['diffusion_coefficient']:.3g} cm^2 s^-1, "
+                  f"Permeability: {results['permeability']:.3g} cm^3(STP) cm^-1 s^-1 bar^-1, "
+                  f"Solubility Coefficient: {results['solubility_coefficient']:.3g} cm^3(STP) cm^-3 bar^-1", flush=True)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
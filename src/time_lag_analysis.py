@@ -1,44 +1,260 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from calculations import *
 from data_processing import *
 from visualisation import *
-from util import thickness_dict, qN2_dict, get_time_id
+from instrumentation import StageTimer, stage, format_span
+from util import figsize_dict, get_time_id
+from metadata_registry import get_registry
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from result_cache import ResultCache, get_file_hash, get_result_key
+from results_store import ResultsStore
 
-def time_lag_analysis_workflow(datapath: str, L_cm: float, d_cm: float, qN2_mlmin: float = None, stablisation_time_range: tuple = (None, None), display_plot: bool = False, save_plot: bool = False, save_data: bool = False, output_dir: str = '.'):
+PDE_DT = 1   # Time step of the PDE solution in s, so that the exported profiles have one row per second
+
+class TimeLagAnalysisResult:
     """
-    Perform the entire time-lag analysis workflow.
+    Result of the time-lag analysis workflow.
+
+    The scalar results (time lag, diffusion coefficient, permeability, ...) are available immediately through
+    `results` or `result['key']`. The preprocessed data, PDE solution, concentration/flux DataFrames and figures
+    are computed on first access and cached, so callers that only need the scalar results never pay for them.
+    """
+    __slots__ = ('results', 'progress_callback', 'pde_cache', 'timer', '_df', '_stabilisation_index', '_preprocessed_df', '_pde', '_pde_lock', '_figures')
+
+    def __init__(self, results: dict, df: pd.DataFrame, stabilisation_index, progress_callback=None, pde_cache=None, timer: StageTimer = None):
+        """
+        Parameters:
+        results (dict): Scalar results of the time-lag analysis.
+        df (pd.DataFrame): Preprocessed data capped at the end of the stabilisation period.
+        stabilisation_index: Index of df where the stabilisation period starts.
+        progress_callback (callable, optional): Called as progress_callback(stage, fraction) while lazy members are computed.
+        pde_cache (dict-like, optional): Cache of PDE solutions keyed by (D, C_eq, L, T), shared between results.
+        timer (StageTimer, optional): Records spans of the stages, including the lazy ones.
+        """
+        self.results = results
+        self.progress_callback = progress_callback
+        self.pde_cache = pde_cache
+        self.timer = timer
+        self._df = df
+        self._stabilisation_index = stabilisation_index
+        self._preprocessed_df = None
+        self._pde = None
+        self._pde_lock = threading.Lock()
+        self._figures = None
+
+    def __getitem__(self, key):
+        return self.results[key]
+
+    def __contains__(self, key):
+        return key in self.results
+
+    def __repr__(self):
+        return f"TimeLagAnalysisResult({self.results!r})"
+
+    @property
+    def timings(self) -> list:
+        """Spans (stage, wall time, CPU time, peak memory) of the stages run so far, or None if not instrumented."""
+        return None if self.timer is None else self.timer.spans
+
+    @property
+    def preprocessed_df(self) -> pd.DataFrame:
+        """Preprocessed data with the flux normalised by the steady-state flux."""
+        if self._preprocessed_df is None:
+            df = self._df.copy()
+            stabilisation_time = self.results['stabilisation_time']
+            df_ss = df.loc[(df['t / s'] > stabilisation_time) & (df['t / s'] < df['t / s'].max())]
+            flux_ss = df_ss.loc[:, 'flux / cm^3(STP) cm^-2 s^-1'].mean()
+            df['normalised flux'] = df['flux / cm^3(STP) cm^-2 s^-1'] / flux_ss
+            self._preprocessed_df = df
+        return self._preprocessed_df
+
+    @property
+    def pde_solution(self) -> tuple:
+        """Concentration profile, flux, concentration DataFrame and flux DataFrame from flux_pde_const_D."""
+        return self.solve_pde(progress_callback=self.progress_callback, timer=self.timer)
+
+    def solve_pde(self, progress_callback=None, timer: StageTimer = None) -> tuple:
+        """
+        Get the PDE solution, solving it on first use. Threads sharing the result wait for a single solve.
+
+        Parameters:
+        progress_callback (callable, optional): Called as progress_callback('solving PDE', fraction) if this call solves the PDE.
+        timer (StageTimer, optional): Records the span of the 'solving PDE' stage if this call solves the PDE.
+
+        Returns:
+        tuple: Concentration profile, flux, concentration DataFrame and flux DataFrame from flux_pde_const_D.
+        """
+        with self._pde_lock:
+            if self._pde is not None:
+                return self._pde
+            L = self.results['thickness']
+            T_final = self._df['t / s'].iloc[-1]
+            D = self.results['diffusion_coefficient']
+            C_eq = self.results['solubility_coefficient'] * self.results['pressure']
+            key = (D, C_eq, L, T_final)
+            if self.pde_cache is not None and key in self.pde_cache:
+                self._pde = self.pde_cache[key]
+                return self._pde
+            callback = None
+            if progress_callback is not None:
+                callback = lambda n, Nt: progress_callback('solving PDE', n / max(Nt - 1, 1))
+            with stage(timer, 'solving PDE'):
+                self._pde = flux_pde_const_D(D=D, C_eq=C_eq, L=L, T=T_final, dt=PDE_DT, dx=L/50, method='crank-nicolson', callback=callback)
+            if self.pde_cache is not None:
+                self.pde_cache[key] = self._pde
+            return self._pde
+
+    @property
+    def C_profile(self) -> np.ndarray:
+        return self.pde_solution[0]
+
+    @property
+    def flux(self) -> list:
+        return self.pde_solution[1]
+
+    @property
+    def df_C(self) -> pd.DataFrame:
+        return self.pde_solution[2]
+
+    @property
+    def df_flux(self) -> pd.DataFrame:
+        return self.pde_solution[3]
+
+    def bootstrap(self, n_replicates: int = 10000, stabilisation_time_range: tuple = None, percentiles=(2.5, 50, 97.5), seed=None, return_replicates: bool = False):
+        """
+        Percentiles of the time lag, diffusion coefficient, permeability and solubility coefficient from bootstrapping the
+        residuals of the steady-state fit. See time_lag_bootstrap.
+        """
+        return time_lag_bootstrap(self._df, self.results['stabilisation_time'], self.results['thickness'], n_replicates=n_replicates,
+                                  stabilisation_time_range=stabilisation_time_range, percentiles=percentiles, seed=seed, return_replicates=return_replicates)
+
+    def save(self, path: str):
+        """
+        Save the result to a binary .npz file: the scalar results, the preprocessed data and the PDE solution if it has been computed.
+
+        Parameters:
+        path (str): Path of the file.
+        """
+        arrays = {
+            'results': np.array(json.dumps(self.results, default=lambda value: value.item())),
+            'stabilisation_index': np.array(self._stabilisation_index),
+            'df_index': self._df.index.to_numpy(),
+            'df_columns': np.array(self._df.columns, dtype=str),
+        }
+        for i, column in enumerate(self._df.columns):
+            arrays[f'df_{i}'] = self._df[column].to_numpy()
+        if self._pde is not None:
+            C_profile, flux, df_C, df_flux = self._pde
+            arrays.update({
+                'C_profile': C_profile,
+                'flux': np.asarray(flux),
+                'df_C': df_C.to_numpy(),
+                'df_C_columns': np.array(df_C.columns, dtype=str),
+                'df_flux': df_flux.to_numpy(),
+                'df_flux_columns': np.array(df_flux.columns, dtype=str),
+            })
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str, progress_callback=None, pde_cache=None, timer: StageTimer = None) -> 'TimeLagAnalysisResult':
+        """
+        Load a result saved with save.
+
+        Parameters:
+        path (str): Path of the file.
+        progress_callback, pde_cache, timer: As for TimeLagAnalysisResult.
+
+        Returns:
+        TimeLagAnalysisResult: The saved result, with the PDE solution if it was saved.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            df = pd.DataFrame({column: data[f'df_{i}'] for i, column in enumerate(data['df_columns'].tolist())}, index=data['df_index'])
+            result = cls(json.loads(data['results'].item()), df, data['stabilisation_index'].item(),
+                         progress_callback=progress_callback, pde_cache=pde_cache, timer=timer)
+            if 'C_profile' in data:
+                result._pde = (
+                    data['C_profile'],
+                    data['flux'],
+                    pd.DataFrame(data['df_C'], columns=data['df_C_columns'].tolist()),
+                    pd.DataFrame(data['df_flux'], columns=data['df_flux_columns'].tolist()),
+                )
+        return result
+
+    @property
+    def figures(self) -> dict:
+        """Figures of the time-lag analysis, flux over time, concentration-location profile and concentration profile, drawn without pyplot."""
+        if self._figures is None:
+            self._figures = self.draw_figures()
+        return self._figures
+
+    def draw_figures(self, style: dict = None, pyplot: bool = False, max_workers: int = None) -> dict:
+        """
+        Draw new figures of the time-lag analysis, flux over time, concentration-location profile and concentration profile.
+
+        Parameters:
+        style (dict, optional): Plot style overriding entries of util.plot_style_dict, see visualisation.py.
+        pyplot (bool): Whether to create the figures with pyplot so that plt.show() displays them, otherwise they are not tracked by pyplot.
+        max_workers (int, optional): Number of threads preparing the figures concurrently, their layout is serialised (see visualisation.py). If None, they are drawn one after another.
+
+        Returns:
+        dict: Figures keyed by name.
+        """
+        if self.progress_callback is not None:
+            self.progress_callback('plotting', 0)
+        df = self.preprocessed_df
+        C_profile = self.C_profile
+        with stage(self.timer, 'plotting'):
+            L = self.results['thickness']
+            T = df.loc[self._stabilisation_index, 't / s']
+            T_final = df['t / s'].iloc[-1]
+            C_eq = self.results['solubility_coefficient'] * self.results['pressure']
+            # Analytical solution evaluated directly on the measured time points
+            _, flux_model = flux_series_const_D(D=self.results['diffusion_coefficient'], C_eq=C_eq, L=L, t=df['t / s'])
+            drawings = {
+                'time_lag_analysis': lambda fig, ax: plot_time_lag_analysis(df, self.results['stabilisation_time'], self.results['slope'], self.results['intercept'], fig=fig, ax=ax, style=style, downsample=True),
+                'flux_over_time': lambda fig, ax: plot_flux_over_time(flux_model, df, T_final, fig=fig, ax=ax, time=df['t / s'], style=style, downsample=True),
+                'concentration_location_profile': lambda fig, ax: plot_concentration_location_profile(C_profile, L, T, fig=fig, ax=ax, style=style),
+                'concentration_profile': lambda fig, ax: plot_concentration_profile(C_profile, L, T, fig=fig, ax=ax, style=style, downsample=True),
+            }
+            # Figures are created on the calling thread, pyplot must not be used from the drawing threads
+            if pyplot:
+                import matplotlib.pyplot as plt  # Deferred so that compute-only use never imports pyplot
+                axes = {name: plt.subplots(1, 1, figsize=figsize_dict['default']) for name in drawings}
+            else:
+                axes = {name: new_figure() for name in drawings}
+            if max_workers is None:
+                for name, draw in drawings.items():
+                    draw(*axes[name])
+            else:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    list(executor.map(lambda name: drawings[name](*axes[name]), drawings))
+        return {name: fig for name, (fig, ax) in axes.items()}
+
+def analyse_preprocessed_data(preprocessed_df: pd.DataFrame, L_cm: float, stablisation_time_range: tuple = (None, None), experiment: str = None, progress_callback=None, pde_cache=None, fit_transient: bool = False, timer: StageTimer = None) -> TimeLagAnalysisResult:
+    """
+    Detect the stabilisation time and fit the time-lag model to preprocessed data.
 
     Parameters:
-    datapath (pd.DataFrame): Path of raw data.
+    preprocessed_df (pd.DataFrame): Preprocessed data.
     L_cm (float): Thickness of the polymer in cm.
-    d_cm (float): Diameter of the polymer in cm.
-    qN2_mlmin (float): Flow rate of N2 in ml/min. If None, use the column 'qN2 / ml min^-1' from the DataFrame.
     stablisation_time_range (tuple): Tuple containing the start and end times for the stabilisation period.
-    display_plot (bool): Whether to display the plots.
-    save_plot (bool): Whether to save the plots.
-    save_data (bool): Whether to save the results data.
-    output_dir (str): Directory to save the plots and data.
+    experiment (str): Name of the experiment.
+    progress_callback (callable, optional): Called as progress_callback(stage, fraction) at the start of each stage.
+    pde_cache (dict-like, optional): Cache of PDE solutions keyed by (D, C_eq, L, T), shared between results.
+    fit_transient (bool): Whether to also fit D and S to the whole flux curve (results with the prefix 'transient_').
+    timer (StageTimer, optional): Records spans of the 'stabilisation time', 'fitting' and 'transient fit' stages, and of the lazy stages of the result.
 
     Returns:
-    dict: Results of the time-lag analysis including time lag, diffusion coefficient, permeability, solubility coefficient, slope, and intercept.
+    TimeLagAnalysisResult: Results of the time-lag analysis.
     """
-    # Create directory if not exist
-    if save_data or save_plot:
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-    
-    # Get base name of the file without extension
-    base_name = os.path.splitext(os.path.basename(datapath))[0]
-    
-    # Import data
-    df = load_data(datapath)
+    if progress_callback is not None:
+        progress_callback('fitting', 0)
     
-    # Preprocess data
-    preprocessed_df = preprocess_data(df, d_cm=d_cm, qN2_mlmin=qN2_mlmin)
-
     # Checking values in stabilisation_time_range
     if stablisation_time_range[0] is not None and stablisation_time_range[1] is not None:
         if stablisation_time_range[0] >= stablisation_time_range[1]:
@@ -48,7 +264,8 @@ def time_lag_analysis_workflow(datapath: str, L_cm: float, d_cm: float, qN2_mlmi
     if stablisation_time_range[0] is not None:
         stabilisation_time = stablisation_time_range[0]
     else:
-        stabilisation_time = identify_stabilisation_time(df=preprocessed_df, column='cumulative flux / cm^3(STP) cm^-2', window=70, threshold=0.003)
+        with stage(timer, 'stabilisation time'):
+            stabilisation_time = identify_stabilisation_time(df=preprocessed_df, column='cumulative flux / cm^3(STP) cm^-2', window=70, threshold=0.003)
     
     # Get max time
     if stablisation_time_range[1] is not None:
@@ -64,26 +281,25 @@ def time_lag_analysis_workflow(datapath: str, L_cm: float, d_cm: float, qN2_mlmi
     # Capping the upper limit
     preprocessed_df = preprocessed_df.loc[preprocessed_df['t / s'] <= max_time]
     
-    # Filter steady-state data
-    df_ss = preprocessed_df.loc[(preprocessed_df['t / s'] > stabilisation_time) & (preprocessed_df['t / s'] < max_time)]
-    
-    # Calculate steady-state flux
-    flux_ss = df_ss.loc[:, 'flux / cm^3(STP) cm^-2 s^-1'].mean()
-    
-    # Calculate normalised flux
-    preprocessed_df['normalised flux'] = preprocessed_df['flux / cm^3(STP) cm^-2 s^-1'] / flux_ss
-    
     # Perform time-lag analysis
-    time_lag, diffusion_coefficient, permeability, solubility_coefficient, pressure, solubility, slope, intercept = time_lag_analysis(preprocessed_df, stabilisation_time, L_cm)
+    with stage(timer, 'fitting'):
+        time_lag, diffusion_coefficient, permeability, solubility_coefficient, pressure, solubility, slope, intercept = time_lag_analysis(preprocessed_df, stabilisation_time, L_cm)
 
     # Get average temperature
     temperature = preprocessed_df.loc[preprocessed_df.index > stabilisation_index, 'T / °C'].mean()
     
-    # Plot the results
-    if display_plot or save_plot:
-        plot_time_lag_analysis(preprocessed_df, stabilisation_time, slope, intercept)
-        if save_plot:
-            plt.savefig(f"{output_dir}/{base_name}_time_lag_analysis.svg")
+    # Fit the whole flux curve, starting from the time-lag results
+    transient_results = {}
+    if fit_transient and diffusion_coefficient > 0 and solubility > 0:
+        with stage(timer, 'transient fit'):
+            D_transient, C_eq_transient, flux_rms = fit_transient_flux(preprocessed_df, L_cm, D0=diffusion_coefficient, C_eq0=solubility)
+        transient_results = {
+            'transient_diffusion_coefficient': D_transient,
+            'transient_solubility_coefficient': C_eq_transient / pressure,
+            'transient_permeability': D_transient * C_eq_transient / pressure,
+            'transient_solubility': C_eq_transient,
+            'transient_flux_rms': flux_rms,
+        }
 
     # Print the results
     print(f'Temperature: {temperature:.0f} °C')
@@ -96,75 +312,146 @@ def time_lag_analysis_workflow(datapath: str, L_cm: float, d_cm: float, qN2_mlmi
     print(f'Solubility Coefficient: {solubility_coefficient:.3g} cm^3(STP) cm^-3 bar^-1')
     print(f'Pressure: {pressure:.3g} bar')
     print(f'Solubility: {solubility:.3g} cm^3(STP) cm^-3')    
+    if transient_results:
+        print(f"Diffusion Coefficient (transient fit): {transient_results['transient_diffusion_coefficient']:.3g} cm^2 s^-1")
+        print(f"Solubility Coefficient (transient fit): {transient_results['transient_solubility_coefficient']:.3g} cm^3(STP) cm^-3 bar^-1")
 
-    # Save diffusivity, solubility, and permeability in dataframe
-    results_df = pd.DataFrame({
-        'experiment': [base_name],
-        'thickness / cm': [L_cm],
-        'temperature / °C': [temperature],
-        'pressure / bar': [pressure],
-        'slope / cm^3(STP) cm^-2 s^-1': [slope],
-        'intercept / cm^3(STP) cm^-2': [intercept],
-        'time lag / s': [time_lag],
-        'diffusion coefficient / cm^2 s^-1': [diffusion_coefficient],
-        'solubility coefficient / cm^3(STP) cm^-3 bar^-1': [solubility_coefficient],
-        'permeability / cm^3(STP) cm^-1 s^-1 bar^-1': [permeability],
-        'solubility / cm^3(STP) cm^-3': [solubility],        
-    })
-
-    # Test flux_pde_const_D function
-    # pressure = preprocessed_df.loc[preprocessed_df.index > stabilisation_index, 'P_cell / bar'].mean()
-    L = L_cm
-    T = preprocessed_df.loc[stabilisation_index, 't / s']
-    T_final = preprocessed_df['t / s'].iloc[-1]
-    C_eq = solubility_coefficient * pressure
-    C_profile, flux, df_C, df_flux = flux_pde_const_D(D=diffusion_coefficient, C_eq=C_eq, L=L, T=T_final, dt=1, dx=L/50)
+    return TimeLagAnalysisResult({
+        'experiment': experiment,
+        'thickness': L_cm,
+        'temperature': temperature,
+        'pressure': pressure,
+        'stabilisation_time': stabilisation_time,
+        'slope': slope,
+        'intercept': intercept,
+        'time_lag': time_lag,
+        'diffusion_coefficient': diffusion_coefficient,
+        'permeability': permeability,
+        'solubility_coefficient': solubility_coefficient,
+        'solubility': solubility,
+        **transient_results,
+    }, preprocessed_df, stabilisation_index, progress_callback=progress_callback, pde_cache=pde_cache, timer=timer)
+
+def time_lag_analysis_workflow(datapath: str, L_cm: float, d_cm: float, qN2_mlmin: float = None, stablisation_time_range: tuple = (None, None), display_plot: bool = False, save_plot: bool = False, save_data: bool = False, output_dir: str = '.', progress_callback=None, fit_transient: bool = False, timer: StageTimer = None, cache: ResultCache = None, store: ResultsStore = None) -> TimeLagAnalysisResult:
+    """
+    Perform the entire time-lag analysis workflow.
+
+    Parameters:
+    datapath (pd.DataFrame): Path of raw data.
+    L_cm (float): Thickness of the polymer in cm.
+    d_cm (float): Diameter of the polymer in cm.
+    qN2_mlmin (float): Flow rate of N2 in ml/min. If None, use the column 'qN2 / ml min^-1' from the DataFrame.
+    stablisation_time_range (tuple): Tuple containing the start and end times for the stabilisation period.
+    display_plot (bool): Whether to display the plots.
+    save_plot (bool): Whether to save the plots.
+    save_data (bool): Whether to save the results data.
+    output_dir (str): Directory to save the plots and data.
+    progress_callback (callable, optional): Called as progress_callback(stage, fraction) at the start of each stage ('loading', 'preprocessing',
+        'fitting', 'solving PDE', 'plotting'), with fraction in [0, 1]. Raising an exception from it aborts the analysis.
+    fit_transient (bool): Whether to also fit D and S to the whole flux curve (results with the prefix 'transient_').
+    timer (StageTimer, optional): Records the wall time, CPU time and peak memory of every stage, available as result.timings.
+        If None, nothing is recorded.
+    cache (ResultCache, optional): On-disk cache of results. A result stored for the same file content, parameters and code version is
+        loaded instead of recomputed ('cache lookup' stage), otherwise the new result is stored, together with its PDE solution if this run computes it.
+    store (ResultsStore, optional): Results store to append the scalar results, parameters and input hash of this analysis to ('storing results' stage).
+
+    Returns:
+    TimeLagAnalysisResult: Results of the time-lag analysis including time lag, diffusion coefficient, permeability, solubility coefficient, slope, and intercept.
+        The preprocessed data, PDE solution and figures are computed lazily on first access.
+    """
+    # Create directory if not exist
+    if save_data or save_plot:
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+    
+    # Get base name of the file without extension
+    base_name = os.path.splitext(os.path.basename(datapath))[0]
+    
+    if progress_callback is not None:
+        progress_callback('loading', 0)
+    
+    # Reuse the result of an earlier run with the same data, parameters and code
+    result = None
+    input_hash = None   # Hash of the data file, computed once for the result cache and the results store
+    if cache is not None:
+        with stage(timer, 'cache lookup'):
+            input_hash = get_file_hash(datapath)
+            cache_key = get_result_key(input_hash, experiment=base_name, L_cm=L_cm, d_cm=d_cm, qN2_mlmin=qN2_mlmin,
+                                       stablisation_time_range=list(stablisation_time_range), fit_transient=fit_transient)
+            result = cache.get(cache_key, progress_callback=progress_callback, timer=timer)
+    cache_hit = result is not None
+    cached_pde = cache_hit and result._pde is not None
+    
+    if result is None:
+        # Import data
+        with stage(timer, 'loading'):
+            df = load_data(datapath)
+        
+        if progress_callback is not None:
+            progress_callback('preprocessing', 0)
+        
+        # Preprocess data
+        with stage(timer, 'preprocessing'):
+            preprocessed_df = preprocess_data(df, d_cm=d_cm, qN2_mlmin=qN2_mlmin)
+
+        # Fit the steady-state data
+        result = analyse_preprocessed_data(preprocessed_df, L_cm, stablisation_time_range=stablisation_time_range, experiment=base_name, progress_callback=progress_callback, fit_transient=fit_transient, timer=timer)
+    results = result.results
+    
+    # Append the analysis to the results store
+    if store is not None:
+        with stage(timer, 'storing results'):
+            if input_hash is None:
+                input_hash = get_file_hash(datapath)
+            store.add(results, datapath=datapath, input_hash=input_hash, d_cm=d_cm, qN2_mlmin=qN2_mlmin,
+                      stabilisation_time_range=stablisation_time_range)
     
     # Export data to .csv
     if save_data:
+        # Save diffusivity, solubility, and permeability in dataframe
+        results_df = pd.DataFrame({
+            'experiment': [base_name],
+            'thickness / cm': [L_cm],
+            'temperature / °C': [results['temperature']],
+            'pressure / bar': [results['pressure']],
+            'slope / cm^3(STP) cm^-2 s^-1': [results['slope']],
+            'intercept / cm^3(STP) cm^-2': [results['intercept']],
+            'time lag / s': [results['time_lag']],
+            'diffusion coefficient / cm^2 s^-1': [results['diffusion_coefficient']],
+            'solubility coefficient / cm^3(STP) cm^-3 bar^-1': [results['solubility_coefficient']],
+            'permeability / cm^3(STP) cm^-1 s^-1 bar^-1': [results['permeability']],
+            'solubility / cm^3(STP) cm^-3': [results['solubility']],        
+        })
+        if 'transient_diffusion_coefficient' in results:
+            results_df['transient diffusion coefficient / cm^2 s^-1'] = results['transient_diffusion_coefficient']
+            results_df['transient solubility coefficient / cm^3(STP) cm^-3 bar^-1'] = results['transient_solubility_coefficient']
+            results_df['transient permeability / cm^3(STP) cm^-1 s^-1 bar^-1'] = results['transient_permeability']
         try:
-            preprocessed_df.to_csv(f"{output_dir}/{base_name}_preprocessed_data.csv", index=False)
-            results_df.to_csv(f"{output_dir}/{base_name}_time_lag_analysis.csv", index=False)
-            df_C.to_csv(f"{output_dir}/{base_name}_concentration_profile.csv", index=False)
-            df_flux.to_csv(f"{output_dir}/{base_name}_flux_profile.csv", index=False)
+            with stage(timer, 'exporting'):
+                result.preprocessed_df.to_csv(f"{output_dir}/{base_name}_preprocessed_data.csv", index=False)
+                results_df.to_csv(f"{output_dir}/{base_name}_time_lag_analysis.csv", index=False)
+                result.df_C.to_csv(f"{output_dir}/{base_name}_concentration_profile.csv", index=False)
+                result.df_flux.to_csv(f"{output_dir}/{base_name}_flux_profile.csv", index=False)
         except Exception as e:
             print(f"An error occurred while exporting to .csv file: {e}")
 
-    # Plot the flux over time
-    if display_plot or save_plot:
-        plot_flux_over_time(flux, preprocessed_df, T_final)
-        if save_plot:
-            plt.savefig(f"{output_dir}/{base_name}_flux_over_time.svg")
-        
-    # Plot the concentration-location profile
-    if display_plot or save_plot:
-        plot_concentration_location_profile(C_profile, L, T)
-        if save_plot:
-            plt.savefig(f"{output_dir}/{base_name}_concentration_location_profile.svg")
-
-    # Plot the concentration profile
+    # Plot the results
     if display_plot or save_plot:
-        plot_concentration_profile(C_profile, L, T)
+        figures = result.draw_figures(pyplot=True) if display_plot else result.figures
         if save_plot:
-            plt.savefig(f"{output_dir}/{base_name}_concentration_profile.svg")
+            with stage(timer, 'saving plots'):
+                for name, fig in figures.items():
+                    fig.savefig(f"{output_dir}/{base_name}_{name}.svg")
+    
+    # Store a new result, or add the PDE solution computed by this run to the cached one
+    if cache is not None and (not cache_hit or (not cached_pde and result._pde is not None)):
+        cache.put(cache_key, result)
     
     if display_plot:
+        import matplotlib.pyplot as plt
         plt.show()
     
-    return {
-        'experiment': base_name,
-        'thickness': L_cm,
-        'temperature': temperature,
-        'pressure': pressure,
-        'stabilisation_time': stabilisation_time,
-        'slope': slope,
-        'intercept': intercept,
-        'time_lag': time_lag,
-        'diffusion_coefficient': diffusion_coefficient,
-        'permeability': permeability,
-        'solubility_coefficient': solubility_coefficient,
-        'solubility': solubility,
-    }, preprocessed_df, C_profile, flux, df_C, df_flux
+    return result
 
 # Example usage
 if __name__ == "__main__":
@@ -173,8 +460,9 @@ if __name__ == "__main__":
     base_dir = os.path.dirname(current_file_path)   # directory
     
     # Load data
-    # exp_names = list(thickness_dict.keys())
-    exp_names = list(thickness_dict.keys())[0:1]
+    registry = get_registry()
+    # exp_names = registry.names()
+    exp_names = registry.names()[0:1]
     # exp_names = ['S3R1', 'S3R2', 'S3R3', 'S3R4', 'S4R3', 'S4R4', 'S4R5', 'S4R6']
     # location = exp_names.index('RUN_H_75C-100bar')
     # exp_names = exp_names[location:]
@@ -192,7 +480,7 @@ if __name__ == "__main__":
     for i, excel_abs_path in enumerate(excel_abs_paths):
         print('Performing time lag analysis for ', exp_names[i])
         print('')
-        results = time_lag_analysis_workflow(datapath=excel_abs_path, L_cm=thickness_dict[exp_names[i]], d_cm=1.0, qN2_mlmin=qN2_dict[exp_names[i]], 
+        results = time_lag_analysis_workflow(datapath=excel_abs_path, L_cm=registry[exp_names[i]]['thickness'], d_cm=registry[exp_names[i]]['diameter'], qN2_mlmin=registry[exp_names[i]]['flow_rate'], 
                                              stablisation_time_range=(2e4, 3e4),
                                              display_plot=True, save_plot=False, save_data=False, output_dir=save_folder)
         print('')
@@ -4,51 +4,45 @@ util.py
 Module for defining plot styling information.
 """
 
-import matplotlib.pyplot as plt
 from datetime import datetime
 
 figsize_dict = {'default': (5, 4), 'side-by-side': (10, 4),}
 
-thickness_dict = {
-    'RUN_H_25C-50bar': 0.1, 'RUN_H_25C-100bar_7': 0.1, 'RUN_H_25C-100bar_8': 0.1, 'RUN_H_25C-100bar_9': 0.1, 'RUN_H_25C-200bar_2': 0.1,
-    'RUN_H_50C-50bar': 0.1, 'RUN_H_50C-100bar_2': 0.1, 'RUN_H_50C-200bar': 0.1, 
-    'RUN_H_75C-50bar': 0.1, 'RUN_H_75C-100bar': 0.1,
-    'S3R1': 0.1, 'S3R2': 0.1, 'S3R3': 0.1, 'S3R4': 0.1,
-    'S4R3': 0.025, 'S4R4': 0.025, 'S4R5': 0.025, 'S4R6': 0.025,
-} # [cm]
-
-qN2_dict = {
-    'RUN_H_25C-50bar': 8.0, 'RUN_H_25C-100bar_7': 8.0, 'RUN_H_25C-100bar_8': 8.0, 'RUN_H_25C-100bar_9': 8.0, 'RUN_H_25C-200bar_2': 8.0,
-    'RUN_H_50C-50bar': 8.0, 'RUN_H_50C-100bar_2': 8.0, 'RUN_H_50C-200bar': 8.0, 
-    'RUN_H_75C-50bar': 8.0, 'RUN_H_75C-100bar': 8.0,
-    'S3R1': 4.17, 'S3R2': 4.046, 'S3R3': 4.027, 'S3R4': 4.0454, 
-    'S4R3': 9.83, 'S4R4': 9.84, 'S4R5': 9.92, 'S4R6': 10,
-}  # [ml min^-1]
+# Style of the plots as matplotlib rcParams, applied to each figure by the plot_* functions of visualisation.py
+plot_style_dict = {
+    # Common properties
+    'font.size': 10,
+    'font.family': 'sans-serif',
+    # 'mathtext.fontset': 'cm',  # Computer Modern font
+    'mathtext.default': 'regular',  # same as regular text
+    # 'font.serif': ['Times'],
+    # 'text.usetex': True,  # Disable LaTeX rendering
+    'axes.titlesize': 'small',  # relative to font.size
+    'axes.labelsize': 'small',  # relative to font.size
+    'xtick.labelsize': 'small',  # relative to font.size
+    'ytick.labelsize': 'small',  # relative to font.size
+    'legend.fontsize': 'small',  # relative to font.size
+    'axes.grid': False,
+    'grid.alpha': 0.7,
+    'grid.linestyle': '--',
+    'grid.color': 'gray',
+    'xtick.direction': 'in',
+    'ytick.direction': 'in',
+    'xtick.major.pad': 5,
+    'ytick.major.pad': 5,
+}
 
-def set_plot_style():
+def set_plot_style(style: dict = None):
     """
-    Set the style for plots.
+    Set the style for plots made directly with pyplot by updating the global rcParams.
+
+    The plot_* functions of visualisation.py do not need this, they apply the style to their own figure.
+
+    Parameters:
+    style (dict, optional): rcParams to set, defaults to plot_style_dict.
     """
-    # Common properties
-    plt.rcParams['font.size'] = 10
-    plt.rcParams['font.family'] = 'sans-serif'
-    # plt.rcParams['mathtext.fontset'] = 'cm'  # Computer Modern font
-    plt.rcParams["mathtext.default"] = "regular"  # same as regular text
-    # plt.rcParams['font.serif'] = ['Times']
-    # plt.rcParams['text.usetex'] = True  # Disable LaTeX rendering
-    plt.rcParams["axes.titlesize"] = "small"  # relative to font.size
-    plt.rcParams["axes.labelsize"] = "small"  # relative to font.size
-    plt.rcParams["xtick.labelsize"] = "small"  # relative to font.size
-    plt.rcParams["ytick.labelsize"] = "small"  # relative to font.size
-    plt.rcParams["legend.fontsize"] = "small"  # relative to font.size
-    plt.rcParams['axes.grid'] = False
-    plt.rcParams['grid.alpha'] = 0.7
-    plt.rcParams['grid.linestyle'] = '--'
-    plt.rcParams['grid.color'] = 'gray'
-    plt.rcParams['xtick.direction'] = 'in'
-    plt.rcParams['ytick.direction'] = 'in'    
-    plt.rcParams['xtick.major.pad'] = 5
-    plt.rcParams['ytick.major.pad'] = 5
+    import matplotlib.pyplot as plt  # Deferred so that compute-only use never imports pyplot
+    plt.rcParams.update(plot_style_dict if style is None else style)
     
 def update_ticks(ax, x_lo=None, y_lo=None, x_up=None, y_up=None):
     """Update x and y ticks of subplot ax to cover all data. Put ticks to inside.
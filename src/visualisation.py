@@ -2,13 +2,236 @@
 visualisation.py
 ----------------
 Module for visualising permeation data and analysis results.
+
+The plot_* functions draw onto explicit Figure and Axes objects and apply the plot style to them directly instead of
+through the global pyplot state, so they can be called from any thread. Matplotlib's mathtext parser and text layout
+are not thread-safe, so the layout in the plot_* functions and the rendering of figures from new_figure are serialised
+by a module-level lock: threads prepare data and create artists concurrently, but lay out and render one figure at a
+time. Use a process pool to render figures in parallel.
 """
+import functools
+import re
+import threading
+import weakref
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from util import figsize_dict, set_plot_style, update_ticks
+from util import figsize_dict, plot_style_dict, update_ticks
+
+# Downsampled series and images keep this many points per pixel of the axes
+_OVERSAMPLING = 2
+
+# Held while laying out or rendering a figure, which is not thread-safe
+_render_lock = threading.RLock()
+
+# Time pyramid of each zoomable concentration profile image
+_time_pyramids = weakref.WeakKeyDictionary()
+
+# Mathtext font command for each value of the 'mathtext.default' rcParam
+_mathtext_commands = {'regular': 'mathregular', 'rm': 'mathrm', 'it': 'mathit', 'bf': 'mathbf', 'sf': 'mathsf', 'tt': 'mathtt', 'cal': 'mathcal'}
+
+def new_figure(figsize: tuple = None):
+    """
+    Create a figure with one Axes on an Agg canvas, without pyplot.
+
+    The figure is not tracked by pyplot, so it can be created and drawn from any thread (drawing and saving hold the
+    module's render lock) and is freed as soon as it is no longer referenced. It can still be embedded in a GUI canvas,
+    e.g. FigureCanvasTkAgg(fig, master).
+
+    Parameters:
+    figsize (tuple, optional): Width and height in inches, defaults to figsize_dict['default'].
+
+    Returns:
+    tuple: Figure and Axes.
+    """
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize_dict['default'] if figsize is None else figsize)
+    _locked_canvas_class()(fig)
+    return fig, fig.add_subplot(111)
+
+@functools.lru_cache(maxsize=None)
+def _locked_canvas_class():
+    """
+    Agg canvas drawing and saving its figure while holding the render lock, defined on first use as matplotlib is imported lazily.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    class LockedFigureCanvasAgg(FigureCanvasAgg):
+        def draw(self):
+            with _render_lock:
+                super().draw()
+
+        def print_figure(self, *args, **kwargs):
+            with _render_lock:
+                return super().print_figure(*args, **kwargs)
+
+    return LockedFigureCanvasAgg
+
+def _tight_layout(fig):
+    """
+    Adjust the padding of fig to its text while holding the render lock.
+    """
+    with _render_lock:
+        fig.tight_layout()
+
+def downsample_minmax(x, y, n_buckets: int):
+    """
+    Reduce a line to the first, last, lowest and highest point of each of n_buckets equal-width intervals of x.
+
+    Drawn at a resolution of at most n_buckets columns, the reduced line covers the same pixels as the full line.
+    Points where y is NaN are kept so that gaps in the line are preserved.
+
+    Parameters:
+    x (array-like): Non-decreasing x values.
+    y (array-like): y values.
+    n_buckets (int): Number of intervals, e.g. the width of the axes in pixels.
+
+    Returns:
+    tuple: x and y of the kept points in their original order, or x and y unchanged if they are short or x is not sorted.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) <= 4 * n_buckets or not np.all(np.diff(x) >= 0):
+        return x, y
+    edges = np.linspace(x[0], x[-1], n_buckets + 1)
+    starts = np.unique(np.searchsorted(x, edges[:-1], side='left'))   # Empty intervals share the start of the next one
+    counts = np.diff(np.append(starts, len(x)))
+    bucket = np.repeat(np.arange(len(starts)), counts)
+    nan = np.isnan(y)
+    keep = nan.copy()
+    keep[starts] = True
+    keep[starts + counts - 1] = True
+    for fill, reduce in [(np.inf, np.minimum), (-np.inf, np.maximum)]:
+        filled = np.where(nan, fill, y)
+        extreme = np.flatnonzero(filled == reduce.reduceat(filled, starts)[bucket])
+        keep[extreme[np.unique(bucket[extreme], return_index=True)[1]]] = True   # First extreme of each interval
+    return x[keep], y[keep]
+
+def _line_data(ax, x, y, downsample):
+    """
+    Data of a line on ax, downsampled to twice the width of ax in pixels if downsample is True or to downsample intervals if it is an int.
+    """
+    if downsample is False or downsample is None:
+        return x, y
+    n_buckets = _OVERSAMPLING * max(1, int(ax.bbox.width)) if downsample is True else int(downsample)
+    return downsample_minmax(x, y, n_buckets)
+
+def _block_mean_rows(C, factor: int):
+    """
+    Average blocks of factor consecutive rows of C, the last block holding the remaining rows.
+    """
+    if factor <= 1:
+        return C
+    n_full = len(C) // factor * factor
+    blocks = C[:n_full].reshape(-1, factor, C.shape[1]).mean(axis=1)
+    if n_full < len(C):
+        blocks = np.vstack([blocks, C[n_full:].mean(axis=0, keepdims=True)])
+    return blocks
+
+class _TimePyramid:
+    """
+    Concentration profile averaged over blocks of 1, 2, 4, ... rows, i.e. at successively coarser time resolutions.
+
+    Row i of level k spans the times [i, i + 1) * 2**k * T / Nt, matching the extent [0, T] of the full profile.
+    """
+
+    def __init__(self, C_profile, T: float):
+        self.T = T
+        self.row_time = T / len(C_profile)
+        self.levels = [np.asarray(C_profile)]
+        while len(self.levels[-1]) > 1:
+            self.levels.append(_block_mean_rows(self.levels[-1], 2))
+
+    def view(self, t_lo: float, t_hi: float, n_rows: int):
+        """
+        Rows of the coarsest level with at least n_rows rows between t_lo and t_hi, and the times they span.
+        """
+        t_lo, t_hi = max(t_lo, 0), min(t_hi, self.T)
+        for level in reversed(range(len(self.levels))):
+            row_time = self.row_time * 2**level
+            if (t_hi - t_lo) / row_time >= n_rows:
+                break
+        data = self.levels[level]
+        first = min(int(t_lo // row_time), len(data) - 1)
+        last = max(min(int(np.ceil(t_hi / row_time)), len(data)), first + 1)
+        return data[first:last], first * row_time, last * row_time
+
+def _show_time_pyramid_view(image):
+    """
+    Show the level of the image's time pyramid matching the visible time range and the height of the axes in pixels.
+    """
+    pyramid = _time_pyramids.get(image)
+    if pyramid is None:
+        return
+    ax = image.axes
+    t_lo, t_hi = sorted(ax.get_ylim())
+    data, t_start, t_end = pyramid.view(t_lo, t_hi, _OVERSAMPLING * max(1, int(ax.bbox.height)))
+    x_start, x_end = image.get_extent()[:2]
+    image.set_data(data)
+    image.set_extent([x_start, x_end, t_start, t_end])
+
+def _concentration_image_data(ax, C_profile, T, downsample):
+    """
+    Data of the concentration profile image and its end time, with the rows block-averaged to twice the height of ax
+    in pixels if downsample is True or to at least downsample rows if it is an int.
+    """
+    if downsample is False or downsample is None:
+        return C_profile, T
+    n_rows = _OVERSAMPLING * max(1, int(ax.bbox.height)) if downsample is True else int(downsample)
+    factor = max(1, len(C_profile) // n_rows)
+    data = _block_mean_rows(np.asarray(C_profile), factor)
+    return data, T * len(data) * factor / len(C_profile)   # A partial last block extends past T and is clipped by the limits
+
+def _font_size(size, style):
+    """
+    Font size in points, resolving relative sizes such as 'small' against the font size of the style.
+    """
+    from matplotlib.font_manager import font_scalings
+    return font_scalings[size] * style['font.size'] if isinstance(size, str) else size
+
+def _math_text(text, style):
+    """
+    Wrap the math in text in the font command of the style's 'mathtext.default', which would otherwise be read from the global rcParams.
+    """
+    command = _mathtext_commands.get(style['mathtext.default'])
+    if command is None:
+        return text
+    return re.sub(r'\$(?!\\math)([^$]+)\$', lambda m: f'$\\{command}{{{m.group(1)}}}$', text)
+
+def _merge_style(style):
+    """
+    Merge the style overrides into util.plot_style_dict, rejecting the rcParams that _style_axes does not apply.
+    """
+    unsupported = set(style or {}) - set(plot_style_dict)
+    if unsupported:
+        raise ValueError(f"Unsupported plot style keys: {', '.join(sorted(unsupported))}. Supported keys are those of util.plot_style_dict.")
+    return {**plot_style_dict, **(style or {})}
 
-def plot_time_lag_analysis(df: pd.DataFrame, stabilisation_time_s: float, slope: float, intercept: float, fig=None, ax=None):
+def _style_axes(ax, style):
+    """
+    Apply the text, tick and grid properties of the style to the artists of ax.
+    """
+    family = style['font.family']
+    for text, size in [(ax.title, style['axes.titlesize']), (ax.xaxis.label, style['axes.labelsize']), (ax.yaxis.label, style['axes.labelsize'])]:
+        text.set_text(_math_text(text.get_text(), style))
+        text.set_fontsize(_font_size(size, style))
+        text.set_family(family)
+    for axis in ['x', 'y']:
+        size = _font_size(style[f'{axis}tick.labelsize'], style)
+        ax.tick_params(axis=axis, which='both', direction=style[f'{axis}tick.direction'], labelsize=size, labelfontfamily=family)
+        ax.tick_params(axis=axis, which='major', pad=style[f'{axis}tick.major.pad'])
+        offset_text = getattr(ax, f'{axis}axis').get_offset_text()
+        offset_text.set_fontsize(size)
+        offset_text.set_family(family)
+    legend = ax.get_legend()
+    if legend is not None:
+        for text in legend.get_texts():
+            text.set_text(_math_text(text.get_text(), style))
+            text.set_fontsize(_font_size(style['legend.fontsize'], style))
+            text.set_family(family)
+    if style['axes.grid']:
+        ax.grid(True, alpha=style['grid.alpha'], linestyle=style['grid.linestyle'], color=style['grid.color'])
+
+def plot_time_lag_analysis(df: pd.DataFrame, stabilisation_time_s: float, slope: float, intercept: float, fig=None, ax=None, style: dict = None, downsample=False):
     """
     Plot the results of the time-lag analysis.
 
@@ -17,25 +240,32 @@ def plot_time_lag_analysis(df: pd.DataFrame, stabilisation_time_s: float, slope:
     stabilisation_time (float): Time after which the flux has stabilised.
     slope (float): Slope of the fitted line.
     intercept (float): Intercept of the fitted line.
-    fig (matplotlib.figure.Figure, optional): Figure object to draw the plot onto, otherwise creates a new figure.
-    ax (matplotlib.axes.Axes, optional): Axes object to draw the plot onto, otherwise uses current Axes.
+    fig (matplotlib.figure.Figure, optional): Figure object to draw the plot onto, otherwise creates a new figure with new_figure.
+    ax (matplotlib.axes.Axes, optional): Axes object to draw the plot onto, otherwise creates a new figure.
+    style (dict, optional): Plot style overriding entries of util.plot_style_dict. Other rcParams are not supported.
+    downsample (bool or int): Whether to draw each series reduced by downsample_minmax to twice the width of the axes in pixels, or the number of intervals to reduce it to.
+
+    Returns:
+    tuple: Figure and Axes drawn onto.
     """
-    set_plot_style()
+    style = _merge_style(style)
     df_ss = df[df['t / s'] > stabilisation_time_s]
     if fig is None or ax is None:
-        fig, ax = plt.subplots(1, 1, figsize=figsize_dict['default'])
-    ax.plot(df['t / s'], df['cumulative flux / cm^3(STP) cm^-2'], color='black', linestyle='-', label='Data')
-    ax.plot(df_ss['t / s'], slope*df_ss['t / s'] + intercept, color='red', linestyle='--', label='Fit (steady-state)')
-    ax.plot(df.loc[df['t / s'] <= stabilisation_time_s, 't / s'], slope*df.loc[df['t / s'] <= stabilisation_time_s, 't / s'] + intercept, color='red', linestyle=':', label='Fit (extrapolated)')
+        fig, ax = new_figure()
+    ax.plot(*_line_data(ax, df['t / s'], df['cumulative flux / cm^3(STP) cm^-2'], downsample), color='black', linestyle='-', label='Data')
+    ax.plot(*_line_data(ax, df_ss['t / s'], slope*df_ss['t / s'] + intercept, downsample), color='red', linestyle='--', label='Fit (steady-state)')
+    ax.plot(*_line_data(ax, df.loc[df['t / s'] <= stabilisation_time_s, 't / s'], slope*df.loc[df['t / s'] <= stabilisation_time_s, 't / s'] + intercept, downsample), color='red', linestyle=':', label='Fit (extrapolated)')
     ax.set_xlabel(r'Time / $s$')
     ax.set_ylabel(r'Cumulative Flux / $cm^{3}(STP) \; cm^{-2}$')
     ax.legend()
     (x_lo, x_up), (y_lo, y_up) = update_ticks(ax, x_lo=0, y_lo=0)
     ax.set_xlim(x_lo, x_up)
     ax.set_ylim(y_lo, y_up)
-    plt.tight_layout()
+    _style_axes(ax, style)
+    _tight_layout(fig)
+    return fig, ax
 
-def plot_concentration_location_profile(C_profile, L, T, fig=None, ax=None):
+def plot_concentration_location_profile(C_profile, L, T, fig=None, ax=None, time=None, style: dict = None):
     """
     Plot the concentration-location profile at different times.
 
@@ -43,24 +273,30 @@ def plot_concentration_location_profile(C_profile, L, T, fig=None, ax=None):
     C_profile (ndarray): Concentration profile as a function of position x and time t.
     L (float): Thickness of the polymer.
     T (float): Total time.
-    fig (matplotlib.figure.Figure, optional): Figure object to draw the plot onto, otherwise creates a new figure.
-    ax (matplotlib.axes.Axes, optional): Axes object to draw the plot onto, otherwise uses current Axes.
+    fig (matplotlib.figure.Figure, optional): Figure object to draw the plot onto, otherwise creates a new figure with new_figure.
+    ax (matplotlib.axes.Axes, optional): Axes object to draw the plot onto, otherwise creates a new figure.
+    time (ndarray, optional): Time of each row of C_profile (e.g. snapshot times), otherwise rows are assumed evenly spaced over [0, T].
+    style (dict, optional): Plot style overriding entries of util.plot_style_dict. Other rcParams are not supported.
+
+    Returns:
+    tuple: Figure and Axes drawn onto.
     """
-    set_plot_style()
+    style = _merge_style(style)
     if fig is None or ax is None:
-        fig, ax = plt.subplots(1, 1, figsize=figsize_dict['default'])
-    time_points = np.concatenate(([0], np.logspace(np.log10(T/100), np.log10(T), 5)))
-    for t in time_points:
-        ax.plot(np.linspace(0, L, C_profile.shape[1]), C_profile[int(t / T * (C_profile.shape[0] - 1)), :], label=f't = {t:.0f} s')
+        fig, ax = new_figure()
+    for t, row in _location_profile_rows(C_profile, T, time):
+        ax.plot(np.linspace(0, L, C_profile.shape[1]), C_profile[row, :], label=f't = {t:.0f} s')
     ax.set_xlabel(r'Position / $cm$')
     ax.set_ylabel(r'Concentration / $cm^{3}(STP) \; cm^{-3}$')
     ax.legend()
     (x_lo, x_up), (y_lo, y_up) = update_ticks(ax, x_lo=0, x_up=L, y_lo=0)
     ax.set_xlim(x_lo, x_up)
     ax.set_ylim(y_lo, y_up)
-    plt.tight_layout()
+    _style_axes(ax, style)
+    _tight_layout(fig)
+    return fig, ax
 
-def plot_flux_over_time(flux, preprocessed_df, T_final, fig=None, ax=None):
+def plot_flux_over_time(flux, preprocessed_df, T_final, fig=None, ax=None, time=None, style: dict = None, downsample=False):
     """
     Plot the flux over time from the model and the preprocessed data.
 
@@ -68,23 +304,33 @@ def plot_flux_over_time(flux, preprocessed_df, T_final, fig=None, ax=None):
     flux (ndarray): Flux values from the model.
     preprocessed_df (pd.DataFrame): Preprocessed data.
     T_final (float): Total time.
-    fig (matplotlib.figure.Figure, optional): Figure object to draw the plot onto, otherwise creates a new figure.
-    ax (matplotlib.axes.Axes, optional): Axes object to draw the plot onto, otherwise uses current Axes.
+    fig (matplotlib.figure.Figure, optional): Figure object to draw the plot onto, otherwise creates a new figure with new_figure.
+    ax (matplotlib.axes.Axes, optional): Axes object to draw the plot onto, otherwise creates a new figure.
+    time (ndarray, optional): Time points of the model flux, otherwise the flux is assumed evenly spaced over [0, T_final].
+    style (dict, optional): Plot style overriding entries of util.plot_style_dict. Other rcParams are not supported.
+    downsample (bool or int): Whether to draw each series reduced by downsample_minmax to twice the width of the axes in pixels, or the number of intervals to reduce it to.
+
+    Returns:
+    tuple: Figure and Axes drawn onto.
     """
-    set_plot_style()
+    style = _merge_style(style)
     if fig is None or ax is None:
-        fig, ax = plt.subplots(1, 1, figsize=figsize_dict['default'])
-    ax.plot(np.linspace(0, T_final, len(flux)), flux, label='Model')
-    ax.plot(preprocessed_df['t / s'], preprocessed_df['flux / cm^3(STP) cm^-2 s^-1'], linestyle='--', label='Measurement')
+        fig, ax = new_figure()
+    if time is None:
+        time = np.linspace(0, T_final, len(flux))
+    ax.plot(*_line_data(ax, time, flux, downsample), label='Model')
+    ax.plot(*_line_data(ax, preprocessed_df['t / s'], preprocessed_df['flux / cm^3(STP) cm^-2 s^-1'], downsample), linestyle='--', label='Measurement')
     ax.set_xlabel(r'Time / $s$')
     ax.set_ylabel(r'Flux / $cm^{3}(STP) \; cm^{-2} \; s^{-1}$')
     (x_lo, x_up), (y_lo, y_up) = update_ticks(ax, x_lo=0, y_lo=0)
     ax.legend()
     ax.set_xlim(x_lo, x_up)
     ax.set_ylim(y_lo, y_up)
-    plt.tight_layout()
+    _style_axes(ax, style)
+    _tight_layout(fig)
+    return fig, ax
 
-def plot_concentration_profile(C_profile, L, T, fig=None, ax=None):
+def plot_concentration_profile(C_profile, L, T, fig=None, ax=None, style: dict = None, downsample=False, pyramid: bool = False):
     """
     Plot the concentration profile as a function of position x and time t.
 
@@ -92,18 +338,144 @@ def plot_concentration_profile(C_profile, L, T, fig=None, ax=None):
     C_profile (ndarray): Concentration profile as a function of position x and time t.
     L (float): Thickness of the polymer.
     T (float): Total time.
-    fig (matplotlib.figure.Figure, optional): Figure object to draw the plot onto, otherwise creates a new figure.
-    ax (matplotlib.axes.Axes, optional): Axes object to draw the plot onto, otherwise uses current Axes.
+    fig (matplotlib.figure.Figure, optional): Figure object to draw the plot onto, otherwise creates a new figure with new_figure.
+    ax (matplotlib.axes.Axes, optional): Axes object to draw the plot onto, otherwise creates a new figure.
+    style (dict, optional): Plot style overriding entries of util.plot_style_dict. Other rcParams are not supported.
+    downsample (bool or int): Whether to draw the profile averaged over blocks of rows (time) down to twice the height of the axes in pixels, or the minimum number of rows to keep.
+    pyramid (bool): Whether to keep the profile at successively coarser time resolutions and show the one matching the visible time range whenever the limits change, so that zooming in stays sharp.
+
+    Returns:
+    tuple: Figure and Axes drawn onto.
     """
-    set_plot_style()
+    style = _merge_style(style)
     if fig is None or ax is None:
-        fig, ax = plt.subplots(1, 1, figsize=figsize_dict['default'])
-    cax = ax.imshow(C_profile, extent=[0, L, 0, T], aspect='auto', origin='lower', cmap='coolwarm')
+        fig, ax = new_figure()
+    C_profile = np.asarray(C_profile)
+    vmin, vmax = np.nanmin(C_profile), np.nanmax(C_profile)   # Colours of the full profile, whatever resolution is shown
+    data, T_end = _concentration_image_data(ax, C_profile, T, downsample or pyramid)
+    cax = ax.imshow(data, extent=[0, L, 0, T_end], aspect='auto', origin='lower', cmap='coolwarm', vmin=vmin, vmax=vmax)
     cbar = fig.colorbar(cax, ax=ax)
-    cbar.set_label(r'Concentration / $cm^{3}(STP) \; cm^{-3}$', size=ax.xaxis.label.get_fontsize())
+    cbar.set_label(r'Concentration / $cm^{3}(STP) \; cm^{-3}$')
     ax.set_xlabel(r'Position / $cm$')
     ax.set_ylabel(r'Time / $s$')
     (x_lo, x_up), (y_lo, y_up) = update_ticks(ax, x_lo=0, x_up=L, y_lo=0, y_up=T)
     ax.set_xlim(x_lo, x_up)
     ax.set_ylim(y_lo, y_up)
-    plt.tight_layout()
\ No newline at end of file
+    _style_axes(ax, style)
+    _style_axes(cbar.ax, style)
+    _tight_layout(fig)
+    if pyramid:
+        _time_pyramids[cax] = _TimePyramid(C_profile, T)
+        _show_time_pyramid_view(cax)
+        ax.callbacks.connect('ylim_changed', lambda ax: _show_time_pyramid_view(cax))
+    return fig, ax
+
+def _location_profile_rows(C_profile, T, time=None):
+    """
+    Get the time points of the concentration-location profile and the rows of C_profile closest to them.
+    """
+    time_points = np.concatenate(([0], np.logspace(np.log10(T/100), np.log10(T), 5)))
+    rows = []
+    for t in time_points:
+        if time is None:
+            row = int(t / T * (C_profile.shape[0] - 1))
+        else:
+            row = np.abs(np.asarray(time) - t).argmin()
+        rows.append((t, row))
+    return rows
+
+def _rescale(ax, **limits):
+    """
+    Autoscale ax to its updated data and apply the tick adjustments of update_ticks.
+    """
+    ax.set_autoscale_on(True)
+    ax.relim()
+    ax.autoscale_view()
+    (x_lo, x_up), (y_lo, y_up) = update_ticks(ax, **limits)
+    ax.set_xlim(x_lo, x_up)
+    ax.set_ylim(y_lo, y_up)
+
+def update_time_lag_analysis(df: pd.DataFrame, stabilisation_time_s: float, slope: float, intercept: float, ax, downsample=False):
+    """
+    Update the artists drawn by plot_time_lag_analysis in place with new results.
+
+    Parameters:
+    df (pd.DataFrame): Preprocessed data.
+    stabilisation_time (float): Time after which the flux has stabilised.
+    slope (float): Slope of the fitted line.
+    intercept (float): Intercept of the fitted line.
+    ax (matplotlib.axes.Axes): Axes previously drawn by plot_time_lag_analysis.
+    downsample (bool or int): Whether to draw each series reduced by downsample_minmax to twice the width of the axes in pixels, or the number of intervals to reduce it to.
+    """
+    data_line, fit_line, extrapolated_line = ax.lines[:3]
+    t = df['t / s']
+    t_ss = t[t > stabilisation_time_s]
+    t_extrapolated = t[t <= stabilisation_time_s]
+    data_line.set_data(*_line_data(ax, t, df['cumulative flux / cm^3(STP) cm^-2'], downsample))
+    fit_line.set_data(*_line_data(ax, t_ss, slope*t_ss + intercept, downsample))
+    extrapolated_line.set_data(*_line_data(ax, t_extrapolated, slope*t_extrapolated + intercept, downsample))
+    _rescale(ax, x_lo=0, y_lo=0)
+
+def update_flux_over_time(flux, preprocessed_df, T_final, ax, time=None, downsample=False):
+    """
+    Update the artists drawn by plot_flux_over_time in place with new results.
+
+    Parameters:
+    flux (ndarray): Flux values from the model.
+    preprocessed_df (pd.DataFrame): Preprocessed data.
+    T_final (float): Total time.
+    ax (matplotlib.axes.Axes): Axes previously drawn by plot_flux_over_time.
+    time (ndarray, optional): Time points of the model flux, otherwise the flux is assumed evenly spaced over [0, T_final].
+    downsample (bool or int): Whether to draw each series reduced by downsample_minmax to twice the width of the axes in pixels, or the number of intervals to reduce it to.
+    """
+    model_line, measurement_line = ax.lines[:2]
+    if time is None:
+        time = np.linspace(0, T_final, len(flux))
+    model_line.set_data(*_line_data(ax, time, flux, downsample))
+    measurement_line.set_data(*_line_data(ax, preprocessed_df['t / s'], preprocessed_df['flux / cm^3(STP) cm^-2 s^-1'], downsample))
+    _rescale(ax, x_lo=0, y_lo=0)
+
+def update_concentration_location_profile(C_profile, L, T, ax, time=None):
+    """
+    Update the artists drawn by plot_concentration_location_profile in place with new results.
+
+    Parameters:
+    C_profile (ndarray): Concentration profile as a function of position x and time t.
+    L (float): Thickness of the polymer.
+    T (float): Total time.
+    ax (matplotlib.axes.Axes): Axes previously drawn by plot_concentration_location_profile.
+    time (ndarray, optional): Time of each row of C_profile (e.g. snapshot times), otherwise rows are assumed evenly spaced over [0, T].
+    """
+    x = np.linspace(0, L, C_profile.shape[1])
+    legend = ax.get_legend()
+    for i, (t, row) in enumerate(_location_profile_rows(C_profile, T, time)):
+        ax.lines[i].set_data(x, C_profile[row, :])
+        ax.lines[i].set_label(f't = {t:.0f} s')
+        if legend is not None:
+            legend.get_texts()[i].set_text(f't = {t:.0f} s')
+    _rescale(ax, x_lo=0, x_up=L, y_lo=0)
+
+def update_concentration_profile(C_profile, L, T, ax, downsample=False):
+    """
+    Update the image drawn by plot_concentration_profile in place with new results. The colorbar follows the image.
+
+    Parameters:
+    C_profile (ndarray): Concentration profile as a function of position x and time t.
+    L (float): Thickness of the polymer.
+    T (float): Total time.
+    ax (matplotlib.axes.Axes): Axes previously drawn by plot_concentration_profile.
+    downsample (bool or int): As for plot_concentration_profile. Ignored if the image was drawn with a time pyramid, which is rebuilt instead.
+    """
+    image = ax.images[0]
+    C_profile = np.asarray(C_profile)
+    if image in _time_pyramids:
+        _time_pyramids[image] = _TimePyramid(C_profile, T)
+        downsample = True
+    data, T_end = _concentration_image_data(ax, C_profile, T, downsample)
+    image.set_data(data)
+    image.set_extent([0, L, 0, T_end])
+    image.set_clim(np.nanmin(C_profile), np.nanmax(C_profile))
+    (x_lo, x_up), (y_lo, y_up) = update_ticks(ax, x_lo=0, x_up=L, y_lo=0, y_up=T)
+    ax.set_xlim(x_lo, x_up)
+    ax.set_ylim(y_lo, y_up)
+    _show_time_pyramid_view(image)
\ No newline at end of file
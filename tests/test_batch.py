@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import pytest
+from src.batch import get_batch_jobs, load_batch_config, run_batch
+from src.instrumentation import summarise_spans
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+@pytest.fixture
+def batch_dir(tmp_path):
+    shutil.copy(os.path.join(DATA_DIR, 'RUN_H_75C-100bar.xlsx'), tmp_path)
+    (tmp_path / 'unknown.csv').write_text('t / s,y_CO2 / ppm\n0,0\n')
+    (tmp_path / 'notes.txt').write_text('not a data file')
+    return tmp_path
+
+def test_get_batch_jobs(batch_dir):
+    config_path = batch_dir / 'config.json'
+    config_path.write_text(json.dumps({'unknown': {'L_cm': 0.05, 'stabilisation_time_range': [10, 20]}}))
+    jobs = get_batch_jobs(str(batch_dir), config=load_batch_config(str(config_path)))
+    
+    assert [os.path.basename(job['datapath']) for job in jobs] == ['RUN_H_75C-100bar.xlsx', 'unknown.csv']
+    assert jobs[0]['L_cm'] == 0.1 and jobs[0]['qN2_mlmin'] == 8.0
+    assert jobs[1]['L_cm'] == 0.05 and jobs[1]['stablisation_time_range'] == (10, 20)
+
+def test_run_batch_isolates_failures(batch_dir):
+    results_df = run_batch(str(batch_dir), workers=2, verbose=False)
+    
+    assert list(results_df['experiment']) == ['RUN_H_75C-100bar', 'unknown']
+    ok, failed = results_df.iloc[0], results_df.iloc[1]
+    assert ok['status'] == 'ok' and ok['diffusion_coefficient'] > 0
+    assert failed['status'] == 'failed' and 'No thickness' in failed['error']
+
+def test_run_batch_timings(batch_dir):
+    results_df = run_batch(str(batch_dir), workers=1, verbose=False, timings=True)
+    
+    ok = results_df.iloc[0]
+    assert [span['stage'] for span in ok['timings']][:3] == ['cache lookup', 'loading', 'preprocessing']
+    summary = summarise_spans(results_df['timings'])
+    assert summary.loc['loading', 'count'] == 1
+
+def test_run_batch_reuses_cached_results(batch_dir):
+    first = run_batch(str(batch_dir), workers=1, verbose=False)
+    second = run_batch(str(batch_dir), workers=1, verbose=False, timings=True)
+    
+    assert first.loc[0, 'diffusion_coefficient'] == second.loc[0, 'diffusion_coefficient']
+    assert [span['stage'] for span in second.loc[0, 'timings']] == ['cache lookup']
+    uncached = run_batch(str(batch_dir), workers=1, verbose=False, timings=True, use_cache=False)
+    assert 'cache lookup' not in [span['stage'] for span in uncached.loc[0, 'timings']]
+
+def test_batch_runs_as_module(batch_dir):
+    root = os.path.join(os.path.dirname(__file__), '..')
+    output = batch_dir / 'results.csv'
+    completed = subprocess.run([sys.executable, '-m', 'src.batch', str(batch_dir), '--workers', '1', '--no-cache', '--output', str(output)],
+                               cwd=root, capture_output=True, text=True)
+    assert completed.returncode == 1, completed.stderr   # unknown.csv has no thickness
+    assert '1 of 2 files analysed' in completed.stdout and output.exists()
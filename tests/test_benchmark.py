@@ -0,0 +1,49 @@
+import json
+import numpy as np
+from src.benchmark import DEFAULT_BASELINE_PATH, benchmark_imports, compare_to_baseline, make_synthetic_data, run_benchmarks
+
+STAGES = ['load_data', 'preprocess_data', 'identify_stabilisation_time', 'time_lag_analysis', 'flux_pde_const_D',
+          'plot_time_lag_analysis', 'plot_flux_over_time', 'plot_time_lag_analysis (downsampled)',
+          'plot_flux_over_time (downsampled)', 'plot_concentration_location_profile',
+          'plot_concentration_profile', 'plot_concentration_profile (downsampled)', 'time_lag_analysis_workflow',
+          'time_lag_analysis_workflow (cached)']
+
+def test_make_synthetic_data():
+    df = make_synthetic_data(1000)
+    assert len(df) == 1000
+    assert list(df.columns) == ['t / s', 'y_CO2 / ppm', 'P_cell / barg', 'T / °C', 'qN2 / ml min^-1']
+    assert np.all(np.diff(df['t / s']) > 0)
+
+def test_run_benchmarks_synthetic():
+    report = run_benchmarks(data_dir=None, sizes=[2000], repeat=1, verbose=False, import_modules=())
+    
+    assert [r['stage'] for r in report['results']] == STAGES
+    for record in report['results']:
+        assert record['error'] is None, record
+        assert record['dataset'] == 'synthetic_2000' and record['n_samples'] == 2000
+        assert record['time_s'] >= 0 and record['peak_memory_mb'] >= 0
+
+def test_benchmark_imports():
+    records = benchmark_imports(['calculations', 'no_such_module'], repeat=1, verbose=False)
+    
+    assert [r['stage'] for r in records] == ['import calculations', 'import no_such_module']
+    assert records[0]['error'] is None and records[0]['time_s'] > 0 and records[0]['peak_memory_mb'] > 0
+    assert records[1]['error'].startswith('ImportError') and records[1]['time_s'] is None
+
+def test_compare_to_baseline():
+    def report(time_s, peak_memory_mb, error=None):
+        return {'results': [{'dataset': 'a', 'stage': 'load_data', 'time_s': time_s, 'peak_memory_mb': peak_memory_mb, 'error': error}]}
+    
+    assert compare_to_baseline(report(1.1, 10), report(1.0, 10)) == []
+    regressions = compare_to_baseline(report(2.0, 30), report(1.0, 10))
+    assert [r['metric'] for r in regressions] == ['time_s', 'peak_memory_mb']
+    assert compare_to_baseline(report(None, None, 'ValueError'), report(1.0, 10))[0]['metric'] == 'error'
+    # Tiny absolute changes are noise
+    assert compare_to_baseline(report(0.002, 10), report(0.001, 10)) == []
+
+def test_baseline_report():
+    # The committed reference covers every stage and records where it was measured
+    with open(DEFAULT_BASELINE_PATH) as f:
+        baseline = json.load(f)
+    assert {'python', 'numpy', 'pandas', 'platform', 'cpu_count'} <= set(baseline['meta'])
+    assert set(STAGES) <= {r['stage'] for r in baseline['results'] if r['dataset'] == 'synthetic_100000'}
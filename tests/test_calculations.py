@@ -1,7 +1,7 @@
 import pytest
 import pandas as pd
 import numpy as np
-from src.calculations import time_lag_analysis, flux_pde_const_D
+from src.calculations import time_lag_analysis, time_lag_scan, time_lag_bootstrap, flux_pde_const_D, flux_pde_const_D_batch, flux_pde_var_D, flux_series_const_D, fit_transient_flux, _crank_nicolson_stepper
 
 @pytest.fixture
 def sample_steady_state_data():
@@ -46,6 +46,48 @@ def test_time_lag_analysis(sample_steady_state_data):
     assert pressure > 0
     assert solubility > 0
 
+def test_time_lag_scan(sample_steady_state_data):
+    thickness = 0.1
+    stabilisation_times = [0, 250.5, 500, 900]
+    scan = time_lag_scan(sample_steady_state_data, thickness, stabilisation_times=stabilisation_times, max_time=950)
+    
+    assert list(scan.index) == stabilisation_times
+    for stabilisation_time in stabilisation_times:
+        df = sample_steady_state_data[sample_steady_state_data['t / s'] <= 950]
+        time_lag, D, P, S, pressure, solubility, slope, intercept = time_lag_analysis(df, stabilisation_time, thickness)
+        row = scan.loc[stabilisation_time]
+        assert row['slope'] == pytest.approx(slope, rel=1e-8)
+        assert row['intercept'] == pytest.approx(intercept, rel=1e-6)
+        assert row['time_lag'] == pytest.approx(time_lag, rel=1e-6)
+        assert row['diffusion_coefficient'] == pytest.approx(D, rel=1e-6)
+        assert row['permeability'] == pytest.approx(P, rel=1e-8)
+        assert row['pressure'] == pytest.approx(pressure)
+    
+    # Every row is a candidate by default, windows with fewer than 2 points give NaN
+    scan = time_lag_scan(sample_steady_state_data, thickness)
+    assert len(scan) == len(sample_steady_state_data)
+    assert scan['slope'].iloc[:-2].notna().all()
+    assert scan['slope'].iloc[-2:].isna().all()
+
+def test_time_lag_bootstrap(sample_steady_state_data):
+    thickness = 0.1
+    time_lag = time_lag_analysis(sample_steady_state_data, 500, thickness)[0]
+    summary, replicates = time_lag_bootstrap(sample_steady_state_data, 500, thickness, n_replicates=2000, seed=0, batch_size=300, return_replicates=True)
+    
+    assert list(summary.index) == [2.5, 50, 97.5]
+    assert list(summary.columns) == ['time_lag', 'diffusion_coefficient', 'permeability', 'solubility_coefficient']
+    assert len(replicates) == 2000
+    assert summary.loc[2.5, 'time_lag'] < time_lag < summary.loc[97.5, 'time_lag']
+    assert summary['diffusion_coefficient'].is_monotonic_increasing
+    
+    # Seeded results are reproducible
+    pd.testing.assert_frame_equal(summary, time_lag_bootstrap(sample_steady_state_data, 500, thickness, n_replicates=2000, seed=0, batch_size=300))
+    
+    # The stabilisation time of each replicate is drawn from the range
+    summary, replicates = time_lag_bootstrap(sample_steady_state_data, 500, thickness, n_replicates=500, stabilisation_time_range=(400, 600), seed=1, return_replicates=True)
+    assert replicates['stabilisation_time'].between(400, 600).all()
+    assert replicates['stabilisation_time'].nunique() > 1
+
 def test_flux_pde_const_D():
     D = 1e-7  # cm^2/s
     C_eq = 1.0  # cm^3(STP)/cm^3
@@ -82,3 +124,176 @@ def test_flux_pde_const_D_stability():
     # Should raise assertion error due to stability condition violation
     with pytest.raises(AssertionError):
         flux_pde_const_D(D, C_eq, L, T, dt, dx)
+
+def test_flux_pde_const_D_crank_nicolson_matches_explicit():
+    D = 1e-7  # cm^2/s
+    C_eq = 1.0  # cm^3(STP)/cm^3
+    L = 0.1  # cm
+    T = 20000  # s
+    dx = L/50  # cm
+    
+    C_explicit, flux_explicit, _, _ = flux_pde_const_D(D, C_eq, L, T, 10, dx)
+    C_implicit, flux_implicit, df_C, df_flux = flux_pde_const_D(D, C_eq, L, T, 10, dx, method='crank-nicolson')
+    
+    assert C_implicit.shape == C_explicit.shape
+    assert isinstance(flux_implicit, list)
+    assert np.allclose(C_implicit[:, 0], C_eq)
+    assert np.allclose(C_implicit[:, -1], 0)
+    assert np.allclose(flux_implicit, flux_explicit, rtol=0, atol=1e-3 * max(flux_explicit))
+
+def test_flux_pde_const_D_crank_nicolson_large_dt():
+    D = 1e-7  # cm^2/s
+    C_eq = 1.0  # cm^3(STP)/cm^3
+    L = 0.1  # cm
+    T = 40000  # s
+    dx = L/50  # cm
+    
+    # dt = 50 s is beyond the explicit stability limit (20 s) but stable for the implicit scheme
+    _, flux_explicit, _, _ = flux_pde_const_D(D, C_eq, L, T, 10, dx)
+    C_profile, flux, _, _ = flux_pde_const_D(D, C_eq, L, T, 50, dx, method='crank-nicolson')
+    
+    assert C_profile.shape == (801, 51)
+    assert np.all(np.isfinite(flux))
+    assert np.allclose(flux, flux_explicit[::5], rtol=0, atol=1e-2 * max(flux_explicit))
+
+def test_flux_pde_const_D_crank_nicolson_blocks_match_steps():
+    D, C_eq, L, T, dt = 1e-6, 1.0, 0.1, 3000, 1
+    dx = L/50
+    
+    # Blocks of time steps advanced at once match one tridiagonal solve per step
+    C_profile, flux, _, _ = flux_pde_const_D(D, C_eq, L, T, dt, dx, method='crank-nicolson')
+    step = _crank_nicolson_stepper(D, C_eq, 51, dt, dx)
+    C = np.zeros(51)
+    C[0] = C_eq
+    C_steps = [C.copy()]
+    for n in range(1, T + 1):
+        C_steps.append(step(C, n).copy())
+    assert np.allclose(C_profile, C_steps, rtol=0, atol=1e-12 * C_eq)
+
+def test_flux_pde_const_D_unknown_method():
+    with pytest.raises(ValueError):
+        flux_pde_const_D(1e-7, 1.0, 0.1, 1000, 1, 0.002, method='euler')
+
+@pytest.mark.parametrize('method, dt', [('explicit', 1), ('crank-nicolson', 20)])
+def test_flux_pde_const_D_batch_matches_single(method, dt):
+    D = np.array([5e-8, 1e-7, 2e-7])
+    C_eq = np.array([1.0, 2.0, 0.5])
+    L, T, dx = 0.1, 2000, 0.1/50
+    
+    time, flux = flux_pde_const_D_batch(D, C_eq, L, T, dt, dx, method=method)
+    assert flux.shape == (len(D), len(time))
+    for i in range(len(D)):
+        _, flux_single, _, _ = flux_pde_const_D(D[i], C_eq[i], L, T, dt, dx, method=method)
+        assert np.allclose(flux[i], flux_single, rtol=1e-8, atol=1e-12 * max(flux_single))
+    
+    # Scalar C_eq is broadcast against D
+    _, flux_broadcast = flux_pde_const_D_batch(D, 1.0, L, T, dt, dx, method=method)
+    assert np.allclose(flux_broadcast[1], flux[1] / C_eq[1])
+
+def test_flux_pde_var_D_constant_matches_series():
+    D, C_eq, L, T = 1e-7, 1.0, 0.1, 2e5
+    C_profile, flux, df_C, df_flux = flux_pde_var_D(D, C_eq, L, T, dt=1000, dx=L/50, D_model='constant')
+    _, flux_series = flux_series_const_D(D, C_eq, L, df_flux['Time'])
+    
+    assert isinstance(C_profile, np.ndarray)
+    assert isinstance(flux, list)
+    assert len(flux) == len(df_flux) == 201
+    assert C_profile.shape == (201, 51)
+    assert np.allclose(flux, flux_series, rtol=0, atol=1e-2 * max(flux_series))
+
+@pytest.mark.parametrize('D_model, D_params, integral', [
+    ('exponential', {'beta': 1.0}, lambda C: (np.exp(C) - 1)),
+    ('linear', {'alpha': 2.0}, lambda C: C + C**2),
+])
+def test_flux_pde_var_D_steady_state(D_model, D_params, integral):
+    D0, C_eq, L, T = 1e-7, 1.0, 0.1, 1e6
+    _, flux, _, _ = flux_pde_var_D(D0, C_eq, L, T, dt=1e4, dx=L/50, D_model=D_model, D_params=D_params, snapshot_times=[T])
+    
+    # Steady-state flux is the integral of D(C) over [0, C_eq] divided by L
+    assert flux[-1] == pytest.approx(D0 * integral(C_eq) / L, rel=1e-2)
+
+def test_flux_pde_var_D_invalid_model():
+    with pytest.raises(ValueError):
+        flux_pde_var_D(1e-7, 1.0, 0.1, 100, dt=1, dx=0.002, D_model='unknown')
+
+def test_flux_series_const_D_matches_pde():
+    D = 1e-7  # cm^2/s
+    C_eq = 1.0  # cm^3(STP)/cm^3
+    L = 0.1  # cm
+    T = 40000  # s
+    dx = L/50  # cm
+    
+    C_pde, flux_pde, _, _ = flux_pde_const_D(D, C_eq, L, T, 10, dx)
+    t = np.linspace(0, T, len(flux_pde))
+    x = np.linspace(0, L, C_pde.shape[1])
+    C_series, flux_series = flux_series_const_D(D, C_eq, L, t, x)
+    
+    assert C_series.shape == C_pde.shape
+    assert np.allclose(C_series[:, 0], C_eq)
+    assert np.allclose(C_series[:, -1], 0)
+    assert np.allclose(flux_series, flux_pde, rtol=0, atol=1e-2 * max(flux_pde))
+    assert np.allclose(C_series[100:], C_pde[100:], rtol=0, atol=1e-2 * C_eq)
+
+def test_flux_series_const_D_limits():
+    D = 1e-7  # cm^2/s
+    C_eq = 1.0  # cm^3(STP)/cm^3
+    L = 0.1  # cm
+    
+    # Zero flux at t = 0, steady-state flux D C_eq / L at long times
+    C_profile, flux = flux_series_const_D(D, C_eq, L, [0, 1e6])
+    assert C_profile is None
+    assert flux[0] == 0
+    assert np.isclose(flux[1], D * C_eq / L)
+    
+    # Short- and long-time series agree at the switch-over point
+    t_switch = 0.1 * L**2 / D
+    _, flux = flux_series_const_D(D, C_eq, L, [t_switch * (1 - 1e-9), t_switch])
+    assert np.isclose(flux[0], flux[1], rtol=1e-6)
+
+def test_flux_pde_const_D_stored_snapshots():
+    D = 1e-7  # cm^2/s
+    C_eq = 1.0  # cm^3(STP)/cm^3
+    L = 0.1  # cm
+    T = 1000  # s
+    dt = 1  # s
+    dx = L/50  # cm
+    
+    C_full, flux_full, _, _ = flux_pde_const_D(D, C_eq, L, T, dt, dx)
+    
+    # Every 100th time step, full flux trace
+    C_strided, flux, df_C, df_flux = flux_pde_const_D(D, C_eq, L, T, dt, dx, stride=100)
+    assert C_strided.shape == (11, 51)
+    assert np.array_equal(C_strided, C_full[::100])
+    assert flux == flux_full
+    assert len(df_flux) == 1001
+    assert np.allclose(df_C['Time'], np.arange(0, 1001, 100))
+    
+    # Requested snapshot times only
+    C_snapshots, _, df_C, _ = flux_pde_const_D(D, C_eq, L, T, dt, dx, snapshot_times=[0, 10, 500, 1000])
+    assert C_snapshots.shape == (4, 51)
+    assert np.array_equal(C_snapshots, C_full[[0, 10, 500, 1000]])
+    assert np.allclose(df_C['Time'], [0, 10, 500, 1000])
+
+def test_flux_pde_const_D_callback():
+    steps = []
+    flux_pde_const_D(1e-7, 1.0, 0.1, 100, 1, 0.002, callback=lambda n, Nt: steps.append((n, Nt)))
+    assert steps[0] == (0, 101) and steps[-1] == (100, 101)
+    
+    # Raising from the callback aborts the solve
+    def abort(n, Nt):
+        if n == 10:
+            raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        flux_pde_const_D(1e-7, 1.0, 0.1, 100, 1, 0.002, method='crank-nicolson', callback=abort)
+
+def test_fit_transient_flux():
+    D, C_eq, L = 2e-6, 5.0, 0.1
+    t = np.linspace(0, 3e4, 3001)
+    _, flux = flux_series_const_D(D, C_eq, L, t)
+    df = pd.DataFrame({'t / s': t, 'flux / cm^3(STP) cm^-2 s^-1': flux + np.random.default_rng(0).normal(0, 1e-3 * flux.max(), len(t))})
+    
+    # Converges from a poor initial guess
+    D_fit, C_eq_fit, rms = fit_transient_flux(df, L, D0=D * 3, C_eq0=C_eq / 2)
+    assert D_fit == pytest.approx(D, rel=1e-2)
+    assert C_eq_fit == pytest.approx(C_eq, rel=1e-2)
+    assert rms < 2e-3 * flux.max()
@@ -1,7 +1,8 @@
 import pytest
 import pandas as pd
 import numpy as np
-from src.data_processing import load_data, correct_baseline, calculate_pressure, calculate_flux, calculate_cumulative_flux, identify_stabilisation_time, preprocess_data
+import os
+from src.data_processing import evict_cache, load_data, correct_baseline, calculate_pressure, calculate_flux, calculate_cumulative_flux, identify_stabilisation_time, preprocess_data
 
 @pytest.fixture
 def sample_data():
@@ -38,6 +39,22 @@ def test_calculate_cumulative_flux(sample_data):
     assert len(result) == len(sample_data)
     assert result.is_monotonic_increasing  # Cumulative flux should be monotonically increasing
 
+@pytest.fixture
+def flux_data(sample_data):
+    # Preprocessed as in StreamingTimeLagAnalysis._preprocess
+    df = sample_data.copy()
+    df['y_CO2_bl / ppm'] = correct_baseline(df, baseline=50)
+    df['P_cell / bar'] = calculate_pressure(df)
+    df['flux / cm^3(STP) cm^-2 s^-1'] = calculate_flux(df, d_cm=1.0, qN2_mlmin=8.0)
+    return df
+
+def test_calculate_cumulative_flux_continued(flux_data):
+    expected = calculate_cumulative_flux(flux_data.copy())
+    first = calculate_cumulative_flux(flux_data.iloc[:40].copy())
+    second = calculate_cumulative_flux(flux_data.iloc[40:].copy(), t_prev=flux_data['t / s'].iloc[39], initial=first.iloc[-1])
+    assert expected.iloc[-1] > 0
+    assert np.allclose(pd.concat([first, second]), expected)
+
 def test_identify_stabilisation_time(sample_data):
     # Create sample data with known stabilisation point
     t = np.linspace(0, 100, 101)
@@ -52,6 +69,28 @@ def test_identify_stabilisation_time(sample_data):
     assert result > 0
     assert result < df['t / s'].max()
 
+def test_identify_stabilisation_time_scan():
+    t = np.linspace(0, 100, 101)
+    y = np.where(t < 50, t**2, 50*t)
+    df = pd.DataFrame({
+        't / s': t,
+        'cumulative flux / cm^3(STP) cm^-2': y
+    })
+    windows, thresholds = [3, 5, 10], [1e-6, 1e-3, 1e-1]
+
+    result = identify_stabilisation_time(df, column='cumulative flux / cm^3(STP) cm^-2', window=windows, threshold=thresholds)
+    assert isinstance(result, pd.DataFrame)
+    assert result.shape == (3, 3)
+    for w in windows:
+        for th in thresholds:
+            assert result.loc[w, th] == identify_stabilisation_time(df, column='cumulative flux / cm^3(STP) cm^-2', window=w, threshold=th)
+
+    # A window longer than the data never stabilises
+    result = identify_stabilisation_time(df, column='cumulative flux / cm^3(STP) cm^-2', window=[200], threshold=0.001)
+    assert result.isna().all().all()
+    with pytest.raises(ValueError):
+        identify_stabilisation_time(df, column='cumulative flux / cm^3(STP) cm^-2', window=200, threshold=0.001)
+
 def test_preprocess_data(sample_data):
     result = preprocess_data(sample_data, d_cm=1.0, qN2_mlmin=8.0)
     required_columns = [
@@ -67,3 +106,29 @@ def test_preprocess_data(sample_data):
     assert isinstance(result, pd.DataFrame)
     assert all(col in result.columns for col in required_columns)
     assert len(result) == len(sample_data)
+
+def test_load_data_cache(sample_data, tmp_path):
+    file_path = str(tmp_path / 'sample.xlsx')
+    cache_dir = tmp_path / 'cache'
+    sample_data.to_excel(file_path, index=False)
+    
+    # Without cache, the default, nothing is written
+    df = load_data(file_path, cache_dir=str(cache_dir))
+    assert not cache_dir.exists()
+    assert os.listdir(tmp_path) == ['sample.xlsx']
+    
+    # First load populates the cache, second load reads from it
+    df_first = load_data(file_path, use_cache=True, cache_dir=str(cache_dir))
+    assert len(os.listdir(cache_dir)) == 1
+    df_cached = load_data(file_path, use_cache=True, cache_dir=str(cache_dir))
+    pd.testing.assert_frame_equal(df_cached, df)
+    pd.testing.assert_frame_equal(df_first, df)
+    
+    # Modifying the file invalidates the entry
+    sample_data.iloc[:50].to_excel(file_path, index=False)
+    assert len(load_data(file_path, use_cache=True, cache_dir=str(cache_dir))) == 50
+    assert len(os.listdir(cache_dir)) == 2
+    
+    # Eviction removes the least recently used entries
+    evict_cache(str(cache_dir), max_bytes=1)
+    assert len(os.listdir(cache_dir)) == 0
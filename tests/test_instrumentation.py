@@ -0,0 +1,83 @@
+import logging
+import threading
+import tracemalloc
+import numpy as np
+import pytest
+from src.instrumentation import StageTimer, stage, format_span, summarise_spans
+
+def test_stage_timer_records_nested_spans():
+    received = []
+    timer = StageTimer(callback=received.append)
+    with timer.stage('outer'):
+        with timer.stage('inner'):
+            a = np.ones(2**20)   # 8 MB
+            del a
+        b = np.ones(2**18)   # 2 MB
+        del b
+    
+    assert [span['stage'] for span in timer.spans] == ['inner', 'outer']
+    assert received == timer.spans
+    inner, outer = timer.spans
+    assert inner['peak_memory_mb'] >= 8
+    assert outer['peak_memory_mb'] >= inner['peak_memory_mb']
+    assert outer['wall_time_s'] >= inner['wall_time_s'] >= 0
+    assert 'inner: ' in format_span(inner)
+
+def test_stage_timers_on_overlapping_threads():
+    # The short stage opens after and closes before the long one, which must keep its peak and tracing
+    long_opened, short_closed = threading.Event(), threading.Event()
+    timers = [StageTimer(), StageTimer()]
+    
+    def long_stage():
+        with timers[0].stage('long'):
+            a = np.ones(2**20)   # 8 MB
+            del a
+            long_opened.set()
+            short_closed.wait()
+            b = np.ones(2**18)   # 2 MB
+            del b
+    
+    def short_stage():
+        long_opened.wait()
+        with timers[1].stage('short'):
+            pass
+        short_closed.set()
+    
+    threads = [threading.Thread(target=long_stage), threading.Thread(target=short_stage)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert timers[0].spans[0]['peak_memory_mb'] >= 8
+    assert timers[1].spans[0]['peak_memory_mb'] >= 0
+    assert not tracemalloc.is_tracing()
+
+def test_stage_timer_records_failed_stage():
+    timer = StageTimer(trace_memory=False)
+    with pytest.raises(RuntimeError):
+        with timer.stage('failing'):
+            raise RuntimeError()
+    assert timer.spans[0]['stage'] == 'failing'
+    assert timer.spans[0]['peak_memory_mb'] is None
+
+def test_stage_timer_logger(caplog):
+    logger = logging.getLogger('test_instrumentation')
+    timer = StageTimer(callback=logger, trace_memory=False)
+    with caplog.at_level(logging.INFO, logger='test_instrumentation'):
+        with timer.stage('loading'):
+            pass
+    assert 'loading: ' in caplog.text
+
+def test_stage_without_timer():
+    with stage(None, 'loading'):
+        pass
+
+def test_summarise_spans():
+    spans = [{'stage': 'loading', 'wall_time_s': 1.0, 'cpu_time_s': 0.5, 'peak_memory_mb': 10.0},
+             {'stage': 'fitting', 'wall_time_s': 0.1, 'cpu_time_s': 0.1, 'peak_memory_mb': 1.0}]
+    summary = summarise_spans([spans, None, float('nan'), spans[:1]])
+    assert list(summary.index) == ['loading', 'fitting']
+    assert summary.loc['loading', 'count'] == 2
+    assert summary.loc['loading', 'total_wall_time_s'] == pytest.approx(2.0)
+    assert summary.loc['fitting', 'max_peak_memory_mb'] == 1.0
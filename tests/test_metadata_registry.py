@@ -0,0 +1,72 @@
+import json
+import os
+import pytest
+from src.batch import get_batch_jobs
+from src.metadata_registry import MetadataRegistry, get_registry, parse_experiment_name
+
+def test_parse_experiment_name():
+    assert parse_experiment_name('RUN_H_25C-100bar_7') == {'temperature': 25.0, 'pressure': 100.0}
+    assert parse_experiment_name('RUN_H_50C-200bar') == {'temperature': 50.0, 'pressure': 200.0}
+    assert parse_experiment_name('S3R1') == {}
+
+def test_default_registry():
+    registry = get_registry()
+    assert registry is get_registry()
+    assert registry['S4R3']['thickness'] == 0.025 and registry['S4R3']['flow_rate'] == 9.83
+    assert registry.get('RUN_H_25C-100bar_7.xlsx')['pressure'] == 100.0
+    assert [record['experiment'] for record in registry.filter(temperature=75)] == ['RUN_H_75C-100bar', 'RUN_H_75C-50bar']
+    assert len(registry.filter(gas='CO2', thickness=0.1)) == 14
+
+@pytest.fixture
+def registry_path(tmp_path):
+    path = tmp_path / 'metadata.json'
+    path.write_text(json.dumps({'S5R1': {'thickness': 0.05, 'diameter': 2.0, 'flow_rate': 9.5, 'gas': 'CO2'},
+                                'RUN_N_30C-10bar': {'thickness': 0.1, 'gas': 'N2', 'temperature': 31.5}}))
+    return str(path)
+
+def test_registry_lookup_and_filter(registry_path):
+    registry = MetadataRegistry(registry_path)
+    assert registry.names() == ['S5R1', 'RUN_N_30C-10bar']
+    assert registry['RUN_N_30C-10bar']['temperature'] == 31.5 and registry['RUN_N_30C-10bar']['pressure'] == 10.0
+    assert registry['S5R1']['temperature'] is None
+    assert 'S5R2' not in registry
+    with pytest.raises(KeyError):
+        registry['S5R2']
+
+    assert [record['experiment'] for record in registry.filter(gas='N2')] == ['RUN_N_30C-10bar']
+    assert [record['experiment'] for record in registry.filter(flow_rate=9.5)] == ['S5R1']
+    assert registry.filter(gas='N2', thickness=0.05) == []
+    with pytest.raises(ValueError):
+        registry.filter(colour='red')
+
+def test_registry_reload(registry_path):
+    registry = MetadataRegistry(registry_path)
+    assert not registry.reload()
+    with open(registry_path, 'w') as f:
+        json.dump({'S5R1': {'thickness': 0.06}}, f)
+    os.utime(registry_path, ns=(0, 10**9))   # Make sure the mtime changes
+    assert registry.reload()
+    assert registry['S5R1']['thickness'] == 0.06 and 'RUN_N_30C-10bar' not in registry
+
+def test_registry_scan(registry_path, tmp_path):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    for file_name in ['S5R1.xlsx', 'RUN_H_40C-20bar.csv', 'notes.txt']:
+        (data_dir / file_name).write_text('')
+    registry = MetadataRegistry(registry_path)
+
+    assert registry.scan(str(data_dir)) == ['RUN_H_40C-20bar.csv', 'S5R1.xlsx']
+    assert registry.scan(str(data_dir), extensions=('.xlsx',)) == ['S5R1.xlsx']
+    # Files without a registry entry are indexed by the conditions in their name
+    assert registry['RUN_H_40C-20bar']['thickness'] is None
+    assert [record['experiment'] for record in registry.filter(pressure=20)] == ['RUN_H_40C-20bar']
+
+    # Added files are listed on the next scan
+    (data_dir / 'S5R2.xlsx').write_text('')
+    assert registry.scan(str(data_dir)) == ['RUN_H_40C-20bar.csv', 'S5R1.xlsx', 'S5R2.xlsx']
+    assert 'S5R2' in registry
+
+    jobs = get_batch_jobs(str(data_dir), registry=registry)
+    assert [(job['L_cm'], job['d_cm'], job['qN2_mlmin']) for job in jobs] == [(None, 1.0, None), (0.05, 2.0, 9.5), (None, 1.0, None)]
+    # An explicit diameter overrides the registry
+    assert [job['d_cm'] for job in get_batch_jobs(str(data_dir), d_cm=1.5, registry=registry)] == [1.5, 1.5, 1.5]
@@ -0,0 +1,72 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from src.result_cache import ResultCache, get_file_hash, get_result_key
+from src.instrumentation import StageTimer
+from src.time_lag_analysis import time_lag_analysis_workflow
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+@pytest.fixture
+def datapath(tmp_path):
+    shutil.copy(os.path.join(DATA_DIR, 'RUN_H_25C-50bar.xlsx'), tmp_path)
+    return str(tmp_path / 'RUN_H_25C-50bar.xlsx')
+
+def test_get_result_key(datapath, tmp_path):
+    input_hash = get_file_hash(datapath)
+    key = get_result_key(input_hash, L_cm=0.1, d_cm=1.0)
+    assert key == get_result_key(input_hash, d_cm=1.0, L_cm=0.1)
+    assert key != get_result_key(input_hash, L_cm=0.2, d_cm=1.0)
+    # Same content under another name gives the same key
+    copy_path = tmp_path / 'copy.xlsx'
+    shutil.copy(datapath, copy_path)
+    assert key == get_result_key(get_file_hash(str(copy_path)), L_cm=0.1, d_cm=1.0)
+
+def test_workflow_cache(datapath, tmp_path):
+    cache = ResultCache(str(tmp_path / 'results'))
+    first = time_lag_analysis_workflow(datapath, 0.1, 1.0, 8.0, cache=cache)
+    assert len(cache.entries()) == 1 and not cache.entries().loc[0, 'pde_solution']
+    
+    # A rerun loads the stored result without running any analysis stage
+    timer = StageTimer()
+    second = time_lag_analysis_workflow(datapath, 0.1, 1.0, 8.0, cache=cache, timer=timer)
+    assert second.results == first.results
+    assert [span['stage'] for span in timer.spans] == ['cache lookup']
+    assert second.preprocessed_df.equals(first.preprocessed_df)
+    
+    # The PDE solution computed while exporting is added to the entry
+    time_lag_analysis_workflow(datapath, 0.1, 1.0, 8.0, cache=cache, save_data=True, output_dir=str(tmp_path / 'output'))
+    assert cache.entries().loc[0, 'pde_solution']
+    third = time_lag_analysis_workflow(datapath, 0.1, 1.0, 8.0, cache=cache)
+    assert np.array_equal(third.C_profile, first.C_profile)
+    assert third.df_flux.equals(first.df_flux)
+    
+    # Other parameters miss the cache
+    time_lag_analysis_workflow(datapath, 0.1, 1.0, 9.0, cache=cache)
+    assert len(cache.entries()) == 2
+
+def test_result_cache_invalidate(datapath, tmp_path):
+    cache = ResultCache(str(tmp_path / 'results'))
+    time_lag_analysis_workflow(datapath, 0.1, 1.0, 8.0, cache=cache)
+    time_lag_analysis_workflow(datapath, 0.1, 1.0, 9.0, cache=cache)
+    key = cache.entries().loc[0, 'key']
+    
+    assert cache.invalidate(key=key) == 1 and key not in cache
+    assert cache.invalidate(experiment='RUN_H_25C-50bar') == 1
+    assert cache.entries().empty
+
+def test_result_cache_corrupt_entry(datapath, tmp_path):
+    cache = ResultCache(str(tmp_path / 'results'))
+    key = get_result_key(get_file_hash(datapath), L_cm=0.1)
+    os.makedirs(cache.cache_dir)
+    with open(cache.path(key), 'wb') as f:
+        f.write(b'not a result')
+    
+    assert cache.get(key) is None
+    assert key not in cache
+
+def test_result_cache_eviction(datapath, tmp_path):
+    cache = ResultCache(str(tmp_path / 'results'), max_bytes=0)
+    time_lag_analysis_workflow(datapath, 0.1, 1.0, 8.0, cache=cache)
+    assert cache.entries().empty
@@ -0,0 +1,58 @@
+import os
+import pytest
+import src.time_lag_analysis
+from src.result_cache import ResultCache, get_file_hash
+from src.results_store import ResultsStore
+from src.time_lag_analysis import time_lag_analysis_workflow
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+def _results(experiment, temperature, pressure, permeability=1e-8):
+    return {'experiment': experiment, 'thickness': 0.1, 'temperature': temperature, 'pressure': pressure,
+            'time_lag': 100.0, 'diffusion_coefficient': 1e-6, 'permeability': permeability}
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(str(tmp_path / 'results.sqlite'))
+    store.add(_results('RUN_H_25C-50bar', 25.0, 50.0), d_cm=1.0, qN2_mlmin=8.0)
+    store.add(_results('RUN_H_50C-100bar_2', 50.0, 100.0))
+    store.add(_results('RUN_H_50C-200bar', 50.0, 200.0, permeability=1e-8))
+    store.add(_results('RUN_H_50C-200bar', 50.0, 200.0, permeability=2e-8), stabilisation_time_range=(1000.0, 5000.0))
+    return store
+
+def test_results_store_query(store):
+    assert len(store) == 4
+    assert store.experiments() == ['RUN_H_25C-50bar', 'RUN_H_50C-100bar_2', 'RUN_H_50C-200bar']
+
+    selection = store.query(temperature_range=(45, 55), pressure_range=(150, None))
+    assert selection['experiment'].tolist() == ['RUN_H_50C-200bar'] * 2
+    assert selection['stabilisation_end'].tolist()[1] == 5000.0
+
+    assert len(store.query(experiment=['RUN_H_25C-50bar', 'RUN_H_50C-200bar'])) == 3
+    first = store.query(experiment='RUN_H_25C-50bar').iloc[0]
+    assert first['diameter'] == 1.0 and first['flow_rate'] == 8.0
+
+    latest = store.query(latest_only=True)
+    assert len(latest) == 3
+    assert latest.set_index('experiment').loc['RUN_H_50C-200bar', 'permeability'] == 2e-8
+
+def test_results_store_indexes(store):
+    indexes = store.query_sql("SELECT name FROM sqlite_master WHERE type = 'index'")['name'].tolist()
+    assert {'idx_analyses_experiment', 'idx_analyses_temperature', 'idx_analyses_pressure'} <= set(indexes)
+
+    # Reopening an existing store keeps its rows
+    assert len(ResultsStore(store.path)) == 4
+
+def test_workflow_store(tmp_path, monkeypatch):
+    store = ResultsStore(str(tmp_path / 'results.sqlite'))
+    datapath = os.path.join(DATA_DIR, 'RUN_H_25C-50bar.xlsx')
+    hashed = []
+    monkeypatch.setattr(src.time_lag_analysis, 'get_file_hash', lambda path: hashed.append(path) or get_file_hash(path))
+    result = time_lag_analysis_workflow(datapath, 0.1, 1.0, 8.0, store=store, cache=ResultCache(str(tmp_path / 'results')))
+    assert hashed == [datapath]   # Shared by the result cache key and the store
+
+    row = store.query().iloc[0]
+    assert row['experiment'] == 'RUN_H_25C-50bar'
+    assert row['permeability'] == pytest.approx(result.results['permeability'])
+    assert row['thickness'] == 0.1 and row['flow_rate'] == 8.0
+    assert len(row['input_hash']) == 32
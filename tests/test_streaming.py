@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.calculations import time_lag_analysis
+from src.data_processing import preprocess_data
+from src.streaming import RunningLinearFit, StreamingTimeLagAnalysis, tail_csv
+
+@pytest.fixture
+def raw_data():
+    t = np.linspace(0, 1000, 501)
+    return pd.DataFrame({
+        't / s': t,
+        'y_CO2 / ppm': 10 + 100 * (1 - np.exp(-t / 100)),
+        'P_cell / barg': np.ones(501) * 50,
+        'T / °C': np.ones(501) * 25,
+        'qN2 / ml min^-1': np.ones(501) * 8.0
+    })
+
+def test_running_linear_fit():
+    rng = np.random.default_rng(0)
+    x = np.linspace(1e4, 2e4, 300)
+    y = 3e-3 * x - 5 + rng.normal(0, 0.1, len(x))
+    fit = RunningLinearFit()
+    for i in range(0, len(x), 37):
+        fit.update(x[i:i + 37], y[i:i + 37])
+    slope, intercept = np.polyfit(x, y, 1)
+    assert fit.n == len(x)
+    assert fit.slope == pytest.approx(slope, rel=1e-9)
+    assert fit.intercept == pytest.approx(intercept, rel=1e-9)
+
+def test_streaming_matches_offline(raw_data):
+    df = preprocess_data(raw_data, d_cm=1.0, qN2_mlmin=8.0)
+    offline = time_lag_analysis(df, 500, 0.1)
+    
+    analysis = StreamingTimeLagAnalysis(L_cm=0.1, d_cm=1.0, qN2_mlmin=8.0, stablisation_time_range=(500, None))
+    results = None
+    for i in range(0, len(raw_data), 7):   # Chunks smaller than the baseline
+        results = analysis.update(raw_data.iloc[i:i + 7])
+    
+    assert results['n_samples'] == len(raw_data)
+    assert results['time_lag'] == pytest.approx(offline[0], rel=1e-8)
+    assert results['diffusion_coefficient'] == pytest.approx(offline[1], rel=1e-8)
+    assert results['permeability'] == pytest.approx(offline[2], rel=1e-8)
+    assert results['solubility_coefficient'] == pytest.approx(offline[3], rel=1e-8)
+
+def test_streaming_detects_stabilisation(raw_data):
+    analysis = StreamingTimeLagAnalysis(L_cm=0.1, d_cm=1.0, qN2_mlmin=8.0, window=5, threshold=0.001)
+    for i in range(0, len(raw_data), 50):
+        results = analysis.update(raw_data.iloc[i:i + 50])
+        assert analysis._tail is None or len(analysis._tail) <= analysis.window + 1
+    assert results is not None
+    assert 0 < results['stabilisation_time'] < raw_data['t / s'].max()
+    assert results['diffusion_coefficient'] > 0
+
+def test_tail_csv_holds_back_partial_lines(tmp_path):
+    file_path = tmp_path / 'run.csv'
+    file_path.write_text('t / s,y_CO2 / ppm\n0,1\n1,2\n2,')
+    chunks = tail_csv(str(file_path), chunksize=10, poll_interval=0, idle_timeout=0)
+    first = next(chunks)
+    assert list(first['t / s']) == [0, 1]
+    
+    with open(file_path, 'a') as f:
+        f.write('3\n3,4')
+    rest = list(chunks)
+    assert list(pd.concat(rest)['y_CO2 / ppm']) == [3, 4]
@@ -1,6 +1,11 @@
 import unittest
 import os
-from src.time_lag_analysis import time_lag_analysis_workflow
+import subprocess
+import sys
+import threading
+from src.data_processing import load_data, preprocess_data
+from src.instrumentation import StageTimer
+from src.time_lag_analysis import PDE_DT, analyse_preprocessed_data, time_lag_analysis_workflow
 
 class TestTimeLagAnalysis(unittest.TestCase):
 
@@ -19,7 +24,7 @@ class TestTimeLagAnalysis(unittest.TestCase):
         results = time_lag_analysis_workflow(
             self.datapath, self.L_cm, self.d_cm, self.qN2_mlmin,
             self.stablisation_time_range, self.display_plot, self.save_plot,
-            self.save_data, self.output_dir
+            self.save_data, self.output_dir, fit_transient=True
         )
         self.assertIn('time_lag', results)
         self.assertIn('diffusion_coefficient', results)
@@ -27,6 +32,101 @@ class TestTimeLagAnalysis(unittest.TestCase):
         self.assertIn('solubility_coefficient', results)
         self.assertIn('slope', results)
         self.assertIn('intercept', results)
+        self.assertIn('transient_diffusion_coefficient', results)
+        self.assertIn('transient_solubility_coefficient', results)
+
+    def test_time_lag_analysis_workflow_lazy_result(self):
+        results = time_lag_analysis_workflow(
+            self.datapath, self.L_cm, self.d_cm, self.qN2_mlmin,
+            self.stablisation_time_range, display_plot=False, save_plot=False,
+            save_data=False, output_dir=self.output_dir
+        )
+        self.assertFalse(hasattr(results, '__dict__'))
+        self.assertNotIn('transient_diffusion_coefficient', results.results)   # Only fitted on request
+        self.assertGreater(results['diffusion_coefficient'], 0)
+        self.assertEqual(results.results['experiment'], 'RUN_H_25C-50bar')
+        
+        # Lazily computed members are cached after first access
+        self.assertIs(results.preprocessed_df, results.preprocessed_df)
+        self.assertIn('normalised flux', results.preprocessed_df.columns)
+        self.assertIs(results.C_profile, results.C_profile)
+        self.assertEqual(len(results.flux), len(results.df_flux))
+        self.assertEqual(results.C_profile.shape[0], len(results.df_C))
+        
+        # The profiles are exported with one row per PDE_DT up to the last measured time, as with the explicit solver
+        T_final = results.preprocessed_df['t / s'].iloc[-1]
+        self.assertEqual(len(results.df_flux), int(T_final / PDE_DT + 1e-9) + 1)
+        self.assertAlmostEqual(results.df_flux['Time'].diff().iloc[1:].mean(), PDE_DT, places=3)
+        self.assertAlmostEqual(results.df_flux['Time'].iloc[-1], results.preprocessed_df['t / s'].iloc[-1])
+
+    def test_time_lag_analysis_workflow_progress(self):
+        stages = []
+        results = time_lag_analysis_workflow(
+            self.datapath, self.L_cm, self.d_cm, self.qN2_mlmin,
+            self.stablisation_time_range, progress_callback=lambda stage, fraction: stages.append(stage)
+        )
+        self.assertEqual(stages, ['loading', 'preprocessing', 'fitting'])
+        results.pde_solution
+        self.assertEqual(stages[-1], 'solving PDE')
+
+    def test_time_lag_analysis_workflow_timings(self):
+        results = time_lag_analysis_workflow(
+            self.datapath, self.L_cm, self.d_cm, self.qN2_mlmin,
+            self.stablisation_time_range, fit_transient=True, timer=StageTimer()
+        )
+        self.assertEqual([span['stage'] for span in results.timings], ['loading', 'preprocessing', 'stabilisation time', 'fitting', 'transient fit'])
+        results.pde_solution
+        self.assertEqual(results.timings[-1]['stage'], 'solving PDE')
+        self.assertIsNone(time_lag_analysis_workflow(self.datapath, self.L_cm, self.d_cm, self.qN2_mlmin).timings)
+
+    def test_analyse_preprocessed_data_shared_pde_cache(self):
+        preprocessed_df = preprocess_data(load_data(self.datapath), d_cm=self.d_cm, qN2_mlmin=self.qN2_mlmin)
+        pde_cache = {}
+        first = analyse_preprocessed_data(preprocessed_df, self.L_cm, experiment='RUN_H_25C-50bar', pde_cache=pde_cache)
+        second = analyse_preprocessed_data(preprocessed_df, self.L_cm, experiment='RUN_H_25C-50bar', pde_cache=pde_cache)
+        self.assertEqual(first.results, second.results)
+        self.assertIs(first.pde_solution, second.pde_solution)
+        self.assertEqual(len(pde_cache), 1)
+
+    def test_solve_pde_shared_result(self):
+        # Workers sharing a cached result pass their own callback and timer, and the PDE is solved once
+        preprocessed_df = preprocess_data(load_data(self.datapath), d_cm=self.d_cm, qN2_mlmin=self.qN2_mlmin)
+        result = analyse_preprocessed_data(preprocessed_df, self.L_cm, experiment='RUN_H_25C-50bar')
+        stages = {0: [], 1: []}
+        timers = {0: StageTimer(), 1: StageTimer()}
+        solutions = {}
+        def solve(i):
+            solutions[i] = result.solve_pde(progress_callback=lambda stage, fraction: stages[i].append(stage), timer=timers[i])
+        threads = [threading.Thread(target=solve, args=(i,)) for i in stages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIs(solutions[0], solutions[1])
+        self.assertEqual(sorted(len(timer.spans) for timer in timers.values()), [0, 1])
+        self.assertEqual(sorted(bool(stages[i]) for i in stages), [False, True])
+        self.assertIsNone(result.progress_callback)
+        self.assertIsNone(result.timer)
+
+    def test_draw_figures(self):
+        results = time_lag_analysis_workflow(self.datapath, self.L_cm, self.d_cm, self.qN2_mlmin)
+        names = ['time_lag_analysis', 'flux_over_time', 'concentration_location_profile', 'concentration_profile']
+        self.assertEqual(list(results.figures), names)
+        self.assertIs(results.figures, results.figures)
+        figures = results.draw_figures(max_workers=4)
+        self.assertEqual(list(figures), names)
+        self.assertIsNone(figures['time_lag_analysis'].canvas.manager)   # Not tracked by pyplot
+
+    def test_import_does_not_load_plotting(self):
+        # The analysis modules must import without pulling in pyplot or the GUI toolkit
+        src_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+        for module in ['calculations', 'time_lag_analysis', 'src']:
+            script = (f"import sys, {module}\n"
+                      "print(sorted(m for m in ('matplotlib.pyplot', 'customtkinter') if m in sys.modules))")
+            completed = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(src_dir), capture_output=True, text=True,
+                                       env={**os.environ, 'PYTHONPATH': src_dir})
+            self.assertEqual(completed.returncode, 0, completed.stderr)
+            self.assertEqual(completed.stdout.strip(), '[]', module)
 
 if __name__ == '__main__':
     unittest.main()
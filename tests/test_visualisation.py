@@ -1,8 +1,13 @@
+import io
 import pytest
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import matplotlib.pyplot as plt
-from src.visualisation import plot_time_lag_analysis, plot_flux_over_time, plot_concentration_location_profile, plot_concentration_profile
+from src.visualisation import (
+    downsample_minmax, new_figure, plot_time_lag_analysis, plot_flux_over_time, plot_concentration_location_profile, plot_concentration_profile,
+    update_time_lag_analysis, update_flux_over_time, update_concentration_location_profile, update_concentration_profile
+)
 
 @pytest.fixture
 def sample_data():
@@ -43,8 +48,134 @@ def test_plot_concentration_location_profile(concentration_profile):
     assert len(ax.lines) == 6  # One line for each time point
     plt.close(fig)
 
+def test_plot_concentration_location_profile_snapshots(concentration_profile):
+    fig, ax = plt.subplots()
+    time = np.linspace(0, 1000, 1001)
+    plot_concentration_location_profile(concentration_profile[::100], 0.1, 1000, fig, ax, time=time[::100])
+    assert len(ax.lines) == 6  # One line for each time point
+    plt.close(fig)
+
 def test_plot_concentration_profile(concentration_profile):
     fig, ax = plt.subplots()
     plot_concentration_profile(concentration_profile, 0.1, 1000, fig, ax)
     assert len(ax.images) == 1  # One imshow plot
     plt.close(fig)
+
+def test_update_plots_in_place(sample_data, concentration_profile):
+    fig, axes = plt.subplots(2, 2)
+    (ax1, ax2), (ax3, ax4) = axes
+    plot_time_lag_analysis(sample_data, 500, 1e-6, -5e-3, fig, ax1)
+    plot_flux_over_time(np.ones(1001) * 1e-6, sample_data, 1000, fig, ax2)
+    plot_concentration_location_profile(concentration_profile, 0.1, 1000, fig, ax3)
+    plot_concentration_profile(concentration_profile, 0.1, 1000, fig, ax4)
+    artists = [list(ax1.lines), list(ax2.lines), list(ax3.lines), list(ax4.images)]
+    
+    # Longer experiment with new results
+    t = np.linspace(0, 2000, 2001)
+    new_data = pd.DataFrame({
+        't / s': t,
+        'cumulative flux / cm^3(STP) cm^-2': 2e-6 * t - 5e-3,
+        'flux / cm^3(STP) cm^-2 s^-1': np.ones_like(t) * 2e-6
+    })
+    new_profile = np.linspace(1, 0, 51)[None, :] * np.ones((2001, 1))
+    update_time_lag_analysis(new_data, 1000, 2e-6, -5e-3, ax1)
+    update_flux_over_time(np.ones(2001) * 2e-6, new_data, 2000, ax2)
+    update_concentration_location_profile(new_profile, 0.2, 2000, ax3)
+    update_concentration_profile(new_profile, 0.2, 2000, ax4)
+    
+    # Same artists, new data
+    assert artists == [list(ax1.lines), list(ax2.lines), list(ax3.lines), list(ax4.images)]
+    assert np.array_equal(ax1.lines[0].get_xdata(), t)
+    assert ax1.get_xlim()[1] >= 2000
+    assert np.allclose(ax2.lines[0].get_ydata(), 2e-6)
+    assert ax3.get_legend().get_texts()[-1].get_text() == 't = 2000 s'
+    assert ax4.images[0].get_array().shape == (2001, 51)
+    assert ax4.images[0].get_extent() == [0, 0.2, 0, 2000]
+    plt.close(fig)
+
+def test_plot_without_pyplot(sample_data):
+    rc_before = dict(plt.rcParams)
+    n_figures = len(plt.get_fignums())
+    fig, ax = plot_time_lag_analysis(sample_data, 500, 1e-6, -5e-3, style={'font.size': 12})
+    
+    assert ax.figure is fig and len(ax.lines) == 3
+    assert len(plt.get_fignums()) == n_figures  # Not tracked by pyplot
+    assert dict(plt.rcParams) == rc_before   # Style applied to the figure only
+    assert ax.xaxis.label.get_fontsize() == pytest.approx(0.833 * 12)
+    assert ax.xaxis.label.get_text() == r'Time / $\mathregular{s}$'
+    
+    # rcParams that the plot functions do not apply are rejected instead of ignored
+    with pytest.raises(ValueError, match='lines.linewidth'):
+        plot_time_lag_analysis(sample_data, 500, 1e-6, -5e-3, style={'lines.linewidth': 2})
+
+def test_plot_concurrently(sample_data, concentration_profile):
+    def render(plot):
+        fig, ax = new_figure()
+        plot(fig, ax)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+        return buffer.getvalue()
+    
+    plots = [
+        lambda fig, ax: plot_time_lag_analysis(sample_data, 500, 1e-6, -5e-3, fig, ax),
+        lambda fig, ax: plot_flux_over_time(np.ones(1001) * 1e-6, sample_data, 1000, fig, ax),
+        lambda fig, ax: plot_concentration_location_profile(concentration_profile, 0.1, 1000, fig, ax),
+        lambda fig, ax: plot_concentration_profile(concentration_profile, 0.1, 1000, fig, ax),
+    ] * 4
+    serial = [render(plot) for plot in plots]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(render, plots)) == serial
+
+def test_downsample_minmax():
+    x = np.linspace(0, 1000, 100001)
+    y = np.sin(x) + np.random.default_rng(0).normal(0, 0.1, len(x))
+    y[500:510] = np.nan
+    x_down, y_down = downsample_minmax(x, y, 100)
+    
+    assert len(x_down) <= 4 * 100 + 10
+    assert np.all(np.diff(x_down) > 0)
+    assert x_down[0] == x[0] and x_down[-1] == x[-1]
+    assert np.nanmax(y_down) == np.nanmax(y) and np.nanmin(y_down) == np.nanmin(y)
+    assert np.isnan(y_down).sum() == 10
+    # Envelope of every interval is preserved
+    edges = np.linspace(0, 1000, 101)
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        in_down, in_full = (x_down >= lo) & ((x_down < hi) | (hi == 1000)), (x >= lo) & ((x < hi) | (hi == 1000))
+        assert np.nanmax(y_down[in_down]) == np.nanmax(y[in_full])
+    # Short series are returned unchanged
+    assert downsample_minmax(x[:100], y[:100], 100)[0].shape == (100,)
+
+def test_plot_downsampled(sample_data):
+    t = np.linspace(0, 1e5, 1_000_001)
+    dense = pd.DataFrame({'t / s': t, 'cumulative flux / cm^3(STP) cm^-2': 1e-6 * t, 'flux / cm^3(STP) cm^-2 s^-1': np.full_like(t, 1e-6)})
+    fig, ax = plot_flux_over_time(np.full_like(t, 1e-6), dense, 1e5, time=t, downsample=True)
+    assert all(len(line.get_xdata()) <= 8 * ax.bbox.width + 8 for line in ax.lines)
+    fig, ax = plot_time_lag_analysis(dense, 5e4, 1e-6, 0, downsample=500)
+    assert all(len(line.get_xdata()) <= 4 * 500 for line in ax.lines)
+    assert ax.lines[0].get_xdata()[-1] == 1e5
+
+def test_plot_concentration_profile_downsampled():
+    C = np.linspace(0, 1, 100_001)[:, None] * np.linspace(1, 0, 51)[None, :]
+    fig, ax = plot_concentration_profile(C, 0.1, 1e5, downsample=1000)
+    image = ax.images[0]
+    assert 1000 <= image.get_array().shape[0] < 1100 and image.get_array().shape[1] == 51
+    assert image.get_extent()[3] >= 1e5 and ax.get_ylim()[1] == 1e5
+    assert image.get_clim() == (0, 1)   # Colours of the full profile
+    assert np.allclose(image.get_array().mean(axis=0), C.mean(axis=0), rtol=1e-2)
+
+def test_plot_concentration_profile_pyramid():
+    C = np.linspace(0, 1, 100_001)[:, None] * np.ones((1, 51))
+    fig, ax = plot_concentration_profile(C, 0.1, 1e5, pyramid=True)
+    full_rows = ax.images[0].get_array().shape[0]
+    assert full_rows < 2000
+    
+    # Zooming in shows a finer level covering only the visible times
+    ax.set_ylim(1000, 2000)
+    image = ax.images[0]
+    extent = image.get_extent()
+    assert extent[2] <= 1000 and extent[3] >= 2000 and extent[3] - extent[2] < 2000
+    assert image.get_array().shape[0] >= full_rows / 2
+    
+    # Updating rebuilds the pyramid for the new profile, here of half the length and twice the maximum
+    update_concentration_profile(4 * C[:50_001], 0.1, 5e4, ax)
+    assert ax.images[0].get_extent()[3] >= 5e4 and ax.images[0].get_clim() == (0, 2)